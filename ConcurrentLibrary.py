@@ -0,0 +1,436 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: A Library that can be shared by many threads, using striped locks per item and patron.
+import threading
+from contextlib import contextmanager
+
+from Library import Library, COMPACTION_THRESHOLD
+
+
+class ConcurrentLibrary(Library):
+    """
+    A ConcurrentLibrary object is a Library that many threads can use at once. Each item and patron is guarded by one
+    of a fixed set of striped locks, chosen by hashing its id, so operations on unrelated items and patrons run in
+    parallel. An operation takes the locks of every item and patron it changes, always in stripe order so that
+    threads cannot deadlock. Advancing the date and applying a batch of transactions take every stripe.
+
+    Attributes:
+        _locks (list): the striped locks guarding the items and patrons
+        _calendar_lock (threading.Lock): the lock guarding the overdue calendar, which every loan shares
+        _fine_lock (threading.Lock): the lock guarding the fine index and the loan and fine totals
+        _cache_lock (threading.Lock): the lock guarding the attached cache, which lookups of every item share
+        _inventory_lock (threading.RLock): the lock guarding the inventory index, which every item shares
+        _search_lock (threading.Lock): the lock guarding the attached search index, which every item shares
+        _removal_lock (threading.Lock): the lock guarding the count of patrons removed since the last compaction
+    """
+
+    def __init__(self, stripes=64):
+        """
+        Initializes a new ConcurrentLibrary with empty holdings and members.
+
+        :param:
+            stripes (int): The number of striped locks.
+        """
+        super().__init__()
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._calendar_lock = threading.Lock()
+        self._fine_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._inventory_lock = threading.RLock()
+        self._search_lock = threading.Lock()
+        self._removal_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, *ids):
+        """
+        Holds the striped locks of the given item and patron ids for the duration of a with block.
+
+        :param:
+            ids (str): The library_item_ids and patron_ids to lock.
+        """
+        locks = [self._locks[stripe] for stripe in sorted({hash(key) % len(self._locks) for key in ids})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @contextmanager
+    def _locked_all(self):
+        """
+        Holds every striped lock for the duration of a with block.
+        """
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+    def add_library_item(self, library_item):
+        """
+        Adds a LibraryItem to the Library's holdings, indexed by its library_item_id.
+        """
+        with self._locked(library_item.get_library_item_id()):
+            return super().add_library_item(library_item)
+
+    def add_patron(self, patron):
+        """
+        Adds a Patron to the Library's members, indexed by their patron_id.
+        """
+        with self._locked(patron.get_patron_id()):
+            return super().add_patron(patron)
+
+    def lookup_library_item_from_id(self, library_item_id):
+        """
+        Searches for a library item by its library_item_id, holding the lock of the item, as a lookup may build the
+        item from the attached catalog, drop holds of removed patrons and record it in the attached cache.
+        """
+        with self._locked(library_item_id):
+            return self._lookup_library_item(library_item_id)
+
+    def remove_library_item(self, library_item_id):
+        """
+        Removes a LibraryItem from the Library's holdings, holding the lock of the item.
+        """
+        with self._locked(library_item_id):
+            return super().remove_library_item(library_item_id)
+
+    def remove_patron(self, patron_id):
+        """
+        Removes a Patron from the Library's members, holding the lock of the patron. A compaction it triggers runs
+        after the lock is released, since it takes every lock.
+        """
+        with self._locked(patron_id):
+            result = self._remove_patron(self.lookup_patron_from_id(patron_id))
+        with self._removal_lock:
+            compaction_due = self._removed_patron_count >= COMPACTION_THRESHOLD
+        if compaction_due:
+            self.compact()
+        return result
+
+    def _remove_patron(self, patron):
+        """
+        Removes a Patron from the Library's members, holding the removal lock, as patrons on different stripes are
+        counted together.
+        """
+        with self._removal_lock:
+            return super()._remove_patron(patron)
+
+    def compact(self):
+        """
+        Drops every hold of the patrons removed since the last compaction, holding every lock. Lookups read the count
+        of removed patrons under the lock of their item only, so a lookup racing a removal may leave the new holds to
+        be dropped by a later lookup; holds of removed patrons are never served either way.
+        """
+        with self._locked_all(), self._removal_lock:
+            super().compact()
+
+    def attach_search_index(self, search_index):
+        """
+        Attaches a search index to the Library, holding every lock and the search lock while the holdings are indexed.
+        """
+        with self._locked_all(), self._search_lock:
+            super().attach_search_index(search_index)
+
+    def search(self, query, field=None, prefix=False, limit=10):
+        """
+        Searches the attached search index, holding the search lock.
+        """
+        with self._search_lock:
+            return super().search(query, field, prefix, limit)
+
+    def _index_search(self, library_item):
+        """
+        Adds a LibraryItem to the attached search index, holding the search lock.
+        """
+        with self._search_lock:
+            super()._index_search(library_item)
+
+    def _unindex_search(self, library_item):
+        """
+        Takes a LibraryItem out of the attached search index, holding the search lock.
+        """
+        with self._search_lock:
+            super()._unindex_search(library_item)
+
+    def _is_searchable(self, library_item):
+        """
+        Checks whether a LibraryItem is in the attached search index, holding the search lock.
+        """
+        with self._search_lock:
+            return super()._is_searchable(library_item)
+
+    def check_out_library_item(self, patron_id, library_item_id):
+        """
+        Checks out a LibraryItem to a patron, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().check_out_library_item(patron_id, library_item_id)
+
+    def return_library_item(self, library_item_id):
+        """
+        Returns a LibraryItem to the Library, holding the locks of the item and of the patron who has it checked out.
+
+        The patron is only known once the item has been looked up, so the borrower is read under the item lock alone,
+        then both locks are taken in stripe order and the borrower is checked again before returning the item.
+        """
+        while True:
+            with self._locked(library_item_id):
+                library_item = self._lookup_library_item(library_item_id)
+                borrower = None if library_item is None else library_item.get_checked_out_by()
+                if borrower is None:
+                    return super().return_library_item(library_item_id)
+
+            with self._locked(library_item_id, borrower.get_patron_id()):
+                if library_item.get_checked_out_by() is borrower:
+                    return super().return_library_item(library_item_id)
+
+    def renew_library_item(self, library_item_id):
+        """
+        Renews the loan of a LibraryItem, holding the locks of the item and of the patron who has it checked out. As
+        with a return, the borrower is read under the item lock alone, then both locks are taken in stripe order and
+        the borrower is checked again before renewing.
+        """
+        while True:
+            with self._locked(library_item_id):
+                library_item = self._lookup_library_item(library_item_id)
+                borrower = None if library_item is None else library_item.get_checked_out_by()
+                if borrower is None:
+                    return super().renew_library_item(library_item_id)
+            with self._locked(library_item_id, borrower.get_patron_id()):
+                if library_item.get_checked_out_by() is borrower:
+                    return super().renew_library_item(library_item_id)
+
+    def renew_library_items(self, patron_id):
+        """
+        Renews every LibraryItem a patron has checked out, holding the locks of the patron and of each item. The items
+        are read under the patron lock alone, then all the locks are taken in stripe order and the items are checked
+        again before renewing.
+        """
+        while True:
+            with self._locked(patron_id):
+                patron = self.lookup_patron_from_id(patron_id)
+                if patron is None:
+                    return super().renew_library_items(patron_id)
+                library_items = list(patron._checked_out_items)
+            with self._locked(patron_id, *[library_item._library_item_id for library_item in library_items]):
+                if list(patron._checked_out_items) == library_items:
+                    return super().renew_library_items(patron_id)
+
+    def request_library_item(self, patron_id, library_item_id, priority=0):
+        """
+        Requests a LibraryItem to be held for a patron, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().request_library_item(patron_id, library_item_id, priority)
+
+    def cancel_hold(self, patron_id, library_item_id):
+        """
+        Cancels a patron's hold on a LibraryItem, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().cancel_hold(patron_id, library_item_id)
+
+    def promote_hold(self, patron_id, library_item_id, priority):
+        """
+        Moves a patron's waiting hold on a LibraryItem to another priority tier, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().promote_hold(patron_id, library_item_id, priority)
+
+    def get_hold_position(self, patron_id, library_item_id):
+        """
+        Gets how many patrons will get a LibraryItem before a patron, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().get_hold_position(patron_id, library_item_id)
+
+    def get_estimated_wait(self, patron_id, library_item_id):
+        """
+        Estimates how many days until a LibraryItem is available to a patron, holding the locks of both.
+        """
+        with self._locked(patron_id, library_item_id):
+            return super().get_estimated_wait(patron_id, library_item_id)
+
+    def pay_fine(self, patron_id, amount):
+        """
+        Processes a fine payment for a Patron, holding the lock of the patron.
+        """
+        with self._locked(patron_id):
+            return super().pay_fine(patron_id, amount)
+
+    def _amend_fine(self, patron, amount):
+        """
+        Amends the fine of a Patron for Patron.amend_fine, holding the lock of the patron.
+        """
+        with self._locked(patron._patron_id):
+            super()._amend_fine(patron, amount)
+
+    def advance_date(self, days):
+        """
+        Advances the current date for the library, holding every lock so no loan changes while fines accrue.
+        """
+        with self._locked_all():
+            super().advance_date(days)
+
+    def apply_transactions(self, transactions):
+        """
+        Processes a batch of circulation transactions, holding every lock for the whole batch.
+        """
+        with self._locked_all():
+            return super().apply_transactions(transactions)
+
+    def set_loan_policy(self, policy):
+        """
+        Sets the LoanPolicy of the Library, holding every lock so no checkout is in progress while it changes.
+        """
+        with self._locked_all():
+            super().set_loan_policy(policy)
+
+    def pull_notifications(self, limit=1000):
+        """
+        Takes the next batch of notifications, holding every lock so no loan changes while they are checked.
+        """
+        with self._locked_all():
+            return super().pull_notifications(limit)
+
+    def snapshot(self):
+        """
+        Takes a point-in-time snapshot of the Library for reports, holding every lock only while the references of the
+        holdings and members are copied. Reading the snapshot takes no locks.
+        """
+        with self._locked_all():
+            return super().snapshot()
+
+    def _schedule_overdue(self, library_item, due_date, loan_terms):
+        """
+        Files a newly checked out LibraryItem in the overdue calendar, holding the calendar lock.
+        """
+        with self._calendar_lock:
+            super()._schedule_overdue(library_item, due_date, loan_terms)
+
+    def _unschedule_overdue(self, library_item):
+        """
+        Ends the loan of a LibraryItem in the overdue calendar, holding the calendar lock.
+        """
+        with self._calendar_lock:
+            super()._unschedule_overdue(library_item)
+
+    def _reschedule_overdue(self, library_item, due_date):
+        """
+        Moves the loan of a LibraryItem to a new due date in the overdue calendar, holding the calendar lock.
+        """
+        with self._calendar_lock:
+            super()._reschedule_overdue(library_item, due_date)
+
+    def _index_item(self, library_item):
+        """
+        Files a LibraryItem in the inventory index, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            super()._index_item(library_item)
+
+    def _unindex_item(self, library_item):
+        """
+        Takes a LibraryItem out of the inventory index, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            super()._unindex_item(library_item)
+
+    def _set_location(self, library_item, location):
+        """
+        Moves a LibraryItem to a location and refiles it in the inventory index, holding the inventory lock throughout
+        so the item is never missing from the index.
+        """
+        with self._inventory_lock:
+            super()._set_location(library_item, location)
+
+    def _cache_library_item(self, library_item, loaded):
+        """
+        Records a lookup of a LibraryItem in the attached cache and evicts the items it let go of, holding the cache
+        lock.
+        """
+        with self._cache_lock:
+            super()._cache_library_item(library_item, loaded)
+
+    def _evict_library_items(self, library_items):
+        """
+        Evicts the items the cache let go of whose stripe locks are free. An item whose lock is held may be in use, so
+        it stays, like a pinned item, until it is next looked up. The locks are only tried, never waited for, so
+        evicting cannot deadlock with the locks the thread already holds.
+        """
+        acquired = {}
+        free_items = []
+        try:
+            for library_item in library_items:
+                stripe = hash(library_item._library_item_id) % len(self._locks)
+                if stripe not in acquired:
+                    acquired[stripe] = self._locks[stripe].acquire(blocking=False)
+                if acquired[stripe]:
+                    free_items.append(library_item)
+            super()._evict_library_items(free_items)
+        finally:
+            for stripe, locked in acquired.items():
+                if locked:
+                    self._locks[stripe].release()
+
+    def _reindex_fine(self, patron):
+        """
+        Refiles a Patron in the fine index, holding the fine lock.
+        """
+        with self._fine_lock:
+            super()._reindex_fine(patron)
+
+    def get_circulation_totals(self):
+        """
+        Gets the totals of the loans and fines of the whole Library, holding the calendar and fine locks.
+        """
+        with self._calendar_lock, self._fine_lock:
+            return super().get_circulation_totals()
+
+    def count_items(self, location=None, kind=None):
+        """
+        Counts the items in the holdings at a location, of a kind, or both, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            return super().count_items(location, kind)
+
+    def get_items(self, location, kind=None):
+        """
+        Lists the items in the holdings at a location, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            return super().get_items(location, kind)
+
+    def get_hold_shelf_pull_list(self):
+        """
+        Gets the pull list of the hold shelf, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            return super().get_hold_shelf_pull_list()
+
+    def get_utilization_report(self):
+        """
+        Gets how many items of each kind are at each location, holding the inventory lock.
+        """
+        with self._inventory_lock:
+            return super().get_utilization_report()
+
+    def get_patrons_owing_more_than(self, amount):
+        """
+        Finds every patron whose fine is more than an amount, holding the fine lock.
+        """
+        with self._fine_lock:
+            return super().get_patrons_owing_more_than(amount)
+
+    def get_most_overdue_patrons(self, limit=10):
+        """
+        Finds the patrons with the most overdue items, holding the fine lock.
+        """
+        with self._fine_lock:
+            return super().get_most_overdue_patrons(limit)
@@ -0,0 +1,318 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: A columnar store that holds a large catalog of library items in parallel arrays.
+from array import array
+
+from Library import Book, Album, Movie, ON_SHELF, LOCATIONS, LOCATION_CODES
+
+# Kinds of LibraryItem an ItemTable can hold, indexed by their kind code
+ITEM_KINDS = (Book, Album, Movie)
+KIND_CODES = {kind: code for code, kind in enumerate(ITEM_KINDS)}
+
+NO_DATE = -1  # Stored in place of None for an item that has never been checked out
+
+
+class ItemTable:
+    """
+    An ItemTable object holds many library items as rows of parallel arrays rather than as one object per item. Small
+    fields are stored in typed arrays, and patron references in sparse dicts, since most items are on the shelf. Items
+    are read through lightweight views that offer the same getters and setters as a LibraryItem.
+
+    Attributes:
+        _rows (dict): the row of each item, keyed by library_item_id
+        _ids (list): the library_item_id of each row
+        _titles (list): the title of each row
+        _creators (list): the author, artist or director of each row
+        _kinds (array): the kind code of each row, indexing ITEM_KINDS
+        _locations (array): the location code of each row, indexing LOCATIONS
+        _dates_checked_out (array): the date each row was last checked out, or NO_DATE
+        _checked_out_by (dict): the Patron who has each checked out row, keyed by row
+        _requested_by (dict): the Patron who has requested each row on hold, keyed by row
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty ItemTable.
+        """
+        self._rows = {}
+        self._ids = []
+        self._titles = []
+        self._creators = []
+        self._kinds = array("B")
+        self._locations = array("B")
+        self._dates_checked_out = array("q")
+        self._checked_out_by = {}
+        self._requested_by = {}
+
+    def __len__(self):
+        """
+        Gets the number of items in the ItemTable.
+
+        :return:
+            int: The number of rows in the ItemTable.
+        """
+        return len(self._ids)
+
+    def add_item(self, kind, library_item_id, title, creator):
+        """
+        Adds a new item, on the shelf, as a row of the ItemTable.
+
+        :param:
+            kind (type): The kind of the item, Book, Album or Movie.
+            library_item_id (str): The unique identifier for the item.
+            title (str): The title of the item.
+            creator (str): The author, artist or director of the item.
+
+        :return:
+            str: A message indicating the result of adding the item.
+        """
+        if library_item_id in self._rows:
+            return "duplicate item id"
+
+        self._rows[library_item_id] = len(self._ids)
+        self._ids.append(library_item_id)
+        self._titles.append(title)
+        self._creators.append(creator)
+        self._kinds.append(KIND_CODES[kind])
+        self._locations.append(ON_SHELF)
+        self._dates_checked_out.append(NO_DATE)
+        return "item added"
+
+    def add_library_item(self, library_item):
+        """
+        Copies a Book, Album or Movie, with its current state, into a new row of the ItemTable.
+
+        :param:
+            library_item (LibraryItem): The item to copy into the ItemTable.
+
+        :return:
+            str: A message indicating the result of adding the item.
+        """
+        result = self.add_item(type(library_item), library_item.get_library_item_id(), library_item.get_title(),
+                               library_item._get_creator())
+        if result == "item added":
+            view = self.view(len(self._ids) - 1)
+            view.set_location(library_item.get_location())
+            view.set_checked_out_by(library_item.get_checked_out_by())
+            view.set_requested_by(library_item.get_requested_by())
+            view.set_date_checked_out(library_item.get_date_checked_out())
+        return result
+
+    def lookup_library_item_from_id(self, library_item_id):
+        """
+        Searches for an item by its library_item_id and returns a view of it, or None if not found.
+
+        :return:
+            ItemView: a view of the row with the given library_item_id
+            OR
+            None, if no library_item_id is found
+        """
+        row = self._rows.get(library_item_id)
+        if row is None:
+            return None
+        return self.view(row)
+
+    def view(self, row):
+        """
+        Gets a view of a row of the ItemTable with the getter API of its kind of LibraryItem.
+
+        :param:
+            row (int): The row to view.
+
+        :return:
+            ItemView: A BookView, AlbumView or MovieView of the row.
+        """
+        return _VIEW_KINDS[self._kinds[row]](self, row)
+
+    def __iter__(self):
+        """
+        Iterates over views of every row of the ItemTable, in the order they were added.
+        """
+        for row in range(len(self._ids)):
+            yield self.view(row)
+
+
+class ItemView:
+    """
+    An ItemView object is a lightweight view of one row of an ItemTable, offering the getters and setters of a
+    LibraryItem. It has two data members.
+
+    Attributes:
+        _table (ItemTable): the ItemTable holding the item
+        _row (int): the row of the item in the ItemTable
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        """
+        Initializes a view of the given row of an ItemTable.
+
+        :param:
+            table (ItemTable): The ItemTable holding the item.
+            row (int): The row of the item.
+        """
+        self._table = table
+        self._row = row
+
+    def get_library_item_id(self):
+        """
+        Gets the unique identifier of the item
+
+        :return:
+            str: The unique identifier (id) of the item
+        """
+        return self._table._ids[self._row]
+
+    def get_title(self):
+        """
+        Gets the title of the item
+
+        :return:
+            str: The title of the item
+        """
+        return self._table._titles[self._row]
+
+    def get_location(self):
+        """
+        Gets the location of the item
+
+        :return:
+            str: The location of the item, "ON_SHELF", "ON_HOLD_SHELF", or "CHECKED_OUT"
+        """
+        return LOCATIONS[self._table._locations[self._row]]
+
+    def set_location(self, location):
+        """
+        Sets the location of the item
+
+        :param:
+            location (str): The new location of the item, "ON_SHELF", "ON_HOLD_SHELF", or "CHECKED_OUT".
+        """
+        self._table._locations[self._row] = LOCATION_CODES[location]
+
+    def get_checked_out_by(self):
+        """
+        Gets the Patron who has checked_out the item
+
+        :return:
+            Patron: The Patron who has checked_out the item, or None
+        """
+        return self._table._checked_out_by.get(self._row)
+
+    def set_checked_out_by(self, patron):
+        """
+        Sets the Patron who has checked_out the item
+
+        :param:
+            patron (Patron): The Patron who has checked_out the item, or None
+        """
+        if patron is None:
+            self._table._checked_out_by.pop(self._row, None)
+        else:
+            self._table._checked_out_by[self._row] = patron
+
+    def get_requested_by(self):
+        """
+        Gets the Patron who has requested the item
+
+        :return:
+            Patron: The Patron who has requested the item, or None
+        """
+        return self._table._requested_by.get(self._row)
+
+    def set_requested_by(self, patron):
+        """
+        Sets the Patron who has requested the item
+
+        :param:
+            patron (Patron): The Patron who has requested the item, or None
+        """
+        if patron is None:
+            self._table._requested_by.pop(self._row, None)
+        else:
+            self._table._requested_by[self._row] = patron
+
+    def get_date_checked_out(self):
+        """
+        Gets the date_checked_out of the item
+
+        :return:
+            int: The date the item was checked_out, or None
+        """
+        date = self._table._dates_checked_out[self._row]
+        return None if date == NO_DATE else date
+
+    def set_date_checked_out(self, date):
+        """
+        Sets the date_checked_out of the item
+
+        :param:
+            date (int): The date to set as date the item was checked_out, or None
+        """
+        self._table._dates_checked_out[self._row] = NO_DATE if date is None else date
+
+
+class BookView(ItemView):
+    """
+    A BookView object is a view of a Book row of an ItemTable.
+    """
+
+    __slots__ = ()
+
+    CHECK_OUT_LENGTH = Book.CHECK_OUT_LENGTH
+    get_check_out_length = Book.get_check_out_length
+
+    def get_author(self):
+        """
+        Gets the name of the author of the book
+
+        :return:
+            str: The name of the author of the book.
+        """
+        return self._table._creators[self._row]
+
+
+class AlbumView(ItemView):
+    """
+    An AlbumView object is a view of an Album row of an ItemTable.
+    """
+
+    __slots__ = ()
+
+    CHECK_OUT_LENGTH = Album.CHECK_OUT_LENGTH
+    get_check_out_length = Album.get_check_out_length
+
+    def get_artist(self):
+        """
+        Gets the name of the artist of the album
+
+        :return:
+            str: The name of the artist to whom the album is attributed.
+        """
+        return self._table._creators[self._row]
+
+
+class MovieView(ItemView):
+    """
+    A MovieView object is a view of a Movie row of an ItemTable.
+    """
+
+    __slots__ = ()
+
+    CHECK_OUT_LENGTH = Movie.CHECK_OUT_LENGTH
+    get_check_out_length = Movie.get_check_out_length
+
+    def get_director(self):
+        """
+        Gets the name of the director of the movie
+
+        :return:
+            str: The name of the director to whom the movie is attributed.
+        """
+        return self._table._creators[self._row]
+
+
+# View classes of each kind code, in the same order as ITEM_KINDS
+_VIEW_KINDS = (BookView, AlbumView, MovieView)
@@ -2,9 +2,77 @@
 # Github User: ashton01L
 # Date: 10/16/2024
 # Description: You will be writing a Library simulator involving multiple classes.
+import logging
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappop, heappush
+from operator import itemgetter
+
+from LibraryPolicy import (LoanPolicy, loan_fine_cents, DEFAULT_PATRON_CLASS, LOAN_DAYS, DAILY_FINE, FINE_CAP,
+                           GRACE_DAYS, RENEWAL_LIMIT)
+
+logger = logging.getLogger(__name__)
+
+# Result codes of Library operations, as returned by Library.apply_transactions. Each one indexes its message in
+# RESULT_MESSAGES, which is what the individual Library methods return.
+CHECK_OUT_SUCCESSFUL = 0
+RETURN_SUCCESSFUL = 1
+REQUEST_SUCCESSFUL = 2
+PAYMENT_SUCCESSFUL = 3
+PATRON_NOT_FOUND = 4
+ITEM_NOT_FOUND = 5
+ITEM_ALREADY_CHECKED_OUT = 6
+ITEM_ON_HOLD_BY_OTHER_PATRON = 7
+ITEM_ALREADY_IN_LIBRARY = 8
+ITEM_ALREADY_ON_HOLD = 9
+UNKNOWN_TRANSACTION = 10
+HOLD_CANCELLED = 11
+HOLD_PROMOTED = 12
+NO_HOLD_BY_PATRON = 13
+RENEWAL_SUCCESSFUL = 14
+RENEWAL_LIMIT_REACHED = 15
+ITEM_NOT_CHECKED_OUT = 16
+
+RESULT_MESSAGES = (
+    "check out successful",
+    "return successful",
+    "request successful",
+    "payment successful",
+    "patron not found",
+    "item not found",
+    "item already checked out",
+    "item on hold by other patron",
+    "item already in library",
+    "item already on hold",
+    "unknown transaction",
+    "hold cancelled",
+    "hold promoted",
+    "no hold by patron",
+    "renewal successful",
+    "renewal limit reached",
+    "item not checked out",
+)
+
+# Integer codes of LibraryItem locations, for compact columnar storage. Each one indexes its name in LOCATIONS.
+ON_SHELF = 0
+ON_HOLD_SHELF = 1
+CHECKED_OUT = 2
+
+LOCATIONS = ("ON_SHELF", "ON_HOLD_SHELF", "CHECKED_OUT")
+LOCATION_CODES = {location: code for code, location in enumerate(LOCATIONS)}
+
+# The fine each overdue item adds per day under the default LoanPolicy, in cents. Fines are kept in whole cents so
+# they add up exactly.
+DAILY_FINE_CENTS = 10
+
+# The number of patrons removed since the last compaction that triggers the next one
+COMPACTION_THRESHOLD = 1024
+
+
 class LibraryItem:
     """
-    A LibraryItem object represents a library item that a patron can check out from a library. It has six data members.
+    A LibraryItem object represents a library item that a patron can check out from a library. It has ten data
+    members.
 
     Attributes:
         _library_item_id (str): a unique identifier for a LibraryItem
@@ -12,9 +80,19 @@ class LibraryItem:
         _location (str): the state of the LibraryItem - "ON_SHELF", "ON_HOLD_SHELF", or "CHECKED_OUT"
         _checked_out_by (Patron): refers to the name of the Patron who has LibraryItem "CHECKED_OUT", if any.
         _requested_by (Patron): refers to the name of the Patron who has requested LibraryItem "ON_HOLD_SHELF", if any.
+            While the LibraryItem is "CHECKED_OUT", this is the first Patron in its _hold_queue.
         _date_checked_out (int): date the LibraryItem was "CHECKED_OUT", set to current_date of the Library
+        _due_date (int): last day of the current loan before the LibraryItem is overdue, if "CHECKED_OUT"
+        _loan_terms (tuple): the terms of the current loan, from the LoanPolicy of the Library, if "CHECKED_OUT"
+        _renewal_count (int): the number of times the current loan has been renewed, if "CHECKED_OUT"
+        _hold_queue (HoldQueue): the patrons waiting for the LibraryItem, other than one it is "ON_HOLD_SHELF" for
     """
 
+    __slots__ = (
+        "_library_item_id", "_title", "_location", "_checked_out_by", "_requested_by", "_date_checked_out", "_due_date",
+        "_loan_terms", "_renewal_count", "_hold_queue",
+    )
+
     def __init__(self, library_item_id, title):
         """
         Initializes LibraryItem object with the provided library_item_id and title. Additionally, initializes
@@ -30,6 +108,10 @@ class LibraryItem:
         self._checked_out_by = None  # No patron checked it out initially
         self._requested_by = None  # No patron has requested it initially
         self._date_checked_out = None  # Not checked out
+        self._due_date = None  # No loan to fall due
+        self._loan_terms = None  # No loan
+        self._renewal_count = 0  # No loan to renew
+        self._hold_queue = None  # No patrons waiting; created on the first hold that has to wait
 
     def get_library_item_id(self):
         """
@@ -125,6 +207,37 @@ class LibraryItem:
         """
         return self._date_checked_out
 
+    def get_due_date(self):
+        """
+        Gets the due date of the current loan of the LibraryItem
+
+        :return:
+            int: The last day the LibraryItem can be kept before it is overdue, or None if it is not checked_out
+        """
+        return self._due_date
+
+    def get_renewal_count(self):
+        """
+        Gets the number of times the current loan of the LibraryItem has been renewed
+
+        :return:
+            int: The number of renewals of the current loan, or None if it is not checked_out
+        """
+        return None if self._checked_out_by is None else self._renewal_count
+
+    def get_hold_count(self):
+        """
+        Gets the number of patrons holding the LibraryItem, including one it is "ON_HOLD_SHELF" for. The holds of
+        removed patrons are left until the item is next looked up, so they are not counted.
+
+        :return:
+            int: The number of holds on the LibraryItem
+        """
+        count = 0 if self._hold_queue is None else self._hold_queue.count_members()
+        if self._location == "ON_HOLD_SHELF" and self._requested_by._library is not None:
+            count += 1
+        return count
+
 
 class Book(LibraryItem):
     """
@@ -135,6 +248,10 @@ class Book(LibraryItem):
         _author (str): The author of the book.
     """
 
+    __slots__ = ("_author",)
+
+    CHECK_OUT_LENGTH = 21  # The same for every item of the kind, so a LoanPolicy reads it off the class
+
     def __init__(self, library_item_id, title, author):
         """
         Initializes a new Book object with a library_item_id, title, and the new attribute, author.
@@ -156,6 +273,15 @@ class Book(LibraryItem):
         """
         return self._author
 
+    def _get_creator(self):
+        """
+        Gets the creator of the book, its author, for code that handles every kind of LibraryItem alike.
+
+        :return:
+            str: The name of the author of the book.
+        """
+        return self._author
+
     def get_check_out_length(self):
         """
         Gets the length, in number of days, that a book can be checked_out (21 days)
@@ -163,7 +289,7 @@ class Book(LibraryItem):
         :return:
             int: The number of days allowable for a Book object to be checked_out (21 days)
         """
-        return 21
+        return self.CHECK_OUT_LENGTH
 
 
 class Album(LibraryItem):
@@ -175,6 +301,10 @@ class Album(LibraryItem):
         _artist (str): The main artist of the album.
     """
 
+    __slots__ = ("_artist",)
+
+    CHECK_OUT_LENGTH = 14  # The same for every item of the kind, so a LoanPolicy reads it off the class
+
     def __init__(self, library_item_id, title, artist):
         """
         Initializes a new Album with a library_item_id, title, and artist.
@@ -196,13 +326,22 @@ class Album(LibraryItem):
         """
         return self._artist
 
+    def _get_creator(self):
+        """
+        Gets the creator of the album, its artist, for code that handles every kind of LibraryItem alike.
+
+        :return:
+            str: The name of the artist to whom the album is attributed.
+        """
+        return self._artist
+
     def get_check_out_length(self):
         """Gets the length, in number of days, that an album can be checked_out (14 days)
 
         :return:
             int: The number of days allowable for an Album object to be checked_out (14 days)
         """
-        return 14
+        return self.CHECK_OUT_LENGTH
 
 
 class Movie(LibraryItem):
@@ -215,6 +354,10 @@ class Movie(LibraryItem):
         _director (str): The name of the director of the movie.
     """
 
+    __slots__ = ("_director",)
+
+    CHECK_OUT_LENGTH = 7  # The same for every item of the kind, so a LoanPolicy reads it off the class
+
     def __init__(self, library_item_id, title, director):
         """
         Initializes a new Movie with a library_item_id, title, and director.
@@ -236,6 +379,15 @@ class Movie(LibraryItem):
         """
         return self._director
 
+    def _get_creator(self):
+        """
+        Gets the creator of the movie, its director, for code that handles every kind of LibraryItem alike.
+
+        :return:
+            str: The name of the director to whom the movie is attributed.
+        """
+        return self._director
+
     def get_check_out_length(self):
         """
         Gets the length, in number of days, that a movie can be checked_out (7 days)
@@ -243,32 +395,53 @@ class Movie(LibraryItem):
         :return:
             int: The number of days allowable for a Movie object to be checked_out (7 days)
         """
-        return 7
+        return self.CHECK_OUT_LENGTH
 
 
 class Patron:
     """
-    A Patron object represents a patron of a library. It has four data members.
+    A Patron object represents a patron of a library. It has nine data members.
+
+    Fines on overdue items are accrued lazily: _fine_cents holds the fine as of _fine_settled_date, and _fine_rate is
+    added for each day after that, up to the current date of the Library the patron belongs to. The rate is the sum of
+    the daily fines of the patron's overdue items that are past their grace days and under their fine caps.
 
     Attributes:
         _patron_id (str): a unique identifier for a LibraryItem
         _name (str): the name of the Patron
-        _checked_out_items (list): a list of LibraryItem's the patron currently has checked_out
-        _fine_amount (float): refers to the amount the patron owes in fines
+        _patron_class (str): the class of the Patron, which the LoanPolicy of a Library may set different terms for
+        _checked_out_items (dict): the LibraryItem's the patron currently has checked_out, as the keys of a dict used as
+        an ordered set
+        _fine_cents (int): refers to the amount the patron owed in fines on _fine_settled_date, in cents
+        _fine_settled_date (int): the date up to which overdue fines have been added to _fine_cents
+        _overdue_count (int): the number of checked_out items that are currently overdue
+        _fine_rate (int): the fine added for each day after _fine_settled_date, in cents
+        _library (Library): the Library the patron is a member of, if any, which provides the current date
     """
 
-    def __init__(self, patron_id, name):
+    __slots__ = (
+        "_patron_id", "_name", "_patron_class", "_checked_out_items", "_fine_cents", "_fine_settled_date",
+        "_overdue_count", "_fine_rate", "_library",
+    )
+
+    def __init__(self, patron_id, name, patron_class=DEFAULT_PATRON_CLASS):
         """
         Initializes a new Patron with an ID and name.
 
         :param:
             patron_id (str): The unique identifier for the patron.
             name (str): The name of the patron.
+            patron_class (str): The class of the patron, such as "standard", "student" or "faculty".
         """
         self._patron_id = patron_id
         self._name = name
-        self._checked_out_items = []  # List of currently checked out LibraryItems
-        self._fine_amount = 0.0  # Initial fine amount
+        self._patron_class = patron_class
+        self._checked_out_items = {}  # Currently checked out LibraryItems, in the order they were checked out
+        self._fine_cents = 0  # Initial fine amount
+        self._fine_settled_date = 0  # Fines are up to date as of day 0
+        self._overdue_count = 0  # No overdue items initially
+        self._fine_rate = 0  # No fine accruing initially
+        self._library = None  # Not a member of a Library yet
 
     def get_patron_id(self):
         """
@@ -288,6 +461,15 @@ class Patron:
         """
         return self._name
 
+    def get_patron_class(self):
+        """
+        Gets the class of the patron, which decides the terms of their loans.
+
+        :return:
+            str: The patron_class.
+        """
+        return self._patron_class
+
     def get_fine_amount(self):
         """
         Gets the amount of the current fine
@@ -295,226 +477,1823 @@ class Patron:
         :return:
             float: The amount of fines the patron currently owes.
             """
-        if self._fine_amount < 0:
-            self._fine_amount = 0.0
+        if self._library is None or not self._fine_rate:
+            return self._fine_cents / 100
 
-        return round(self._fine_amount, 2)
+        # Worked out without settling, so reading a fine never changes the patron
+        return (self._fine_cents + self._fine_rate * (self._library._current_date - self._fine_settled_date)) / 100
 
     def add_library_item(self, library_item):
         """
-        Adds a LibraryItem to the list of items checked_out to Patron
+        Adds a LibraryItem to the items checked_out to Patron
         """
-        self._checked_out_items.append(library_item)
+        self._checked_out_items[library_item] = None
 
     def remove_library_item(self, library_item):
         """
-        Removes a LibraryItem from the list of items checked_out to Patron
+        Removes a LibraryItem from the items checked_out to Patron
         """
-        self._checked_out_items.remove(library_item)
+        del self._checked_out_items[library_item]
 
     def amend_fine(self, amount):
         """
-        Amends the amount of the fine by the specified additional amount
+        Amends the amount of the fine by the specified additional amount, rounded to the nearest cent. For a member of
+        a Library, the Library makes the change, so it can record it like its other operations.
+        """
+        if self._library is not None:
+            self._library._amend_fine(self, amount)
+        else:
+            self._amend_fine(amount)
+
+    def _amend_fine(self, amount):
+        """
+        Amends the amount of the fine by the specified additional amount, rounded to the nearest cent, no lower than
+        zero.
         """
-        self._fine_amount += amount
+        if self._library is not None:
+            if self._library._snapshots:
+                self._library._preserve_patron(self)
+            self._settle_fine(self._library._current_date)
 
-        if self._fine_amount < 0:
-            self._fine_amount = 0.0
+        self._fine_cents += round(amount * 100)
 
+        if self._fine_cents < 0:
+            self._fine_cents = 0
 
-class Library:
+        if self._library is not None:
+            self._library._reindex_fine(self)
+
+    def _settle_fine(self, date):
+        """
+        Adds the fines accrued by overdue items since _fine_settled_date to _fine_cents, up to the given date.
+
+        :param:
+            date (int): The date to bring the fine up to; never earlier than _fine_settled_date.
+        """
+        if self._fine_rate:
+            self._fine_cents += self._fine_rate * (date - self._fine_settled_date)
+        self._fine_settled_date = date
+
+
+class HoldQueue:
     """
-    A Library object represents a library that holds LibraryItems and serves each Patron. It has three additional data
-    members.
+    A HoldQueue object holds the patrons waiting for a LibraryItem, served by priority tier and then first come,
+    first served. It has three data members.
+
+    The holds are kept in a list sorted so that the next patron to serve is last, which makes handing the item to
+    them a pop from the end, and finding a patron's position a binary search. Adding, cancelling and moving a hold
+    find their place by binary search too, but then insert into or delete from the middle of the list, which shifts
+    the holds after it: they are O(n) in the length of the queue. The shift is a single memory move of n pointers,
+    which stays around a microsecond per hold up to queues of ten thousand holds, far more than a popular item gets,
+    and unlike a heap the sorted list gives each patron's position without scanning.
 
     Attributes:
-        _holdings (dict): A list of library items in the library.
-        _members (dict): A list of patrons who are members of the library.
-        _current_date (int): The current date, tracked as an integer.
+        _holds (list): a (priority, -sequence, patron) tuple per hold, sorted so the next patron to serve is last
+        _hold_keys (dict): the tuple in _holds of each patron, keyed by patron
+        _next_sequence (int): the sequence number of the next hold, recording the order holds were placed in
     """
 
+    __slots__ = ("_holds", "_hold_keys", "_next_sequence")
+
     def __init__(self):
         """
-        Initializes a new Library with empty holdings and members, and sets the current date to 0.
+        Initializes an empty HoldQueue.
         """
-        self._holdings = []  # List of LibraryItems in the Library
-        self._members = []  # List of Patrons who are members of the Library
-        self._current_date = 0  # Days since the Library object was created
+        self._holds = []
+        self._hold_keys = {}
+        self._next_sequence = 0
 
-    def add_library_item(self, library_item):
+    def __len__(self):
         """
-        Adds a LibraryItem to the Library's list of holdings.
+        Gets the number of patrons in the HoldQueue.
         """
-        self._holdings.append(library_item)
+        return len(self._holds)
 
-    def add_patron(self, patron):
+    def __contains__(self, patron):
         """
-        Adds a Patron to the Library's list of members.
+        Checks whether a patron is in the HoldQueue.
         """
-        self._members.append(patron)
+        return patron in self._hold_keys
 
+    def add(self, patron, priority=0):
+        """
+        Adds a hold for a patron, behind every hold of the same or higher priority, in O(n) for the insert.
 
-    def lookup_library_item_from_id(self, library_item_id):
+        :param:
+            patron (Patron): The patron placing the hold.
+            priority (int): The priority tier of the hold; higher tiers are served first.
         """
-        Searches for a library item by its library_item_id and returns it, or None if not found.
+        key = (priority, -self._next_sequence, patron)
+        self._next_sequence += 1
+        self._hold_keys[patron] = key
+        insort(self._holds, key)
+
+    def remove(self, patron):
+        """
+        Removes the hold of a patron, in O(n) for the delete.
+
+        :param:
+            patron (Patron): The patron whose hold is removed.
 
         :return:
-            str: the library_item_id, a unique identifier for each individual item
-            OR
-            None, if no library_item_id is found
+            tuple: The (priority, -sequence, patron) key of the removed hold.
         """
-        for item in self._holdings:
-            if item.get_library_item_id() == library_item_id:
-                return item
-        return None
+        key = self._hold_keys.pop(patron)
+        del self._holds[bisect_left(self._holds, key)]
+        return key
 
-    def lookup_patron_from_id(self, patron_id):
+    def set_priority(self, patron, priority):
         """
-        Searches for a patron by their patron_id and returns them, or None if not found.
+        Moves the hold of a patron to another priority tier, keeping its place in the order holds were placed, in O(n)
+        for the delete and insert.
+
+        :param:
+            patron (Patron): The patron whose hold is moved.
+            priority (int): The new priority tier of the hold.
+        """
+        key = (priority, self.remove(patron)[1], patron)
+        self._hold_keys[patron] = key
+        insort(self._holds, key)
+
+    def peek(self):
+        """
+        Gets the next patron to serve, without removing their hold.
 
         :return:
-            str: the patron_id, a unique identifier for each individual patron
-            OR
-            None, if no patron_id is found
+            Patron: The next patron to serve, or None if the HoldQueue is empty.
         """
-        for member in self._members:
-            if member._patron_id == patron_id:
-                return member
-        return None
+        return self._holds[-1][2] if self._holds else None
 
-    def check_out_library_item(self, patron_id, library_item_id):
+    def pop(self):
         """
-        Checks out a LibraryItem to a patron, if library_item_id is available, ON_SHELF.
+        Removes and returns the next patron to serve, in O(1).
+
+        :return:
+            Patron: The next patron to serve, or None if the HoldQueue is empty.
+        """
+        if not self._holds:
+            return None
+        patron = self._holds.pop()[2]
+        del self._hold_keys[patron]
+        return patron
+
+    def remove_non_members(self, library):
+        """
+        Removes the holds of patrons who are no longer members of a Library.
 
         :param:
-            patron_id (str): The patron_id of the patron checking out the LibraryItem.
-            library_item_id (str): The library_item_id of the item being checked out by the patron.
+            library (Library): The Library the patrons must be members of.
 
         :return:
-            str: The result of the checkout attempt.
+            bool: Whether any hold was removed.
         """
-        patron = self.lookup_patron_from_id(patron_id)
-        library_item = self.lookup_library_item_from_id(library_item_id)
+        holds = [key for key in self._holds if key[2]._library is library]
+        if len(holds) == len(self._holds):
+            return False
+        self._holds = holds
+        self._hold_keys = {key[2]: key for key in holds}
+        return True
 
-        if patron is None:
-            return "patron not found"
-        if library_item is None:
-            return "item not found"
-        if library_item.get_checked_out_by() is not None:
-            return "item already checked out"
-        if library_item.get_requested_by() is not None and library_item.get_requested_by() != patron:
-            return "item on hold by other patron"
+    def count_members(self):
+        """
+        Counts the holds of patrons who are still members of a Library, in O(n).
 
-        # Update the library item and patron
-        library_item.set_checked_out_by(patron)
-        library_item.set_date_checked_out(self._current_date)
-        library_item.set_location("CHECKED_OUT")
-        patron.add_library_item(library_item)
+        :return:
+            int: The number of holds of members.
+        """
+        return sum(1 for key in self._holds if key[2]._library is not None)
 
-        # If the item was on hold by this patron, update requested_by
-        if library_item.get_requested_by() == patron:
-            library_item.set_requested_by(None)
+    def position(self, patron):
+        """
+        Gets how many patrons will be served before a patron, in O(log n).
 
-        return "check out successful"
+        :param:
+            patron (Patron): The patron whose position is wanted; must be in the HoldQueue.
 
-    def return_library_item(self, library_item_id):
+        :return:
+            int: The number of holds ahead of the patron's hold.
         """
-        Returns a LibraryItem to the Library.
+        return len(self._holds) - 1 - bisect_left(self._holds, self._hold_keys[patron])
+
+
+class LibrarySnapshot:
+    """
+    A LibrarySnapshot object is a point-in-time view of a Library for reports. Taking one only copies the references
+    of the holdings and members; the Library keeps serving while the snapshot is read. Before an operation first
+    changes an item or patron, the Library saves its state as it was into every open snapshot, so a snapshot reads the
+    saved state of items and patrons that have changed since it was taken and the live state of the rest.
+
+    A reader reads the live state of an item or patron and only then checks for a saved state. Operations save the
+    state before changing anything, so if none has been saved by then, nothing the reader read had been changed yet.
+
+    Attributes:
+        _library (Library): the Library the snapshot was taken of
+        _current_date (int): the current date of the Library when the snapshot was taken
+        _library_items (tuple): the library items in the holdings when the snapshot was taken
+        _patrons (tuple): the patrons who were members when the snapshot was taken
+        _item_states (dict): the saved (location, checked_out_by, requested_by, date_checked_out, due_date) of each
+        item changed since the snapshot was taken
+        _patron_states (dict): the saved (fine_cents, fine_settled_date, overdue_count, fine_rate, checked_out_items)
+        of each patron changed since the snapshot was taken
+    """
+
+    def __init__(self, library):
+        """
+        Takes a snapshot of a Library.
 
         :param:
-            library_item_id (str): The library_item_id of the item to be returned.
+            library (Library): The Library to take a snapshot of.
+        """
+        self._library = library
+        self._current_date = library._current_date
+        self._library_items = tuple(library._holdings.values())
+        self._patrons = tuple(library._members.values())
+        self._item_states = {}
+        self._patron_states = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the snapshot, so the Library stops saving state for it.
+        """
+        self._library._release_snapshot(self)
+
+    def _item_state(self, library_item):
+        """
+        Gets the state of a LibraryItem as it was when the snapshot was taken.
+        """
+        state = (library_item._location, library_item._checked_out_by, library_item._requested_by,
+                 library_item._date_checked_out, library_item._due_date)
+        return self._item_states.get(library_item, state)
+
+    def _patron_state(self, patron):
+        """
+        Gets the state of a Patron as it was when the snapshot was taken.
+        """
+        state = (patron._fine_cents, patron._fine_settled_date, patron._overdue_count, patron._fine_rate,
+                 tuple(patron._checked_out_items))
+        return self._patron_states.get(patron, state)
+
+    def get_current_date(self):
+        """
+        Gets the date the snapshot was taken on.
+        """
+        return self._current_date
+
+    def get_library_items(self):
+        """
+        Gets the library items in the holdings when the snapshot was taken.
+        """
+        return self._library_items
+
+    def get_patrons(self):
+        """
+        Gets the patrons who were members when the snapshot was taken.
+        """
+        return self._patrons
+
+    def get_location(self, library_item):
+        """
+        Gets the location of a LibraryItem when the snapshot was taken.
+        """
+        return self._item_state(library_item)[0]
+
+    def get_checked_out_by(self, library_item):
+        """
+        Gets the Patron who had a LibraryItem checked out when the snapshot was taken, if any.
+        """
+        return self._item_state(library_item)[1]
+
+    def get_requested_by(self, library_item):
+        """
+        Gets the Patron a LibraryItem was held for when the snapshot was taken, if any.
+        """
+        return self._item_state(library_item)[2]
+
+    def get_due_date(self, library_item):
+        """
+        Gets the due date of a LibraryItem checked out when the snapshot was taken, if it was.
+        """
+        return self._item_state(library_item)[4]
+
+    def get_checked_out_items(self, patron):
+        """
+        Gets the LibraryItems a Patron had checked out when the snapshot was taken, in the order they were checked out.
+        """
+        return self._patron_state(patron)[4]
+
+    def get_fine_amount(self, patron):
+        """
+        Gets the fine a Patron owed when the snapshot was taken.
 
         :return:
-            str: A string message return of the result of the item return attempt.
+            float: The amount of fines the patron owed.
         """
-        library_item = self.lookup_library_item_from_id(library_item_id)
+        fine_cents, fine_settled_date, _, fine_rate, _ = self._patron_state(patron)
+        # The fine rate has not changed since the snapshot, so the fine may be worked back from a later settle
+        return (fine_cents + fine_rate * (self._current_date - fine_settled_date)) / 100
 
-        if library_item is None:
-            return "item not found"
-        if library_item.get_checked_out_by() is None:
-            return "item already in library"
+    def get_inventory_by_location(self):
+        """
+        Gets the library items in each location when the snapshot was taken.
 
-        # Update the patron's checked out items
-        patron = library_item.get_checked_out_by()
-        patron.remove_library_item(library_item)
+        :return:
+            dict: The list of LibraryItems in each of "ON_SHELF", "ON_HOLD_SHELF" and "CHECKED_OUT".
+        """
+        inventory = {location: [] for location in LOCATIONS}
+        for library_item in self._library_items:
+            inventory[self._item_state(library_item)[0]].append(library_item)
+        return inventory
 
-        # Check if the item is on hold
-        if library_item.get_requested_by() is not None:
-            library_item.set_location("ON_HOLD_SHELF")
-        else:
-            library_item.set_location("ON_SHELF")
+    def get_overdue_items(self):
+        """
+        Gets the library items that were overdue when the snapshot was taken, longest overdue first.
 
-        # Update the checked_out_by
-        library_item.set_checked_out_by(None)
-        return "return successful"
+        :return:
+            list: A (LibraryItem, Patron, days overdue) tuple for each overdue item.
+        """
+        overdue = []
+        for library_item in self._library_items:
+            _, checked_out_by, _, _, due_date = self._item_state(library_item)
+            if checked_out_by is not None and due_date < self._current_date:
+                overdue.append((library_item, checked_out_by, self._current_date - due_date))
+        overdue.sort(key=lambda entry: (-entry[2], entry[0].get_library_item_id()))
+        return overdue
+
+
+class Library:
+    """
+    A Library object represents a library that holds LibraryItems and serves each Patron. It has seventeen additional
+    data members.
+
+    Each Library is a branch with its own LoanPolicy, compiled into a table of loan terms keyed by (item class, patron
+    class), so a checkout finds the loan days, daily fine, fine cap, grace days and renewal limit of its loan with a
+    single lookup. A loan keeps the terms it was checked out with.
+
+    Rather than scanning every loan each day, the Library files each checked out item in a calendar under the next date
+    its loan changes: the first date it will be overdue, then the first date it is fined, after its grace days, and the
+    date it reaches its fine cap. Advancing the date only touches the loans filed under the dates passed over, and each
+    Patron accrues fines lazily from there.
+
+    Totals of the loans and fines are kept up to date as they change, along with an index of every patron who owes a
+    fine or has an overdue item, so delinquency reports only touch the patrons they report. A patron's fine is
+    base + fine rate * current date, where the base only changes when a fine is paid or amended or the fine rate or
+    overdue count changes, so the index groups patrons by overdue count and fine rate and sorts each group by base.
+
+    The items in the holdings are also indexed by kind and location, and each change of location refiles its item, so
+    inventory counts come from the sizes of the index entries and inventory lists only touch the items they list.
+
+    Attributes:
+        _holdings (dict): The library items in the library, keyed by library_item_id.
+        _members (dict): The patrons who are members of the library, keyed by patron_id.
+        _current_date (int): The current date, tracked as an integer.
+        _overdue_calendar (dict): Sets of checked out LibraryItems, keyed by the next date the loan of each changes.
+        _loan_terms (LoanTermsTable): The terms of a loan, keyed by (LibraryItem class, patron class).
+        _catalog (Catalog): An on-disk catalog whose items join the holdings when first looked up, if any.
+        _cache (LibraryCache): The cache bounding how many looked up items stay in the holdings, if any.
+        _inventory (dict): Sets of the LibraryItems in the holdings, keyed by (LibraryItem class, location).
+        _search_index (SearchIndex): An index of the titles and creators of the holdings, if searching is enabled.
+        _notifications (NotificationQueue): The queue that due-soon, overdue and hold-ready notices are recorded in, if
+        notifications are enabled.
+        _loan_count (int): The number of items checked out.
+        _overdue_loan_count (int): The number of checked out items that are overdue.
+        _fine_base_total (int): The sum of the fine bases of every patron in the fine index, in cents.
+        _fine_rate_total (int): The sum of the fine rates of every patron, in cents per day.
+        _fine_index (dict): Sorted lists of (fine base, patron_id), keyed by (overdue count, fine rate), of each patron
+        who owes a fine or has an overdue item.
+        _fine_keys (dict): The ((overdue count, fine rate), (fine base, patron_id)) each patron is filed under in the
+        fine index.
+        _snapshots (tuple): The open LibrarySnapshots, which items and patrons are saved into before they change.
+        _withdrawn_ids (set): The library_item_ids of removed items of the attached catalog, which are not loaded again.
+        _removed_patron_count (int): The number of patrons removed since the last compaction, whose holds may remain.
+    """
 
-    def request_library_item(self, patron_id, library_item_id):
+    def __init__(self):
         """
-        Requests a LibraryItem to be held for a patron, if available, and places LibraryItem to ON_HOLD_SHELF.
+        Initializes a new Library with empty holdings and members, and sets the current date to 0.
+        """
+        self._holdings = {}  # LibraryItems in the Library, keyed by library_item_id
+        self._members = {}  # Patrons who are members of the Library, keyed by patron_id
+        self._current_date = 0  # Days since the Library object was created
+        self._overdue_calendar = {}  # Date -> set of LibraryItems whose loans change that day
+        self._loan_terms = LoanPolicy().compile((Book, Album, Movie))  # The default policy
+        self._catalog = None  # No on-disk catalog
+        self._cache = None  # Looked up items stay in the holdings
+        self._inventory = {}  # (LibraryItem class, location) -> set of LibraryItems there
+        self._search_index = None  # Searching is not enabled
+        self._notifications = None  # Notifications are not enabled
+        self._loan_count = 0  # No items checked out
+        self._overdue_loan_count = 0  # No items overdue
+        self._fine_base_total = 0  # No fines owed
+        self._fine_rate_total = 0  # No fines accruing
+        self._fine_index = {}  # (Overdue count, fine rate) -> sorted list of (fine base, patron_id)
+        self._fine_keys = {}  # Patron -> ((overdue count, fine rate), (fine base, patron_id)) in the fine index
+        self._snapshots = ()  # No open snapshots
+        self._withdrawn_ids = set()  # No catalog items removed
+        self._removed_patron_count = 0  # No patrons removed
+
+    def add_library_item(self, library_item):
+        """
+        Adds a LibraryItem to the Library's holdings, indexed by its library_item_id.
 
         :param:
-            patron_id (str): The unique identifier, patron_id, of the patron requesting the item be placed on hold.
-            library_item_id (str): The unique identifier, library_item_id, of the item that the patron is requesting to
-            be placed on hold.
+            library_item (LibraryItem): The item to add to the holdings.
 
         :return:
-            str: A message indicating the result of the request for the item to be placed on hold.
+            str: A message indicating the result of adding the item.
         """
-        patron = self.lookup_patron_from_id(patron_id)
-        library_item = self.lookup_library_item_from_id(library_item_id)
+        library_item_id = library_item.get_library_item_id()
+        if library_item_id in self._holdings or (self._catalog is not None and library_item_id in self._catalog
+                                                 and library_item_id not in self._withdrawn_ids):
+            return "duplicate item id"
 
-        if patron is None:
-            return "patron not found"
-        if library_item is None:
-            return "item not found"
-        if library_item.get_requested_by() is not None:
-            return "item already on hold"
+        self._holdings[library_item_id] = library_item
+        self._index_item(library_item)
+        self._withdrawn_ids.discard(library_item_id)
+        self._index_search(library_item)
+        return "item added"
 
-        # Update the library item
-        library_item.set_requested_by(patron)
-        if library_item.get_location() == "ON_SHELF":
-            library_item.set_location("ON_HOLD_SHELF")
+    def set_loan_policy(self, policy):
+        """
+        Sets the LoanPolicy of the Library. Loans checked out from then on get their terms from the new policy; loans
+        already checked out keep theirs.
 
-        return "request successful"
+        :param:
+            policy (LoanPolicy): The lending rules of the Library.
+        """
+        self._loan_terms = policy.compile((Book, Album, Movie))
 
-    def pay_fine(self, patron_id, amount):
+    def attach_catalog(self, catalog):
         """
-        Processes a fine payment for a Patron.
+        Attaches an on-disk catalog to the Library. Its items are part of the holdings, on the shelf, but each one is
+        only built as a LibraryItem and added to _holdings the first time it is looked up.
 
-        The amount specified will reduce the patron's outstanding fines. If the amount exceeds the current fine,
-        the fine amount will be reduced to zero (no refunds are given for overpayment).
+        :param:
+            catalog (Catalog): The catalog to attach.
+        """
+        self._catalog = catalog
+
+    def attach_cache(self, cache):
+        """
+        Attaches a cache to the Library, which evicts the least recently looked up items at rest from the holdings, to
+        be built from the attached catalog again when next looked up. Items in the holdings are only tracked from when
+        they are next looked up.
+
+        The catalog must be able to store items, such as a SQLiteCatalog, so that evicted items keep their state. A
+        read-only Catalog could only take back items unchanged from their records, so once most items had circulated
+        the cache could no longer bound them.
 
         :param:
-            patron_id (str): The unique identifier for the Patron paying the fine.
-            amount (float): The amount of money the Patron is paying toward their fine.
+            cache (LibraryCache): The empty cache to attach.
+        """
+        if self._catalog is None:
+            raise ValueError("a cache needs an attached catalog to load evicted items from")
+        if getattr(self._catalog, "store_library_items", None) is None:
+            raise ValueError("a cache needs a catalog that can store items to write evicted items back to")
+        self._cache = cache
 
-        :return:
-            str: A message indicating the result of the fine payment
+    def attach_search_index(self, search_index):
         """
-        patron = self.lookup_patron_from_id(patron_id)
-        print(f"Lookup for patron '{patron_id}' resulted in: {patron}")
+        Attaches a search index to the Library, indexing the current holdings and every item added from now on.
+        Items of an attached catalog are not indexed.
 
-        if patron is None:
-            return "patron not found"
+        :param:
+            search_index (SearchIndex): The empty index to attach.
+        """
+        for library_item in self._holdings.values():
+            search_index.add_library_item(library_item)
+        self._search_index = search_index
 
-        # Amend the fine
-        print(f"Amending fine for patron '{patron_id}' by ${amount:.2f}")
-        patron.amend_fine(-amount)
-        print(f"New fine amount: ${patron.get_fine_amount():.2f}")
-        return "payment successful"
+    def _index_search(self, library_item):
+        """
+        Adds a LibraryItem to the attached search index, if any.
+        """
+        if self._search_index is not None:
+            self._search_index.add_library_item(library_item)
 
-    def increment_current_date(self):
+    def _unindex_search(self, library_item):
+        """
+        Takes a LibraryItem out of the attached search index, if it is in it.
+        """
+        if self._search_index is not None and library_item in self._search_index:
+            self._search_index.remove_library_item(library_item)
+
+    def _is_searchable(self, library_item):
         """
-        Advances the current date for the library.
+        Checks whether a LibraryItem is in the attached search index.
+        """
+        return self._search_index is not None and library_item in self._search_index
+
+    def attach_notifications(self, notifications):
+        """
+        Attaches a notification queue to the Library, recording notices of loans coming due, loans falling overdue and
+        items put on the hold shelf from now on.
+
+        :param:
+            notifications (NotificationQueue): The empty queue to attach.
+        """
+        self._notifications = notifications
+
+    def pull_notifications(self, limit=1000):
+        """
+        Takes the next batch of notifications from the attached queue.
 
-        Upon each incremented date, the function checks all LibraryItems that are checked out. If an item has been
-        checked out beyond its allowed check-out length, the patron's fine is increased by $0.10 per day overdue.
+        :param:
+            limit (int): The greatest number of notifications to take.
+
+        :return:
+            list: A (kind, date, LibraryItem, Patron) tuple for each notification, empty once none are waiting
+        """
+        if self._notifications is None:
+            return []
+        return self._notifications.pull(self, limit)
+
+    def iter_notifications(self, batch_size=1000):
+        """
+        Yields the waiting notifications in batches, until none are left.
+
+        :param:
+            batch_size (int): The greatest number of notifications in each batch.
+
+        :return:
+            generator: Lists of (kind, date, LibraryItem, Patron) tuples.
+        """
+        while True:
+            batch = self.pull_notifications(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def search(self, query, field=None, prefix=False, limit=10):
+        """
+        Searches the attached search index for the items matching every word of a query, best match first.
+
+        :param:
+            query (str): The words to search for in titles, authors, artists and directors, in any case.
+            field (str): Only match words in this field, "title", "author", "artist" or "director", if given.
+            prefix (bool): Whether the last word of the query matches any word it is the start of.
+            limit (int): The greatest number of results to return.
+
+        :return:
+            list: The matching LibraryItems, or an empty list if no search index is attached.
+        """
+        if self._search_index is None:
+            return []
+        return self._search_index.search(query, field, prefix, limit)
+
+    def add_patron(self, patron):
+        """
+        Adds a Patron to the Library's members, indexed by their patron_id.
+
+        :param:
+            patron (Patron): The patron to add to the members.
+
+        :return:
+            str: A message indicating the result of adding the patron.
+        """
+        patron_id = patron.get_patron_id()
+        if patron_id in self._members:
+            return "duplicate patron id"
+
+        self._members[patron_id] = patron
+        patron._library = self
+        patron._fine_settled_date = self._current_date
+        return "patron added"
+
+    def lookup_library_item_from_id(self, library_item_id):
+        """
+        Searches for a library item by its library_item_id and returns it, or None if not found.
+
+        :return:
+            LibraryItem: the LibraryItem with the given library_item_id
+            OR
+            None, if no library_item_id is found
+        """
+        return self._lookup_library_item(library_item_id)
+
+    def _lookup_library_item(self, library_item_id):
+        """
+        Searches for a library item by its library_item_id, building it from the attached catalog if it is not in the
+        holdings, for lookup_library_item_from_id and the operations of the Library.
+        """
+        library_item = self._holdings.get(library_item_id)
+        if library_item is None:
+            if self._catalog is not None and library_item_id not in self._withdrawn_ids:
+                library_item = self._catalog.load_library_item(library_item_id)
+                if library_item is not None:
+                    self._holdings[library_item_id] = library_item
+                    self._index_item(library_item)
+                    if self._cache is not None:
+                        self._cache_library_item(library_item, True)
+            return library_item
+        if self._removed_patron_count:
+            self._drop_removed_holds(library_item)
+        if self._cache is not None:
+            self._cache_library_item(library_item, False)
+        return library_item
+
+    def lookup_patron_from_id(self, patron_id):
+        """
+        Searches for a patron by their patron_id and returns them, or None if not found.
+
+        :return:
+            Patron: the Patron with the given patron_id
+            OR
+            None, if no patron_id is found
+        """
+        return self._members.get(patron_id)
+
+    def remove_library_item(self, library_item_id):
+        """
+        Removes a LibraryItem from the Library's holdings, withdrawing it from circulation. An item that is checked out
+        cannot be removed until it is returned; any holds on it are cancelled.
+
+        :param:
+            library_item_id (str): The library_item_id of the item to remove.
+
+        :return:
+            str: A message indicating the result of removing the item.
+        """
+        library_item = self._lookup_library_item(library_item_id)
+        if library_item is None:
+            return RESULT_MESSAGES[ITEM_NOT_FOUND]
+        if library_item._checked_out_by is not None:
+            return "item checked out"
+        if self._snapshots:
+            self._preserve_item(library_item)
+
+        del self._holdings[library_item_id]
+        self._unindex_item(library_item)
+        if self._cache is not None:
+            self._cache._discard(library_item_id)
+        if self._catalog is not None and library_item_id in self._catalog:
+            self._withdrawn_ids.add(library_item_id)
+        self._unindex_search(library_item)
+
+        # Let go of the patrons waiting for the item
+        library_item._hold_queue = None
+        library_item.set_requested_by(None)
+        library_item.set_location("ON_SHELF")
+        return "item removed"
+
+    def remove_patron(self, patron_id):
+        """
+        Removes a Patron from the Library's members. A patron who has items checked out or owes a fine cannot be
+        removed.
+
+        The patron's holds are not searched for. Each one is dropped the next time its item is looked up, and every
+        hold left is dropped by compact, which runs once COMPACTION_THRESHOLD patrons have been removed.
+
+        :param:
+            patron_id (str): The patron_id of the patron to remove.
+
+        :return:
+            str: A message indicating the result of removing the patron.
+        """
+        result = self._remove_patron(self.lookup_patron_from_id(patron_id))
+        if self._removed_patron_count >= COMPACTION_THRESHOLD:
+            self.compact()
+        return result
+
+    def _remove_patron(self, patron):
+        """
+        Removes a Patron from the Library's members, if they have nothing checked out and owe nothing.
+
+        :param:
+            patron (Patron): The patron to remove, or None if the patron was not found.
+
+        :return:
+            str: A message indicating the result of removing the patron.
+        """
+        if patron is None:
+            return RESULT_MESSAGES[PATRON_NOT_FOUND]
+        if patron._checked_out_items:
+            return "patron has items checked out"
+        if patron.get_fine_amount() > 0:
+            return "patron owes a fine"
+
+        del self._members[patron._patron_id]
+        patron._library = None
+        self._removed_patron_count += 1
+        return "patron removed"
+
+    def _drop_removed_holds(self, library_item):
+        """
+        Drops the holds on a LibraryItem of patrons who are no longer members, putting an item on the hold shelf for
+        a removed patron on the hold shelf for the next patron instead.
+
+        :param:
+            library_item (LibraryItem): The item whose holds are checked.
+
+        :return:
+            bool: Whether any hold was dropped.
+        """
+        hold_queue = library_item._hold_queue
+        requested_by = library_item._requested_by
+        removed_holder = requested_by is not None and requested_by._library is not self
+        if hold_queue is None and not removed_holder:
+            return False
+        if not removed_holder and all(key[2]._library is self for key in hold_queue._holds):
+            return False
+        if self._snapshots:
+            self._preserve_item(library_item)
+
+        if hold_queue is not None:
+            hold_queue.remove_non_members(self)
+            if not hold_queue:
+                library_item._hold_queue = None
+        if library_item._location == "ON_HOLD_SHELF":
+            if removed_holder:
+                self._hold_for_next_patron(library_item)
+        elif library_item._location == "CHECKED_OUT":
+            library_item.set_requested_by(None if library_item._hold_queue is None else library_item._hold_queue.peek())
+        return True
+
+    def compact(self):
+        """
+        Drops every hold of the patrons removed since the last compaction, so the memory they hold is reclaimed.
+        """
+        if not self._removed_patron_count:
+            return
+        for library_item in self._holdings.values():
+            if library_item._hold_queue is not None or library_item._requested_by is not None:
+                self._drop_removed_holds(library_item)
+        self._removed_patron_count = 0
+
+    def check_out_library_item(self, patron_id, library_item_id):
+        """
+        Checks out a LibraryItem to a patron, if library_item_id is available, ON_SHELF.
+
+        :param:
+            patron_id (str): The patron_id of the patron checking out the LibraryItem.
+            library_item_id (str): The library_item_id of the item being checked out by the patron.
+
+        :return:
+            str: The result of the checkout attempt.
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._check_out(patron, library_item)]
+
+    def return_library_item(self, library_item_id):
+        """
+        Returns a LibraryItem to the Library.
+
+        :param:
+            library_item_id (str): The library_item_id of the item to be returned.
+
+        :return:
+            str: A string message return of the result of the item return attempt.
+        """
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._return(library_item)]
+
+    def renew_library_item(self, library_item_id):
+        """
+        Renews the loan of a checked out LibraryItem, so it is due a full loan after the current date, unless another
+        patron is waiting for it or the loan has been renewed as many times as its terms allow.
+
+        :param:
+            library_item_id (str): The library_item_id of the item to be renewed.
+
+        :return:
+            str: A message indicating the result of the renewal.
+        """
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._renew(library_item)]
+
+    def renew_library_items(self, patron_id):
+        """
+        Renews every LibraryItem a patron has checked out in a single call, looking the patron up once and reaching
+        the items through their loans rather than by id.
+
+        :param:
+            patron_id (str): The patron_id of the patron renewing their loans.
+
+        :return:
+            dict: The message of the result of renewing each item, keyed by library_item_id, in the order the items
+            were checked out
+            OR
+            str: "patron not found", if no patron_id is found
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        if patron is None:
+            return RESULT_MESSAGES[PATRON_NOT_FOUND]
+
+        results = {}
+        for library_item in patron._checked_out_items:
+            # The items are not looked up, so holds of removed patrons are dropped here instead
+            if self._removed_patron_count and library_item._requested_by is not None:
+                self._drop_removed_holds(library_item)
+            results[library_item._library_item_id] = RESULT_MESSAGES[self._renew(library_item)]
+        return results
+
+    def request_library_item(self, patron_id, library_item_id, priority=0):
+        """
+        Requests a LibraryItem to be held for a patron, if available, and places LibraryItem to ON_HOLD_SHELF.
+
+        If the item is checked out or on hold for another patron, the patron joins its hold queue instead, served by
+        priority tier and then in the order the holds were placed.
+
+        :param:
+            patron_id (str): The unique identifier, patron_id, of the patron requesting the item be placed on hold.
+            library_item_id (str): The unique identifier, library_item_id, of the item that the patron is requesting to
+            be placed on hold.
+            priority (int): The priority tier of the hold; higher tiers are served first.
+
+        :return:
+            str: A message indicating the result of the request for the item to be placed on hold.
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._request(patron, library_item, priority)]
+
+    def cancel_hold(self, patron_id, library_item_id):
+        """
+        Cancels a patron's hold on a LibraryItem. If the item was on the hold shelf for them, it goes to the next
+        patron in its hold queue, or back on the shelf.
+
+        :param:
+            patron_id (str): The patron_id of the patron cancelling their hold.
+            library_item_id (str): The library_item_id of the item on hold.
+
+        :return:
+            str: A message indicating the result of cancelling the hold.
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._cancel_hold(patron, library_item)]
+
+    def promote_hold(self, patron_id, library_item_id, priority):
+        """
+        Moves a patron's waiting hold on a LibraryItem to another priority tier.
+
+        :param:
+            patron_id (str): The patron_id of the patron whose hold is moved.
+            library_item_id (str): The library_item_id of the item on hold.
+            priority (int): The new priority tier of the hold; higher tiers are served first.
+
+        :return:
+            str: A message indicating the result of moving the hold.
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        return RESULT_MESSAGES[self._promote_hold(patron, library_item, priority)]
+
+    def get_hold_position(self, patron_id, library_item_id):
+        """
+        Gets how many patrons will get a LibraryItem before a patron who has it on hold.
+
+        :param:
+            patron_id (str): The patron_id of the patron with the hold.
+            library_item_id (str): The library_item_id of the item on hold.
+
+        :return:
+            int: The number of holds ahead of the patron's hold, 0 if they are next
+            OR
+            None, if the patron or item is not found or the patron has no hold on the item
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        if patron is None or library_item is None:
+            return None
+        return self._hold_position(patron, library_item)
+
+    @staticmethod
+    def _hold_position(patron, library_item):
+        """
+        Gets how many patrons will get a LibraryItem before a patron, for get_hold_position and get_estimated_wait.
+
+        :return:
+            int: The number of holds ahead of the patron's hold, or None if they have no hold on the item.
+        """
+        if library_item._location == "ON_HOLD_SHELF":
+            if library_item._requested_by is patron:
+                return 0
+            offset = 1
+        else:
+            offset = 0
+        hold_queue = library_item._hold_queue
+        if hold_queue is None or patron not in hold_queue:
+            return None
+        return offset + hold_queue.position(patron)
+
+    def get_estimated_wait(self, patron_id, library_item_id):
+        """
+        Estimates how many days until a LibraryItem is available to a patron who has it on hold, assuming each patron
+        ahead of them keeps it for a full loan of the patron's own class.
+
+        :param:
+            patron_id (str): The patron_id of the patron with the hold.
+            library_item_id (str): The library_item_id of the item on hold.
+
+        :return:
+            int: The estimated number of days to wait
+            OR
+            None, if the patron or item is not found or the patron has no hold on the item
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        library_item = self._lookup_library_item(library_item_id)
+        if patron is None or library_item is None:
+            return None
+        position = self._hold_position(patron, library_item)
+        if position is None:
+            return None
+
+        wait = position * self._loan_terms[type(library_item), patron._patron_class][LOAN_DAYS]
+        if library_item._location == "CHECKED_OUT":
+            wait += max(0, library_item._due_date - self._current_date)
+        return wait
+
+    def pay_fine(self, patron_id, amount):
+        """
+        Processes a fine payment for a Patron.
+
+        The amount specified will reduce the patron's outstanding fines. If the amount exceeds the current fine,
+        the fine amount will be reduced to zero (no refunds are given for overpayment).
+
+        :param:
+            patron_id (str): The unique identifier for the Patron paying the fine.
+            amount (float): The amount of money the Patron is paying toward their fine.
+
+        :return:
+            str: A message indicating the result of the fine payment
+        """
+        patron = self.lookup_patron_from_id(patron_id)
+        debugging = logger.isEnabledFor(logging.DEBUG)
+        if debugging:
+            logger.debug("Lookup for patron '%s' resulted in: %s", patron_id, patron)
+
+        if patron is None:
+            return RESULT_MESSAGES[PATRON_NOT_FOUND]
+
+        # Amend the fine
+        result = self._pay_fine(patron, amount)
+        if debugging:
+            logger.debug("Amended fine for patron '%s' by $%.2f, new fine amount: $%.2f", patron_id, amount,
+                         patron.get_fine_amount())
+        return RESULT_MESSAGES[result]
+
+    def apply_transactions(self, transactions):
+        """
+        Processes a batch of circulation transactions in a single pass, in order.
+
+        Each transaction is a tuple whose first element names the operation:
+            ("check_out", patron_id, library_item_id)
+            ("return", library_item_id)
+            ("renew", library_item_id)
+            ("request", patron_id, library_item_id) or ("request", patron_id, library_item_id, priority)
+            ("pay_fine", patron_id, amount)
+
+        Each patron_id and library_item_id is looked up once per batch, and each transaction produces the same result
+        as calling the corresponding method on its own, given as a result code indexing RESULT_MESSAGES.
+
+        :param:
+            transactions (iterable): The transactions to process.
+
+        :return:
+            array: The result code of each transaction, in order.
+        """
+        cache = self._cache
+        if cache is None:
+            return self._apply_transactions(transactions)
+        # The batch keeps the items it has looked up, so none are evicted until it is done
+        cache._paused += 1
+        try:
+            return self._apply_transactions(transactions)
+        finally:
+            cache._paused -= 1
+
+    def _apply_transactions(self, transactions):
+        """
+        Processes a batch of circulation transactions in a single pass, for apply_transactions.
+        """
+        results = array("B")
+        patrons = {}
+        items = {}
+        lookup_patron = self.lookup_patron_from_id
+        lookup_item = self._lookup_library_item
+
+        for transaction in transactions:
+            operation = transaction[0]
+            if operation == "return" or operation == "renew":
+                library_item_id = transaction[1]
+                if library_item_id in items:
+                    library_item = items[library_item_id]
+                else:
+                    library_item = items[library_item_id] = lookup_item(library_item_id)
+                results.append(self._return(library_item) if operation == "return" else self._renew(library_item))
+                continue
+            if operation != "pay_fine" and operation != "check_out" and operation != "request":
+                # Checked before any field is read, as an unknown transaction may have too few of them
+                results.append(UNKNOWN_TRANSACTION)
+                continue
+
+            patron_id = transaction[1]
+            if patron_id in patrons:
+                patron = patrons[patron_id]
+            else:
+                patron = patrons[patron_id] = lookup_patron(patron_id)
+
+            if operation == "pay_fine":
+                results.append(PATRON_NOT_FOUND if patron is None else self._pay_fine(patron, transaction[2]))
+                continue
+
+            library_item_id = transaction[2]
+            if library_item_id in items:
+                library_item = items[library_item_id]
+            else:
+                library_item = items[library_item_id] = lookup_item(library_item_id)
+
+            if operation == "check_out":
+                results.append(self._check_out(patron, library_item))
+            else:
+                results.append(self._request(patron, library_item, transaction[3] if len(transaction) > 3 else 0))
+
+        return results
+
+    def _index_item(self, library_item):
+        """
+        Files a LibraryItem in the inventory index under its kind and location.
+        """
+        key = (type(library_item), library_item._location)
+        library_items = self._inventory.get(key)
+        if library_items is None:
+            library_items = self._inventory[key] = set()
+        library_items.add(library_item)
+
+    def _unindex_item(self, library_item):
+        """
+        Takes a LibraryItem out of the inventory index.
+        """
+        self._inventory[type(library_item), library_item._location].remove(library_item)
+
+    def _set_location(self, library_item, location):
+        """
+        Moves a LibraryItem in the holdings to a location, refiling it in the inventory index.
+
+        :param:
+            library_item (LibraryItem): The item that is moving.
+            location (str): The new location of the item, "ON_SHELF", "ON_HOLD_SHELF", or "CHECKED_OUT".
+        """
+        # The index is updated in place rather than through _unindex_item and _index_item, as every checkout, return
+        # and hold moves an item
+        inventory = self._inventory
+        kind = type(library_item)
+        inventory[kind, library_item._location].remove(library_item)
+        library_item.set_location(location)
+        try:
+            inventory[kind, location].add(library_item)
+        except KeyError:
+            inventory[kind, location] = {library_item}
+
+    def _cache_library_item(self, library_item, loaded):
+        """
+        Records a lookup of a LibraryItem in the attached cache, then evicts the items it let go of.
+
+        :param:
+            library_item (LibraryItem): The item looked up.
+            loaded (bool): Whether the item was built from the catalog.
+        """
+        library_items = self._cache._record(library_item, loaded)
+        if library_items:
+            self._evict_library_items(library_items)
+
+    def _evict_library_items(self, library_items):
+        """
+        Evicts the least recently used items the cache let go of from the holdings. Items that are checked out, held or
+        indexed for search are pinned and stay. The state of the rest is written back to the catalog first, in one
+        batch.
+
+        :param:
+            library_items (list): The items the cache let go of.
+        """
+        evicted = []
+        for library_item in library_items:
+            if (library_item._checked_out_by is not None or library_item._requested_by is not None
+                    or library_item._hold_queue or self._holdings.get(library_item._library_item_id) is not library_item
+                    or self._is_searchable(library_item)):
+                continue
+            evicted.append(library_item)
+
+        if evicted:
+            self._catalog.store_library_items(evicted)
+        for library_item in evicted:
+            del self._holdings[library_item._library_item_id]
+            self._unindex_item(library_item)
+        self._cache._evictions += len(evicted)
+
+    def _check_out(self, patron, library_item):
+        """
+        Checks out a LibraryItem to a Patron, if it is available.
+
+        :param:
+            patron (Patron): The patron checking out the item, or None if the patron was not found.
+            library_item (LibraryItem): The item being checked out, or None if the item was not found.
+
+        :return:
+            int: The result code of the checkout attempt.
+        """
+        if patron is None:
+            return PATRON_NOT_FOUND
+        if library_item is None:
+            return ITEM_NOT_FOUND
+        if library_item.get_checked_out_by() is not None:
+            return ITEM_ALREADY_CHECKED_OUT
+        if library_item.get_requested_by() is not None and library_item.get_requested_by() != patron:
+            return ITEM_ON_HOLD_BY_OTHER_PATRON
+        if self._snapshots:
+            self._preserve_item(library_item)
+            self._preserve_patron(patron)
+
+        # Update the library item and patron
+        library_item.set_checked_out_by(patron)
+        library_item.set_date_checked_out(self._current_date)
+        self._set_location(library_item, "CHECKED_OUT")
+        library_item._renewal_count = 0
+        patron.add_library_item(library_item)
+        loan_terms = self._loan_terms[type(library_item), patron._patron_class]
+        self._schedule_overdue(library_item, self._current_date + loan_terms[LOAN_DAYS], loan_terms)
+
+        # If the item was on hold by this patron, the next patron waiting for it, if any, is now first in line
+        if library_item.get_requested_by() == patron:
+            hold_queue = library_item._hold_queue
+            library_item.set_requested_by(None if hold_queue is None else hold_queue.peek())
+
+        return CHECK_OUT_SUCCESSFUL
+
+    def _return(self, library_item):
+        """
+        Returns a LibraryItem to the Library.
+
+        :param:
+            library_item (LibraryItem): The item being returned, or None if the item was not found.
+
+        :return:
+            int: The result code of the return attempt.
+        """
+        if library_item is None:
+            return ITEM_NOT_FOUND
+        if library_item.get_checked_out_by() is None:
+            return ITEM_ALREADY_IN_LIBRARY
+
+        # Update the patron's checked out items
+        patron = library_item.get_checked_out_by()
+        if self._snapshots:
+            self._preserve_item(library_item)
+            self._preserve_patron(patron)
+        patron.remove_library_item(library_item)
+        self._unschedule_overdue(library_item)
+
+        # Check if the item is on hold, and if so hold it for the next patron waiting for it
+        if library_item._hold_queue is not None:
+            self._hold_for_next_patron(library_item)
+        elif library_item.get_requested_by() is not None:
+            self._set_location(library_item, "ON_HOLD_SHELF")
+            if self._notifications is not None:
+                self._notifications._hold_ready(library_item, library_item._requested_by, self._current_date)
+        else:
+            self._set_location(library_item, "ON_SHELF")
+
+        # Update the checked_out_by
+        library_item.set_checked_out_by(None)
+        return RETURN_SUCCESSFUL
+
+    def _renew(self, library_item):
+        """
+        Renews the loan of a LibraryItem, moving it to its new due date in the overdue calendar in place. The loan is
+        due a full loan of its terms after the current date, or stays due when it was, if that is later. A loan that
+        was overdue stops accruing a fine; the fine accrued so far is kept, and counts against the fine cap and grace
+        days of the loan should it fall overdue again.
+
+        :param:
+            library_item (LibraryItem): The item being renewed, or None if the item was not found.
+
+        :return:
+            int: The result code of the renewal.
+        """
+        if library_item is None:
+            return ITEM_NOT_FOUND
+        if library_item._checked_out_by is None:
+            return ITEM_NOT_CHECKED_OUT
+        # While an item is checked out, _requested_by is the first patron waiting for it
+        if library_item._requested_by is not None:
+            return ITEM_ON_HOLD_BY_OTHER_PATRON
+        loan_terms = library_item._loan_terms
+        if library_item._renewal_count >= loan_terms[RENEWAL_LIMIT]:
+            return RENEWAL_LIMIT_REACHED
+        if self._snapshots:
+            self._preserve_item(library_item)
+            self._preserve_patron(library_item._checked_out_by)
+
+        self._reschedule_overdue(library_item, max(library_item._due_date,
+                                                   self._current_date + loan_terms[LOAN_DAYS]))
+        library_item._renewal_count += 1
+        return RENEWAL_SUCCESSFUL
+
+    def _request(self, patron, library_item, priority=0):
+        """
+        Places a hold on a LibraryItem for a Patron.
+
+        :param:
+            patron (Patron): The patron requesting the item, or None if the patron was not found.
+            library_item (LibraryItem): The item being requested, or None if the item was not found.
+            priority (int): The priority tier of the hold; higher tiers are served first.
+
+        :return:
+            int: The result code of the request.
+        """
+        if patron is None:
+            return PATRON_NOT_FOUND
+        if library_item is None:
+            return ITEM_NOT_FOUND
+
+        hold_queue = library_item._hold_queue
+        if library_item.get_requested_by() is patron or (hold_queue is not None and patron in hold_queue):
+            return ITEM_ALREADY_ON_HOLD
+        if self._snapshots:
+            self._preserve_item(library_item)
+
+        # An item on the shelf goes straight to the hold shelf for the patron
+        if library_item.get_location() == "ON_SHELF":
+            library_item.set_requested_by(patron)
+            self._set_location(library_item, "ON_HOLD_SHELF")
+            if self._notifications is not None:
+                self._notifications._hold_ready(library_item, patron, self._current_date)
+            return REQUEST_SUCCESSFUL
+
+        # Otherwise the patron waits in the item's hold queue
+        if hold_queue is None:
+            hold_queue = library_item._hold_queue = HoldQueue()
+        hold_queue.add(patron, priority)
+        if library_item.get_location() == "CHECKED_OUT":
+            library_item.set_requested_by(hold_queue.peek())
+        return REQUEST_SUCCESSFUL
+
+    def _cancel_hold(self, patron, library_item):
+        """
+        Cancels a Patron's hold on a LibraryItem.
+
+        :param:
+            patron (Patron): The patron cancelling their hold, or None if the patron was not found.
+            library_item (LibraryItem): The item on hold, or None if the item was not found.
+
+        :return:
+            int: The result code of cancelling the hold.
+        """
+        if patron is None:
+            return PATRON_NOT_FOUND
+        if library_item is None:
+            return ITEM_NOT_FOUND
+
+        hold_queue = library_item._hold_queue
+        if self._snapshots:
+            self._preserve_item(library_item)
+        if library_item.get_location() == "ON_HOLD_SHELF" and library_item.get_requested_by() is patron:
+            self._hold_for_next_patron(library_item)
+            return HOLD_CANCELLED
+        if hold_queue is None or patron not in hold_queue:
+            return NO_HOLD_BY_PATRON
+
+        hold_queue.remove(patron)
+        if library_item.get_location() == "CHECKED_OUT":
+            library_item.set_requested_by(hold_queue.peek())
+        return HOLD_CANCELLED
+
+    def _promote_hold(self, patron, library_item, priority):
+        """
+        Moves a Patron's waiting hold on a LibraryItem to another priority tier.
+
+        :param:
+            patron (Patron): The patron whose hold is moved, or None if the patron was not found.
+            library_item (LibraryItem): The item on hold, or None if the item was not found.
+            priority (int): The new priority tier of the hold.
+
+        :return:
+            int: The result code of moving the hold.
+        """
+        if patron is None:
+            return PATRON_NOT_FOUND
+        if library_item is None:
+            return ITEM_NOT_FOUND
+
+        hold_queue = library_item._hold_queue
+        if hold_queue is None or patron not in hold_queue:
+            return NO_HOLD_BY_PATRON
+        if self._snapshots:
+            self._preserve_item(library_item)
+
+        hold_queue.set_priority(patron, priority)
+        if library_item.get_location() == "CHECKED_OUT":
+            library_item.set_requested_by(hold_queue.peek())
+        return HOLD_PROMOTED
+
+    def _hold_for_next_patron(self, library_item):
+        """
+        Puts a LibraryItem that has come free on the hold shelf for the next eligible patron in its hold queue, or
+        back on the shelf if nobody eligible is waiting. Patrons who are no longer members are skipped.
+
+        :param:
+            library_item (LibraryItem): The item that has come free.
+        """
+        hold_queue = library_item._hold_queue
+        patron = None
+        if hold_queue is not None:
+            patron = hold_queue.pop()
+            while patron is not None and patron._library is not self:
+                patron = hold_queue.pop()
+            if not hold_queue:
+                library_item._hold_queue = None
+
+        library_item.set_requested_by(patron)
+        self._set_location(library_item, "ON_SHELF" if patron is None else "ON_HOLD_SHELF")
+        if patron is not None and self._notifications is not None:
+            self._notifications._hold_ready(library_item, patron, self._current_date)
+
+    def _pay_fine(self, patron, amount):
+        """
+        Reduces a Patron's outstanding fine by the amount paid, down to no less than zero.
+
+        :param:
+            patron (Patron): The patron paying the fine.
+            amount (float): The amount of money the patron is paying toward their fine.
+
+        :return:
+            int: The result code of the payment.
+        """
+        patron._amend_fine(-amount)
+        return PAYMENT_SUCCESSFUL
+
+    def _amend_fine(self, patron, amount):
+        """
+        Amends the fine of a Patron by an amount, for Patron.amend_fine.
+
+        :param:
+            patron (Patron): The patron whose fine is amended.
+            amount (float): The amount to add to the fine; negative to reduce it.
+        """
+        patron._amend_fine(amount)
+
+    def increment_current_date(self):
+        """
+        Advances the current date for the library by one day.
+
+        Each item that has been checked out beyond its allowed check-out length adds the daily fine of its loan to the
+        fine of the patron who has it checked out, once its grace days are over and until it reaches its fine cap.
+        """
+        self.advance_date(1)
+
+    def advance_date(self, days):
+        """
+        Advances the current date for the library by the given number of days in a single step.
+
+        Only the loans that change on one of the dates passed over are touched: those that fall overdue, start being
+        fined after their grace days, or reach their fine caps. The resulting fines are the same as calling
+        increment_current_date the same number of times.
+
+        :param:
+            days (int): The number of days to advance the current date by.
+        """
+        if days <= 0:
+            return
+
+        target_date = self._current_date + days
+        calendar = self._overdue_calendar
+        # A sorted list is already a heap; the dates loans are filed under while advancing are pushed onto it
+        if days <= len(calendar):
+            event_dates = list(range(self._current_date + 1, target_date + 1))
+        else:
+            event_dates = sorted(date for date in calendar if date <= target_date)
+        if self._notifications is not None:
+            self._notifications._date_advanced(self._current_date, target_date)
+
+        while event_dates:
+            event_date = heappop(event_dates)
+            loans = calendar.pop(event_date, None)
+            if loans is None:
+                continue
+            if self._notifications is not None:
+                self._notifications._fell_overdue(event_date, loans)
+            for next_date in self._change_loans(loans, event_date):
+                if next_date <= target_date:
+                    heappush(event_dates, next_date)
+
+        self._current_date = target_date
+
+    @staticmethod
+    def _loan_dates(library_item):
+        """
+        Gets the dates the loan of a checked out LibraryItem changes on, in order.
+
+        :return:
+            tuple: The first date the loan is overdue, the first date it is fined, or None if it never is, and the date
+            it reaches its fine cap, or None if it never does.
+        """
+        _, daily_fine_cents, fine_cap_cents, grace_days, _ = library_item._loan_terms
+        overdue_date = library_item._due_date + 1
+        if daily_fine_cents == 0 or fine_cap_cents == 0:
+            return overdue_date, None, None
+        fined_date = overdue_date + grace_days
+        if fine_cap_cents is None:
+            return overdue_date, fined_date, None
+        # The cap is reached on the day the fine first adds up to at least the cap
+        return overdue_date, fined_date, fined_date - (-fine_cap_cents // daily_fine_cents) - 1
+
+    def _loan_state(self, library_item, date):
+        """
+        Works out where the loan of a checked out LibraryItem stands once the changes of a date have been made.
+
+        :return:
+            tuple: Whether the loan is overdue, whether it adds its daily fine to its patron's fine rate, and the next
+            date it changes on, or None if it never changes again.
+        """
+        overdue_date, fined_date, capped_date = self._loan_dates(library_item)
+        fined = fined_date is not None and fined_date <= date and (capped_date is None or date < capped_date)
+        next_date = None
+        for change_date in (overdue_date, fined_date, capped_date):
+            if change_date is not None and change_date > date:
+                next_date = change_date
+                break
+        return overdue_date <= date, fined, next_date
+
+    def _change_loans(self, loans, date):
+        """
+        Makes the changes of a date to the loans filed under it in the calendar: each loan falls overdue, starts adding
+        its daily fine to its patron's fine rate, or reaches its fine cap and stops, or more than one of these. Each
+        loan that changes again is then filed under the next date it changes on.
+
+        :param:
+            loans (set): The checked out LibraryItems filed under the date.
+            date (int): The date the loans change on.
+
+        :return:
+            list: The dates the loans were filed under next.
+        """
+        next_dates = []
+        for library_item in loans:
+            patron = library_item._checked_out_by
+            if self._snapshots:
+                self._preserve_patron(patron)
+            patron._settle_fine(date - 1)
+
+            overdue_date, fined_date, capped_date = self._loan_dates(library_item)
+            _, daily_fine_cents, fine_cap_cents, _, _ = library_item._loan_terms
+            if date == overdue_date:
+                patron._overdue_count += 1
+            if date == fined_date:
+                patron._fine_rate += daily_fine_cents
+            if date == capped_date:
+                # The last day is only fined up to the cap, and the loan adds no more after it
+                patron._fine_rate -= daily_fine_cents
+                patron._fine_cents += fine_cap_cents - (capped_date - fined_date) * daily_fine_cents
+            self._reindex_fine(patron)
+
+            if fined_date is not None and fined_date > date:
+                next_date = fined_date
+            elif capped_date is not None and capped_date > date:
+                next_date = capped_date
+            else:
+                continue
+            self._file_loan(library_item, next_date)
+            next_dates.append(next_date)
+        return next_dates
+
+    def _file_loan(self, library_item, date):
+        """
+        Files a checked out LibraryItem in the overdue calendar under the next date its loan changes on.
+        """
+        loans = self._overdue_calendar.get(date)
+        if loans is None:
+            loans = self._overdue_calendar[date] = set()
+        loans.add(library_item)
+
+    def _unfile_loan(self, library_item, date):
+        """
+        Removes a checked out LibraryItem from the overdue calendar, where it is filed under the given date.
+        """
+        loans = self._overdue_calendar.get(date)
+        if loans is not None:
+            loans.discard(library_item)
+            if not loans:
+                del self._overdue_calendar[date]
+
+    def _schedule_overdue(self, library_item, due_date, loan_terms):
+        """
+        Starts the loan of a newly checked out LibraryItem, filing it in the overdue calendar under the day after its
+        due date.
+
+        :param:
+            library_item (LibraryItem): The item that was just checked out.
+            due_date (int): The last day the item can be kept before it is overdue.
+            loan_terms (tuple): The terms of the loan.
+        """
+        library_item._due_date = due_date
+        library_item._loan_terms = loan_terms
+        self._loan_count += 1
+        self._file_loan(library_item, due_date + 1)
+
+    def _restore_loan(self, library_item, due_date, loan_terms):
+        """
+        Restores the loan of a LibraryItem whose checked_out_by was restored directly, bringing the overdue count and
+        fine rate of its patron up to the current date and filing it under the next date it changes on. The loan and
+        fine totals are left for _rebuild_aggregates.
+
+        :param:
+            library_item (LibraryItem): The checked out item.
+            due_date (int): The last day the item can be kept before it is overdue.
+            loan_terms (tuple): The terms of the loan.
+        """
+        library_item._due_date = due_date
+        library_item._loan_terms = loan_terms
+        overdue, fined, next_date = self._loan_state(library_item, self._current_date)
+        patron = library_item._checked_out_by
+        if overdue:
+            patron._overdue_count += 1
+        if fined:
+            patron._fine_rate += loan_terms[DAILY_FINE]
+        if next_date is not None:
+            self._file_loan(library_item, next_date)
+
+    def _unschedule_overdue(self, library_item):
+        """
+        Ends the loan of a LibraryItem that is being returned, removing it from the overdue calendar and, if it is
+        already overdue, settling its patron's fine and no longer counting or fining it.
+
+        :param:
+            library_item (LibraryItem): The item that is being returned.
+        """
+        self._stop_loan(library_item)
+        library_item._due_date = None
+        library_item._loan_terms = None
+        self._loan_count -= 1
+
+    def _reschedule_overdue(self, library_item, due_date):
+        """
+        Moves the loan of a LibraryItem being renewed to a new due date, no earlier than the current date, refiling it
+        in the overdue calendar under the day after. If it was overdue, its patron's fine is settled, it is no longer
+        counted or fined, and its terms are cut down to the grace days and fine cap it has left.
+
+        :param:
+            library_item (LibraryItem): The item that is being renewed.
+            due_date (int): The new last day the item can be kept before it is overdue.
+        """
+        loan_terms = self._renewed_terms(library_item)
+        self._stop_loan(library_item)
+        library_item._due_date = due_date
+        library_item._loan_terms = loan_terms
+        self._file_loan(library_item, due_date + 1)
+
+    def _renewed_terms(self, library_item):
+        """
+        Gets the terms of the loan of a LibraryItem being renewed. A loan renewed while overdue has used up some of its
+        grace days and fine cap, so the renewed loan only has what is left of them; renewing does not start either over.
+
+        :param:
+            library_item (LibraryItem): The item that is being renewed.
+
+        :return:
+            tuple: The terms of the renewed loan, the same tuple if the loan was not overdue.
+        """
+        loan_terms = library_item._loan_terms
+        days_overdue = self._current_date - library_item._due_date
+        if days_overdue <= 0:
+            return loan_terms
+        fine_cap_cents = loan_terms[FINE_CAP]
+        if fine_cap_cents is not None:
+            fine_cap_cents -= loan_fine_cents(loan_terms, library_item._due_date, self._current_date)
+        return (loan_terms[LOAN_DAYS], loan_terms[DAILY_FINE], fine_cap_cents,
+                max(0, loan_terms[GRACE_DAYS] - days_overdue), loan_terms[RENEWAL_LIMIT])
+
+    def _stop_loan(self, library_item):
+        """
+        Takes the loan of a LibraryItem out of the overdue calendar for a return or renewal and, if it is overdue,
+        settles its patron's fine and stops counting and fining it.
+        """
+        due_date = library_item._due_date
+        if due_date >= self._current_date:
+            # Not overdue yet, so the loan is filed under the day after its due date
+            self._unfile_loan(library_item, due_date + 1)
+            return
+
+        _, fined, next_date = self._loan_state(library_item, self._current_date)
+        if next_date is not None:
+            self._unfile_loan(library_item, next_date)
+        patron = library_item._checked_out_by
+        patron._settle_fine(self._current_date)
+        patron._overdue_count -= 1
+        if fined:
+            patron._fine_rate -= library_item._loan_terms[DAILY_FINE]
+        self._reindex_fine(patron)
+
+    def _reindex_fine(self, patron):
+        """
+        Refiles a Patron in the fine index, and updates the totals, after their fine base, overdue count or fine rate
+        changed. Patrons who owe nothing and have no overdue items are left out of the index.
+
+        :param:
+            patron (Patron): The patron whose fine or overdue items changed.
+        """
+        entry = self._fine_keys.pop(patron, None)
+        if entry is not None:
+            group, key = entry
+            patrons = self._fine_index[group]
+            del patrons[bisect_left(patrons, key)]
+            if not patrons:
+                del self._fine_index[group]
+            self._overdue_loan_count -= group[0]
+            self._fine_rate_total -= group[1]
+            self._fine_base_total -= key[0]
+
+        overdue_count = patron._overdue_count
+        if overdue_count or patron._fine_cents > 0:
+            group = (overdue_count, patron._fine_rate)
+            key = (patron._fine_cents - patron._fine_rate * patron._fine_settled_date, patron._patron_id)
+            patrons = self._fine_index.get(group)
+            if patrons is None:
+                patrons = self._fine_index[group] = []
+            insort(patrons, key)
+            self._fine_keys[patron] = (group, key)
+            self._overdue_loan_count += overdue_count
+            self._fine_rate_total += group[1]
+            self._fine_base_total += key[0]
+
+    def _rebuild_aggregates(self):
+        """
+        Recomputes the loan and fine totals and the fine index from every patron, and the inventory index from every
+        item, after their state was restored directly rather than through Library operations.
+        """
+        self._inventory = {}
+        for library_item in self._holdings.values():
+            self._index_item(library_item)
+        self._loan_count = 0
+        self._overdue_loan_count = 0
+        self._fine_base_total = 0
+        self._fine_rate_total = 0
+        self._fine_index = {}
+        self._fine_keys = {}
+        for patron in self._members.values():
+            self._loan_count += len(patron._checked_out_items)
+            self._reindex_fine(patron)
+
+    def get_circulation_totals(self):
+        """
+        Gets the totals of the loans and fines of the whole Library.
+
+        :return:
+            dict: The number of items checked out, "loans", the number of them that are overdue, "overdue_loans", and
+            the fines owed by every patron together, "fines".
+        """
+        fines = self._fine_base_total + self._fine_rate_total * self._current_date
+        return {"loans": self._loan_count, "overdue_loans": self._overdue_loan_count, "fines": fines / 100}
+
+    def count_items(self, location=None, kind=None):
+        """
+        Counts the items in the holdings at a location, of a kind, or both, from the sizes of the inventory index
+        entries. Items of an attached catalog are counted once they are looked up.
+
+        :param:
+            location (str): The location to count, "ON_SHELF", "ON_HOLD_SHELF" or "CHECKED_OUT", or None for all.
+            kind (type): The LibraryItem class to count, including its subclasses, or None for every kind.
+
+        :return:
+            int: The number of items.
+        """
+        return sum(len(library_items) for (item_kind, item_location), library_items in self._inventory.items()
+                   if (location is None or item_location == location) and (kind is None or issubclass(item_kind, kind)))
+
+    def get_items(self, location, kind=None):
+        """
+        Lists the items in the holdings at a location, such as the shelf inventory of "ON_SHELF" items, touching only
+        the items listed. Items of an attached catalog are listed once they are looked up.
+
+        :param:
+            location (str): The location, "ON_SHELF", "ON_HOLD_SHELF" or "CHECKED_OUT".
+            kind (type): The LibraryItem class to list, including its subclasses, or None for every kind.
+
+        :return:
+            list: The LibraryItems at the location, grouped by kind.
+        """
+        found = []
+        for (item_kind, item_location), library_items in self._inventory.items():
+            if item_location == location and (kind is None or issubclass(item_kind, kind)):
+                found.extend(library_items)
+        return found
+
+    def get_hold_shelf_pull_list(self):
+        """
+        Gets the pull list of the hold shelf: each item waiting there and the patron it is held for. An item held for
+        a removed patron is left off, as it passes to the next patron when it is next looked up.
+
+        :return:
+            list: A (LibraryItem, Patron) tuple for each item on the hold shelf, in order of library_item_id.
+        """
+        library_items = sorted(self.get_items("ON_HOLD_SHELF"), key=LibraryItem.get_library_item_id)
+        return [(library_item, library_item._requested_by) for library_item in library_items
+                if library_item._requested_by._library is self]
+
+    def get_utilization_report(self):
+        """
+        Gets how many items of each kind are at each location, and the share of them checked out.
+
+        :return:
+            dict: For each kind name, the number of items at each location, keyed by location, and the share of them
+            checked out, "utilization".
+        """
+        report = {}
+        for (kind, location), library_items in self._inventory.items():
+            counts = report.setdefault(kind.__name__, dict.fromkeys(LOCATIONS, 0))
+            counts[location] += len(library_items)
+        for counts in report.values():
+            total = sum(counts[location] for location in LOCATIONS)
+            counts["utilization"] = counts["CHECKED_OUT"] / total if total else 0.0
+        return report
+
+    def get_patrons_owing_more_than(self, amount):
+        """
+        Finds every patron whose fine is more than an amount, for a collection sweep.
+
+        :param:
+            amount (float): The amount a patron's fine must exceed; at least zero.
+
+        :return:
+            list: The Patrons owing more than the amount, largest fine first.
+        """
+        cents = round(amount * 100)
+        found = []
+        for (_, fine_rate), patrons in self._fine_index.items():
+            accrued = fine_rate * self._current_date
+            start = bisect_right(patrons, cents - accrued, key=itemgetter(0))
+            found.extend((base + accrued, patron_id) for base, patron_id in patrons[start:])
+        found.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [self._members[patron_id] for _, patron_id in found]
+
+    def get_most_overdue_patrons(self, limit=10):
+        """
+        Finds the patrons with the most overdue items, for a delinquency report.
+
+        :param:
+            limit (int): The greatest number of patrons to return.
+
+        :return:
+            list: The Patrons with at least one overdue item, most overdue items first, then largest fine first.
+        """
+        found = []
+        groups = sorted(self._fine_index, reverse=True)
+        start = 0
+        while start < len(groups) and groups[start][0] > 0 and len(found) < limit:
+            # The groups of the same overdue count, one per fine rate, are merged by fine
+            end = start
+            tied = []
+            while end < len(groups) and groups[end][0] == groups[start][0]:
+                accrued = groups[end][1] * self._current_date
+                patrons = self._fine_index[groups[end]]
+                tied.extend((base + accrued, patron_id)
+                            for base, patron_id in patrons[max(0, len(patrons) - (limit - len(found))):])
+                end += 1
+            tied.sort(reverse=True)
+            found.extend(self._members[patron_id] for _, patron_id in tied[:limit - len(found)])
+            start = end
+        return found
+
+    def snapshot(self):
+        """
+        Takes a point-in-time snapshot of the Library for reports, which stays the same however the Library changes
+        until it is closed. Taking it copies only the references of the holdings and members.
+
+        :return:
+            LibrarySnapshot: The new snapshot; close it when the report is done.
+        """
+        snapshot = LibrarySnapshot(self)
+        self._snapshots += (snapshot,)
+        return snapshot
+
+    def _release_snapshot(self, snapshot):
+        """
+        Stops saving state into a closed snapshot.
+        """
+        self._snapshots = tuple(other for other in self._snapshots if other is not snapshot)
+
+    def _preserve_item(self, library_item):
+        """
+        Saves the state of a LibraryItem that is about to change into each open snapshot that has not saved it yet.
+        """
+        for snapshot in self._snapshots:
+            if library_item not in snapshot._item_states:
+                snapshot._item_states[library_item] = (library_item._location, library_item._checked_out_by,
+                                                       library_item._requested_by, library_item._date_checked_out,
+                                                       library_item._due_date)
+
+    def _preserve_patron(self, patron):
+        """
+        Saves the state of a Patron that is about to change into each open snapshot that has not saved it yet.
         """
-        self._current_date += 1
-        for patron in self._members:
-            for item in patron._checked_out_items:
-                if item.get_location() == "CHECKED_OUT":
-                    if (self._current_date - item._date_checked_out) > item.get_check_out_length():
-                        fine_days = self._current_date - item._date_checked_out - item.get_check_out_length()
-                        if fine_days > 0:
-                            patron.amend_fine(0.10)
+        for snapshot in self._snapshots:
+            if patron not in snapshot._patron_states:
+                snapshot._patron_states[patron] = (patron._fine_cents, patron._fine_settled_date,
+                                                   patron._overdue_count, patron._fine_rate,
+                                                   tuple(patron._checked_out_items))
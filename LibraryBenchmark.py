@@ -0,0 +1,772 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: Benchmarks for the Library simulator.
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+from Library import Library, LibraryItem, Book, Album, Movie, Patron, DAILY_FINE_CENTS
+from ItemTable import ItemTable
+from LibraryCatalog import Catalog, write_catalog
+from LibrarySearch import SearchIndex, tokenize
+from ShardedLibrary import ShardedLibrary
+from LibraryExport import export_library, import_library
+from LibraryLoanTable import LoanTable, NUMPY_AVAILABLE
+from LibraryPolicy import loan_fine_cents
+from LibraryNotifications import NotificationQueue
+
+# Words that synthetic titles and creator names are drawn from
+WORDS = ("river", "night", "garden", "silver", "empire", "winter", "shadow", "ocean", "crown", "forest", "glass",
+         "storm", "letter", "island", "mirror", "summer", "station", "harbor", "falcon", "lantern", "orchard",
+         "canyon", "velvet", "thunder", "meadow", "comet", "citadel", "willow", "ember", "atlas", "quartz", "sparrow")
+
+# The share of each kind of event in a synthetic workload
+EVENT_MIX = {"check_out": 0.40, "return": 0.35, "request": 0.10, "pay_fine": 0.10, "advance_date": 0.05}
+
+
+class DictBook:
+    """
+    A DictBook object has the same data members as a Book, but keeps them in a per-instance __dict__ the way every
+    LibraryItem did before they used __slots__. It is only used as the baseline of the memory benchmark.
+    """
+
+    def __init__(self, library_item_id, title, author):
+        """
+        Initializes a DictBook with the same data members as a new Book.
+        """
+        self._library_item_id = library_item_id
+        self._title = title
+        self._location = "ON_SHELF"
+        self._checked_out_by = None
+        self._requested_by = None
+        self._date_checked_out = None
+        self._due_date = None
+        self._author = author
+
+
+class FloatPatron:
+    """
+    A FloatPatron object accrues fines the way every Patron did before fines were kept in whole cents: as a float
+    amount of dollars, rounded whenever it is read. It is only used as the baseline of the fine benchmark.
+    """
+
+    __slots__ = ("_fine_amount", "_fine_settled_date", "_overdue_count")
+
+    def __init__(self):
+        """
+        Initializes a FloatPatron with one overdue item and no fine.
+        """
+        self._fine_amount = 0.0
+        self._fine_settled_date = 0
+        self._overdue_count = 1
+
+    def get_fine_amount(self):
+        """
+        Gets the fine, rounded to the cent.
+        """
+        if self._fine_amount < 0:
+            self._fine_amount = 0.0
+        return round(self._fine_amount, 2)
+
+    def _settle_fine(self, date):
+        """
+        Adds the fines accrued since _fine_settled_date to _fine_amount, in dollars.
+        """
+        if self._overdue_count:
+            self._fine_amount += 0.10 * self._overdue_count * (date - self._fine_settled_date)
+        self._fine_settled_date = date
+
+
+def measure_bytes_per_item(build, count):
+    """
+    Measures the memory allocated per item while building a catalog of the given number of items.
+
+    The ids, titles and authors are created before measuring, so only the cost of holding the items is counted.
+
+    :param:
+        build (callable): Builds and returns a catalog from lists of ids, titles and authors.
+        count (int): The number of items in the catalog.
+
+    :return:
+        float: The number of bytes allocated per item.
+    """
+    ids = [f"B{number:09d}" for number in range(count)]
+    titles = [f"Title {number}" for number in range(count)]
+    authors = [f"Author {number % 1000}" for number in range(count)]
+
+    gc.collect()
+    tracemalloc.start()
+    catalog = build(ids, titles, authors)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalog
+    return allocated / count
+
+
+def build_dict_books(ids, titles, authors):
+    """
+    Builds a catalog of DictBook objects in a dict keyed by id.
+    """
+    return {library_item_id: DictBook(library_item_id, title, author)
+            for library_item_id, title, author in zip(ids, titles, authors)}
+
+
+def build_books(ids, titles, authors):
+    """
+    Builds a catalog of Book objects in a dict keyed by id, as held by a Library.
+    """
+    return {library_item_id: Book(library_item_id, title, author)
+            for library_item_id, title, author in zip(ids, titles, authors)}
+
+
+def build_item_table(ids, titles, authors):
+    """
+    Builds a catalog of books in an ItemTable.
+    """
+    table = ItemTable()
+    for library_item_id, title, author in zip(ids, titles, authors):
+        table.add_item(Book, library_item_id, title, author)
+    return table
+
+
+def run_memory_benchmark(count=100000):
+    """
+    Prints the bytes per item of a catalog held as __dict__ objects, as __slots__ objects and as an ItemTable.
+
+    :param:
+        count (int): The number of items in each catalog.
+
+    :return:
+        dict: The bytes per item of each representation.
+    """
+    print(f"\nMemory per item ({count} items):")
+    results = {}
+    for name, build in [("dict objects", build_dict_books), ("slots objects", build_books),
+                        ("item table", build_item_table)]:
+        results[name] = measure_bytes_per_item(build, count)
+        print(f"{name}: {results[name]:.1f} bytes per item")
+    return results
+
+
+def run_startup_benchmark(counts=(10000, 100000, 1000000)):
+    """
+    Prints the time to make a Library ready for traffic by adding every item, and by attaching an on-disk catalog.
+
+    :param:
+        counts (tuple): The numbers of items in each catalog measured.
+
+    :return:
+        dict: The seconds taken by each way of starting up, keyed by (way, count).
+    """
+    print("\nStartup time:")
+    results = {}
+    kinds = (Book, Album, Movie)
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            items = [kinds[number % 3](f"I{number:09d}", f"Title {number}", f"Creator {number % 1000}")
+                     for number in range(count)]
+            path = os.path.join(directory, f"catalog-{count}.bin")
+            write_catalog(path, items)
+
+            start = time.perf_counter()
+            library = Library()
+            for item in items:
+                library.add_library_item(item)
+            results["add_library_item", count] = time.perf_counter() - start
+            del library, items
+
+            start = time.perf_counter()
+            library = Library()
+            catalog = Catalog(path)
+            library.attach_catalog(catalog)
+            library.lookup_library_item_from_id(f"I{count // 2:09d}")
+            results["attach_catalog", count] = time.perf_counter() - start
+            catalog.close()
+
+            print(f"{count} items: add_library_item {results['add_library_item', count]:.4f}s, "
+                  f"attach_catalog {results['attach_catalog', count]:.6f}s")
+    return results
+
+
+def linear_search(items, query):
+    """
+    Finds the items whose title or creator contains every word of a query by scanning them all, the way searches
+    were done before the SearchIndex.
+    """
+    tokens = set(tokenize(query))
+    return [item for item in items
+            if tokens <= set(tokenize(item.get_title())) | set(tokenize(item._get_creator()))]
+
+
+def run_search_benchmark(count=1000000, seed=162):
+    """
+    Prints the time taken by indexed searches and by linear scans over a synthetic catalog.
+
+    :param:
+        count (int): The number of items in the catalog.
+        seed (int): The seed of the synthetic titles and creators.
+
+    :return:
+        dict: The seconds taken to build the index, and per query by each way of searching.
+    """
+    print(f"\nSearch ({count} items):")
+    generator = random.Random(seed)
+    kinds = (Book, Album, Movie)
+    items = []
+    for number in range(count):
+        title = " ".join(generator.choice(WORDS) for _ in range(3)) + f" {number}"
+        creator = f"{generator.choice(WORDS).title()} {generator.choice(WORDS).title()}"
+        items.append(kinds[number % 3](f"I{number:09d}", title, creator))
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    for item in items:
+        index.add_library_item(item)
+    results = {"index_build": time.perf_counter() - start}
+    print(f"index build: {results['index_build']:.2f}s")
+
+    for query in ["ember", "silver crown", "winter 99", "falcon storm harbor"]:
+        start = time.perf_counter()
+        index.search(query)
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        linear_search(items, query)
+        linear = time.perf_counter() - start
+        results[query] = {"indexed": indexed, "linear": linear}
+        print(f"'{query}': indexed {indexed * 1000:.2f}ms, linear scan {linear * 1000:.1f}ms")
+    return results
+
+
+def scan_items(library, location, kind):
+    """
+    Finds the items at a location of a kind by scanning every item of a Library, the way inventory questions were
+    answered before the inventory index.
+    """
+    return [item for item in library._holdings.values() if item.get_location() == location and isinstance(item, kind)]
+
+
+def run_inventory_benchmark(count=1000000, loans=10000, holds=1000):
+    """
+    Prints the time taken by inventory counts and lists from the inventory index and by scans of every item.
+
+    :param:
+        count (int): The number of items in the Library.
+        loans (int): The number of items checked out.
+        holds (int): The number of items on the hold shelf.
+
+    :return:
+        dict: The seconds taken by each query from the index and by scanning.
+    """
+    print(f"\nInventory ({count} items, {loans} checked out, {holds} on the hold shelf):")
+    library = Library()
+    library.add_patron(Patron("P1", "Patron"))
+    kinds = (Book, Album, Movie)
+    for number in range(count):
+        library.add_library_item(kinds[number % 3](f"I{number:09d}", "Title", "Creator"))
+    for number in range(loans):
+        library.check_out_library_item("P1", f"I{number:09d}")
+    for number in range(loans, loans + holds):
+        library.request_library_item("P1", f"I{number:09d}")
+
+    results = {}
+    queries = [
+        ("checked out movies", lambda: library.get_items("CHECKED_OUT", Movie),
+         lambda: scan_items(library, "CHECKED_OUT", Movie)),
+        ("hold shelf pull list", library.get_hold_shelf_pull_list,
+         lambda: scan_items(library, "ON_HOLD_SHELF", LibraryItem)),
+        ("items on the shelf count", lambda: library.count_items("ON_SHELF"),
+         lambda: len(scan_items(library, "ON_SHELF", LibraryItem))),
+    ]
+    for name, indexed_query, scan_query in queries:
+        start = time.perf_counter()
+        indexed_query()
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        scan_query()
+        scan = time.perf_counter() - start
+        results[name] = {"indexed": indexed, "scan": scan}
+        print(f"{name}: indexed {indexed * 1000:.2f}ms, scan {scan * 1000:.1f}ms")
+    return results
+
+
+def run_fine_benchmark(days=1000000):
+    """
+    Prints the time per daily accrual, settling a fine one day at a time and reading it back, of a fine kept as float
+    dollars and of one kept in whole cents, and how far the float fine has drifted from the exact amount.
+
+    :param:
+        days (int): The number of days of accrual.
+
+    :return:
+        dict: The seconds per accrual of each way of keeping fines, and the float drift in dollars.
+    """
+    print(f"\nFine accrual ({days} days):")
+    float_patron = FloatPatron()
+    patron = Patron("P1", "Benchmark Patron")
+    patron._overdue_count = 1
+    patron._fine_rate = DAILY_FINE_CENTS
+    results = {}
+    for name, accruing in [("float dollars", float_patron), ("integer cents", patron)]:
+        settle = accruing._settle_fine
+        read = accruing.get_fine_amount
+        start = time.perf_counter()
+        for date in range(1, days + 1):
+            settle(date)
+            read()
+        results[name] = (time.perf_counter() - start) / days
+        print(f"{name}: {results[name] * 1e9:.1f}ns per accrual")
+
+    results["float drift"] = abs(float_patron._fine_amount - patron._fine_cents / 100)
+    print(f"float drift after {days} days: ${results['float drift']:.8f}")
+    return results
+
+
+def generate_workload(patron_count=1000, item_count=10000, event_count=100000, seed=162, mix=None):
+    """
+    Generates a reproducible synthetic workload: patrons, items, and a stream of circulation events.
+
+    Items are drawn with a skew toward a popular few, returns mostly name items that are out on loan, and the date
+    advances by a day at a time, so loans fall overdue and fines accrue the way they do in a real library.
+
+    Each event is a transaction as taken by Library.apply_transactions, or ("advance_date", days).
+
+    :param:
+        patron_count (int): The number of patrons.
+        item_count (int): The number of items, cycling through Book, Album and Movie.
+        event_count (int): The number of events.
+        seed (int): The seed of the workload; the same seed always generates the same workload.
+        mix (dict): The share of each kind of event, keyed by event name; EVENT_MIX if not given.
+
+    :return:
+        tuple: The list of Patrons, the list of LibraryItems and the list of events.
+    """
+    generator = random.Random(seed)
+    mix = EVENT_MIX if mix is None else mix
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    kinds = (Book, Album, Movie)
+    items = []
+    for number in range(item_count):
+        title = " ".join(generator.choice(WORDS) for _ in range(3))
+        creator = f"{generator.choice(WORDS).title()} {generator.choice(WORDS).title()}"
+        items.append(kinds[number % 3](f"I{number:09d}", title, creator))
+    patrons = [Patron(f"P{number:07d}", f"Patron {number}") for number in range(patron_count)]
+
+    def pick_item():
+        return items[int(item_count * generator.random() ** 2)].get_library_item_id()
+
+    events = []
+    on_loan = []
+    for name in generator.choices(names, weights, k=event_count):
+        patron_id = patrons[generator.randrange(patron_count)].get_patron_id()
+        if name == "check_out":
+            library_item_id = pick_item()
+            on_loan.append(library_item_id)
+            events.append(("check_out", patron_id, library_item_id))
+        elif name == "return":
+            if on_loan and generator.random() < 0.9:
+                library_item_id = on_loan.pop(generator.randrange(len(on_loan)))
+            else:
+                library_item_id = pick_item()
+            events.append(("return", library_item_id))
+        elif name == "request":
+            events.append(("request", patron_id, pick_item()))
+        elif name == "pay_fine":
+            events.append(("pay_fine", patron_id, generator.choice((0.5, 1.0, 2.5, 5.0))))
+        else:
+            events.append(("advance_date", 1))
+    return patrons, items, events
+
+
+def build_workload_library(patrons, items):
+    """
+    Builds a Library holding the patrons and items of a workload.
+    """
+    library = Library()
+    for item in items:
+        library.add_library_item(item)
+    for patron in patrons:
+        library.add_patron(patron)
+    return library
+
+
+def replay_events(library, events):
+    """
+    Replays the events of a workload against a Library one call at a time, through its public methods.
+    """
+    operations = {
+        "check_out": library.check_out_library_item,
+        "return": library.return_library_item,
+        "request": library.request_library_item,
+        "pay_fine": library.pay_fine,
+        "advance_date": library.advance_date,
+    }
+    for event in events:
+        operations[event[0]](*event[1:])
+
+
+def replay_batches(library, events):
+    """
+    Replays the events of a workload against a Library, applying each run of transactions between date advances as
+    one batch.
+    """
+    batch = []
+    for event in events:
+        if event[0] == "advance_date":
+            library.apply_transactions(batch)
+            library.advance_date(event[1])
+            batch = []
+        else:
+            batch.append(event)
+    library.apply_transactions(batch)
+
+
+def run_lookup_scenario(patrons, items, lookups=200000, seed=162):
+    """
+    Measures item and patron lookups by id, three in four of which find something.
+
+    :return:
+        dict: The number of lookups and the nanoseconds per lookup.
+    """
+    library = build_workload_library(patrons, items)
+    generator = random.Random(seed)
+    item_ids = [generator.choice(items).get_library_item_id() if generator.random() < 0.75 else "missing"
+                for _ in range(lookups)]
+    patron_ids = [generator.choice(patrons).get_patron_id() if generator.random() < 0.75 else "missing"
+                  for _ in range(lookups)]
+
+    start = time.perf_counter()
+    for library_item_id in item_ids:
+        library.lookup_library_item_from_id(library_item_id)
+    for patron_id in patron_ids:
+        library.lookup_patron_from_id(patron_id)
+    elapsed = time.perf_counter() - start
+    return {"lookups": 2 * lookups, "ns_per_lookup": elapsed / (2 * lookups) * 1e9}
+
+
+def run_circulation_scenario(patrons, items, events):
+    """
+    Measures circulation throughput, replaying a workload one call at a time and in batches.
+
+    :return:
+        dict: The number of events, and the events per second of each way of replaying them.
+    """
+    results = {"events": len(events)}
+    for name, replay in [("calls", replay_events), ("batches", replay_batches)]:
+        library = build_workload_library(patrons, items)
+        start = time.perf_counter()
+        replay(library, events)
+        results[f"{name}_per_second"] = len(events) / (time.perf_counter() - start)
+    return results
+
+
+def run_accrual_scenario(patrons, items, days=365):
+    """
+    Measures daily fine accrual with every patron holding items that fall overdue over the days advanced.
+
+    :return:
+        dict: The number of loans and days, and the microseconds per increment_current_date.
+    """
+    library = build_workload_library(patrons, items)
+    for number, item in enumerate(items):
+        library.check_out_library_item(patrons[number % len(patrons)].get_patron_id(), item.get_library_item_id())
+        if number % 50 == 49:
+            library.increment_current_date()
+
+    start = time.perf_counter()
+    for _ in range(days):
+        library.increment_current_date()
+    elapsed = time.perf_counter() - start
+    return {"loans": len(items), "days": days, "us_per_day": elapsed / days * 1e6,
+            "fines": library.get_circulation_totals()["fines"]}
+
+
+def run_startup_scenario(patrons, items):
+    """
+    Measures building a Library from the patrons and items of a workload.
+
+    :return:
+        dict: The seconds taken.
+    """
+    start = time.perf_counter()
+    build_workload_library(patrons, items)
+    return {"seconds": time.perf_counter() - start}
+
+
+def run_suite(patron_count=1000, item_count=10000, event_count=100000, seed=162, output=None):
+    """
+    Runs every scenario against a generated workload and prints the results, for comparing performance between
+    commits.
+
+    :param:
+        patron_count (int): The number of patrons in the workload.
+        item_count (int): The number of items in the workload.
+        event_count (int): The number of events in the workload.
+        seed (int): The seed of the workload.
+        output (str): The path of a JSON file to write the results to, if any.
+
+    :return:
+        dict: The parameters of the workload, the Python version, and the results of each scenario.
+    """
+    print(f"\nSuite ({patron_count} patrons, {item_count} items, {event_count} events, seed {seed}):")
+    report = {"patrons": patron_count, "items": item_count, "events": event_count, "seed": seed,
+              "python": platform.python_version(), "scenarios": {}}
+    scenarios = [
+        ("startup", lambda patrons, items, events: run_startup_scenario(patrons, items)),
+        ("lookup", lambda patrons, items, events: run_lookup_scenario(patrons, items, seed=seed)),
+        ("circulation", run_circulation_scenario),
+        ("accrual", lambda patrons, items, events: run_accrual_scenario(patrons, items)),
+    ]
+    for name, scenario in scenarios:
+        # Every scenario gets freshly generated objects, so no state carries over from the one before
+        results = scenario(*generate_workload(patron_count, item_count, event_count, seed))
+        report["scenarios"][name] = results
+        print(f"{name}: " + ", ".join(f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+                                      for key, value in results.items()))
+
+    if output is not None:
+        with open(output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    return report
+
+
+def run_sharded_benchmark(shard_counts=(1, 2, 4), patron_count=2000, item_count=20000, event_count=50000,
+                          batch_size=5000, seed=162):
+    """
+    Prints the circulation throughput of a single Library and of ShardedLibraries with different numbers of worker
+    processes, applying the same workload in batches. The shards only run in parallel on as many CPUs as there are
+    shards, so the number of CPUs is printed with the results; with fewer, the shards share them.
+
+    :param:
+        shard_counts (tuple): The numbers of worker processes measured.
+        patron_count (int): The number of patrons in the workload.
+        item_count (int): The number of items in the workload.
+        event_count (int): The number of circulation events in the workload.
+        batch_size (int): The number of transactions per batch.
+        seed (int): The seed of the workload.
+
+    :return:
+        dict: The transactions per second of the single Library, "library", and of each number of shards.
+    """
+    print(f"\nSharded circulation ({event_count} events, batches of {batch_size}, {os.cpu_count()} CPUs):")
+    mix = dict(EVENT_MIX, advance_date=0)
+    results = {}
+    for shards in (None,) + tuple(shard_counts):
+        patrons, items, events = generate_workload(patron_count, item_count, event_count, seed, mix)
+        library = Library() if shards is None else ShardedLibrary(shards)
+        for item in items:
+            library.add_library_item(item)
+        for patron in patrons:
+            library.add_patron(patron)
+
+        start = time.perf_counter()
+        for first in range(0, len(events), batch_size):
+            library.apply_transactions(events[first:first + batch_size])
+        name = "library" if shards is None else shards
+        results[name] = len(events) / (time.perf_counter() - start)
+        if shards is not None:
+            library.close()
+        print(f"{'single library' if shards is None else f'{shards} shards'}: {results[name]:.0f} transactions/s")
+    return results
+
+
+def export_rows(library, path):
+    """
+    Writes the items of a Library to a CSV file one row at a time through their getters, the way the exports were
+    built before export_library.
+    """
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        for item in library._holdings.values():
+            checked_out_by = item.get_checked_out_by()
+            requested_by = item.get_requested_by()
+            writer.writerow([item.get_library_item_id(), type(item).__name__, item.get_title(), item._get_creator(),
+                             item.get_location(),
+                             "" if checked_out_by is None else checked_out_by.get_patron_id(),
+                             "" if requested_by is None else requested_by.get_patron_id(),
+                             item.get_date_checked_out(), item.get_due_date()])
+
+
+def import_rows(path):
+    """
+    Rebuilds the items of a Library from a CSV file written by export_rows, calling add_library_item once per item.
+    """
+    kinds = {"Book": Book, "Album": Album, "Movie": Movie}
+    library = Library()
+    with open(path, newline="") as csv_file:
+        for library_item_id, kind, title, creator, *_ in csv.reader(csv_file):
+            library.add_library_item(kinds[kind](library_item_id, title, creator))
+    return library
+
+
+def run_export_benchmark(patron_count=10000, item_count=200000, event_count=200000, seed=162):
+    """
+    Prints the seconds taken to export a Library row by row and in column batches, and to rebuild it item by item
+    with add_library_item and in batches with import_library.
+
+    :param:
+        patron_count (int): The number of patrons in the workload.
+        item_count (int): The number of items in the workload.
+        event_count (int): The number of circulation events replayed before exporting.
+        seed (int): The seed of the workload.
+
+    :return:
+        dict: The seconds taken by each way of exporting and rebuilding.
+    """
+    print(f"\nExport ({patron_count} patrons, {item_count} items):")
+    patrons, items, events = generate_workload(patron_count, item_count, event_count, seed)
+    library = build_workload_library(patrons, items)
+    replay_batches(library, events)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        export_rows(library, os.path.join(directory, "items.csv"))
+        results["export_rows"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        export_library(library, directory)
+        results["export_library"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        import_rows(os.path.join(directory, "items.csv"))
+        results["import_rows"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        import_library(directory)
+        results["import_library"] = time.perf_counter() - start
+
+    for name, seconds in results.items():
+        print(f"{name}: {seconds:.3f}s")
+    return results
+
+
+def project_fines(library, date):
+    """
+    Works out the fine each patron will owe on a later date by visiting every loan of every patron, the way it was
+    done before LoanTable.
+    """
+    fines = {}
+    current_date = library._current_date
+    for patron in library._members.values():
+        fine_cents = patron._fine_cents + patron._fine_rate * (current_date - patron._fine_settled_date)
+        for item in patron._checked_out_items:
+            fine_cents += (loan_fine_cents(item._loan_terms, item._due_date, date)
+                           - loan_fine_cents(item._loan_terms, item._due_date, current_date))
+        fines[patron._patron_id] = fine_cents / 100
+    return fines
+
+
+def run_loan_table_benchmark(patron_count=10000, item_count=200000, event_count=400000, days=30, seed=162):
+    """
+    Prints the seconds taken to project every patron's fine a number of days ahead loan by loan, and to build a
+    LoanTable and project them with it. Needs NumPy.
+
+    :param:
+        patron_count (int): The number of patrons in the workload.
+        item_count (int): The number of items in the workload.
+        event_count (int): The number of circulation events replayed before projecting.
+        days (int): The number of days ahead to project the fines.
+        seed (int): The seed of the workload.
+
+    :return:
+        dict: The seconds taken by each way of projecting the fines.
+    """
+    print(f"\nLoan table ({patron_count} patrons, {item_count} items, {days} days ahead):")
+    patrons, items, events = generate_workload(patron_count, item_count, event_count, seed)
+    library = build_workload_library(patrons, items)
+    replay_batches(library, events)
+    date = library._current_date + days
+    results = {}
+
+    start = time.perf_counter()
+    expected = project_fines(library, date)
+    results["loan_by_loan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = LoanTable(library)
+    results["build_table"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fines = table.get_fines(date)
+    results["table_fines"] = time.perf_counter() - start
+
+    assert fines == expected, "The LoanTable should project the same fines"
+    print(f"{len(table)} loans")
+    for name, seconds in results.items():
+        print(f"{name}: {seconds:.4f}s")
+    return results
+
+
+def run_notification_benchmark(count=200000, batch_size=1000):
+    """
+    Prints the rate and peak memory of pulling the notifications of a day on which every item falls overdue, a batch
+    at a time.
+
+    :param:
+        count (int): The number of items checked out on the same day.
+        batch_size (int): The number of notifications pulled in each batch.
+
+    :return:
+        dict: The notifications pulled, the notifications per second, and the peak bytes allocated while pulling.
+    """
+    print(f"\nNotifications ({count} loans due on the same day, batches of {batch_size}):")
+    library = Library()
+    library.add_patron(Patron("P1", "Patron"))
+    for number in range(count):
+        library.add_library_item(Book(f"B{number}", "Title", "Author"))
+        library.check_out_library_item("P1", f"B{number}")
+    library.attach_notifications(NotificationQueue(due_soon_days=()))
+    library.advance_date(22)
+
+    pulled = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for batch in library.iter_notifications(batch_size):
+        pulled += len(batch)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results = {"notifications": pulled, "per_second": pulled / seconds, "peak_bytes": peak}
+    print(f"{pulled} notifications, {results['per_second']:.0f}/s, peak {peak / 1024:.0f} KiB")
+    return results
+
+
+def main():
+    """
+    Main function to run the benchmarks.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks for the Library simulator.")
+    parser.add_argument("--suite", action="store_true", help="only run the workload suite")
+    parser.add_argument("--json", dest="output", default=None, help="path to write the suite results to as JSON")
+    parser.add_argument("--patrons", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=162)
+    arguments = parser.parse_args()
+
+    if not arguments.suite:
+        run_memory_benchmark()
+        run_startup_benchmark()
+        run_search_benchmark()
+        run_inventory_benchmark()
+        run_fine_benchmark()
+        run_sharded_benchmark()
+        run_export_benchmark()
+        if NUMPY_AVAILABLE:
+            run_loan_table_benchmark()
+        run_notification_benchmark()
+    run_suite(arguments.patrons, arguments.items, arguments.events, arguments.seed, arguments.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: A bounded LRU cache of the items of a Library that are built from its attached catalog.
+from collections import OrderedDict
+
+
+class LibraryCache:
+    """
+    A LibraryCache object bounds how many looked up items of a Library stay in memory as full Book, Album and Movie
+    objects, in front of its attached catalog. Each lookup marks its item as the most recently used. Once more items
+    than the capacity have been looked up, the least recently used are evicted from the holdings, and built from the
+    catalog again the next time they are looked up.
+
+    Only items at rest are evicted. An item that is checked out, held, or indexed for search is pinned: the loan, hold
+    or index refers to it, so it stays in memory, and it is only tracked again once it is next looked up. The rest have
+    their state written back before they are evicted, so the catalog must be able to store items, such as a
+    SQLiteCatalog; a read-only Catalog cannot have a cache attached.
+
+    The cache counts its hits, lookups of items in memory, and misses, items built from the catalog, so it can be sized
+    for the traffic. Lookups within a batch of transactions are counted, but nothing is evicted until the batch is
+    done, as the batch keeps the items it has looked up.
+
+    Attributes:
+        _capacity (int): the greatest number of tracked items kept in memory
+        _items (OrderedDict): the tracked items in memory, keyed by library_item_id, least recently used first
+        _hits (int): the number of lookups of items in memory
+        _misses (int): the number of lookups that built their item from the catalog
+        _evictions (int): the number of items evicted
+        _paused (int): the number of batches of transactions in progress, during which nothing is evicted
+    """
+
+    def __init__(self, capacity):
+        """
+        Initializes an empty LibraryCache.
+
+        :param:
+            capacity (int): The greatest number of tracked items to keep in memory, at least 1.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._capacity = capacity
+        self._items = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._paused = 0
+
+    def __len__(self):
+        """
+        Gets the number of tracked items in memory.
+        """
+        return len(self._items)
+
+    def get_capacity(self):
+        """
+        Gets the greatest number of tracked items the cache keeps in memory.
+        """
+        return self._capacity
+
+    def get_stats(self):
+        """
+        Gets the counters of the cache, to size it by.
+
+        :return:
+            dict: The capacity, the number of tracked items in memory, the hits, misses and evictions, and the fraction
+            of lookups that were hits.
+        """
+        lookups = self._hits + self._misses
+        return {"capacity": self._capacity, "resident": len(self._items), "hits": self._hits, "misses": self._misses,
+                "evictions": self._evictions, "hit_ratio": self._hits / lookups if lookups else 0.0}
+
+    def _record(self, library_item, loaded):
+        """
+        Records a lookup of a LibraryItem as the most recently used, and takes the least recently used items over the
+        capacity out of the cache.
+
+        :param:
+            library_item (LibraryItem): The item looked up.
+            loaded (bool): Whether the item was built from the catalog.
+
+        :return:
+            list: The items taken out of the cache, for the Library to evict, least recently used first.
+        """
+        if loaded:
+            self._misses += 1
+        else:
+            self._hits += 1
+        items = self._items
+        items.pop(library_item._library_item_id, None)
+        items[library_item._library_item_id] = library_item
+        if self._paused:
+            return []
+        evicted = []
+        while len(items) > self._capacity:
+            evicted.append(items.popitem(last=False)[1])
+        return evicted
+
+    def _discard(self, library_item_id):
+        """
+        Stops tracking an item removed from the holdings.
+        """
+        self._items.pop(library_item_id, None)
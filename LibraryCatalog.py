@@ -0,0 +1,225 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: On-disk catalogs of library items: a compact read-only file opened through mmap, and a SQLite file that
+# items can be written back to.
+import mmap
+import sqlite3
+import struct
+import threading
+
+from ItemTable import ITEM_KINDS, KIND_CODES
+
+MAGIC = b"LIBCAT01"
+HEADER = struct.Struct("<8sQQ")  # Magic, number of records, offset of the string heap
+# Kind code, then offset and length in the string heap of the id, title and creator
+RECORD = struct.Struct("<BIHIHIH")
+
+
+def write_catalog(path, library_items):
+    """
+    Writes a catalog file holding the given items. The file has a header, then a fixed-width record per item sorted
+    by library_item_id, then a heap of the UTF-8 encoded strings the records point into.
+
+    :param:
+        path (str): The path of the catalog file.
+        library_items (iterable): The Book, Album and Movie objects to write; only their catalog data is kept.
+    """
+    entries = []
+    for item in library_items:
+        entries.append((item.get_library_item_id().encode(), KIND_CODES[type(item)], item.get_title().encode(),
+                        item._get_creator().encode()))
+    entries.sort()
+
+    heap = bytearray()
+    records = bytearray()
+    for library_item_id, kind, title, creator in entries:
+        fields = [kind]
+        for text in (library_item_id, title, creator):
+            fields.append(len(heap))
+            fields.append(len(text))
+            heap += text
+        records += RECORD.pack(*fields)
+
+    with open(path, "wb") as catalog:
+        catalog.write(HEADER.pack(MAGIC, len(entries), HEADER.size + len(records)))
+        catalog.write(records)
+        catalog.write(heap)
+
+
+class Catalog:
+    """
+    A Catalog object is a read-only catalog file opened through mmap. Opening one only reads its header, and an item
+    is only decoded when it is looked up, by a binary search over the records sorted by library_item_id.
+
+    Attributes:
+        _file (file): the open catalog file
+        _map (mmap): the memory map of the catalog file
+        _count (int): the number of records in the catalog
+        _heap (int): the offset of the string heap in the catalog file
+    """
+
+    def __init__(self, path):
+        """
+        Opens the catalog file at the given path.
+
+        :param:
+            path (str): The path of the catalog file.
+        """
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._heap = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a library catalog")
+
+    def __len__(self):
+        """
+        Gets the number of items in the catalog.
+
+        :return:
+            int: The number of records in the catalog.
+        """
+        return self._count
+
+    def __contains__(self, library_item_id):
+        """
+        Checks whether the catalog holds an item with the given library_item_id.
+        """
+        return self._find(library_item_id.encode()) is not None
+
+    def _text(self, offset, length):
+        """
+        Reads a string from the string heap.
+        """
+        start = self._heap + offset
+        return self._map[start:start + length]
+
+    def _find(self, library_item_id):
+        """
+        Binary searches the records for the given encoded library_item_id.
+
+        :return:
+            tuple: the unpacked record
+            OR
+            None, if no library_item_id is found
+        """
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            record = RECORD.unpack_from(self._map, HEADER.size + middle * RECORD.size)
+            found = self._text(record[1], record[2])
+            if found < library_item_id:
+                low = middle + 1
+            elif found > library_item_id:
+                high = middle
+            else:
+                return record
+        return None
+
+    def load_library_item(self, library_item_id):
+        """
+        Materializes the item with the given library_item_id as a new Book, Album or Movie on the shelf.
+
+        :return:
+            LibraryItem: a new item built from the catalog record
+            OR
+            None, if no library_item_id is found
+        """
+        record = self._find(library_item_id.encode())
+        if record is None:
+            return None
+        kind, _, _, title_offset, title_length, creator_offset, creator_length = record
+        return ITEM_KINDS[kind](library_item_id, self._text(title_offset, title_length).decode(),
+                                self._text(creator_offset, creator_length).decode())
+
+    def close(self):
+        """
+        Closes the memory map and the catalog file.
+        """
+        self._map.close()
+        self._file.close()
+
+
+class SQLiteCatalog:
+    """
+    A SQLiteCatalog object is a catalog kept in a SQLite file that items can be written back to, so a LibraryCache can
+    evict items whose state has changed since they were built. As with a Catalog, an item is only built when it is
+    looked up, by its primary key.
+
+    Attributes:
+        _connection (sqlite3.Connection): the connection to the catalog file
+        _lock (threading.Lock): the lock serializing use of the connection, which lookups from threads share
+    """
+
+    def __init__(self, path):
+        """
+        Opens the catalog file at the given path, creating an empty one if there is none.
+
+        :param:
+            path (str): The path of the catalog file.
+        """
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS items (library_item_id TEXT PRIMARY KEY, "
+                                 "kind INTEGER NOT NULL, title TEXT NOT NULL, creator TEXT NOT NULL, "
+                                 "date_checked_out INTEGER)")
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Gets the number of items in the catalog.
+
+        :return:
+            int: The number of rows in the catalog.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def __contains__(self, library_item_id):
+        """
+        Checks whether the catalog holds an item with the given library_item_id.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM items WHERE library_item_id = ?",
+                                            (library_item_id,)).fetchone() is not None
+
+    def load_library_item(self, library_item_id):
+        """
+        Materializes the item with the given library_item_id as a new Book, Album or Movie on the shelf, as it was
+        last stored.
+
+        :return:
+            LibraryItem: a new item built from the catalog row
+            OR
+            None, if no library_item_id is found
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT kind, title, creator, date_checked_out FROM items "
+                                           "WHERE library_item_id = ?", (library_item_id,)).fetchone()
+        if row is None:
+            return None
+        kind, title, creator, date_checked_out = row
+        library_item = ITEM_KINDS[kind](library_item_id, title, creator)
+        library_item._date_checked_out = date_checked_out
+        return library_item
+
+    def store_library_items(self, library_items):
+        """
+        Writes items into the catalog in one transaction, replacing any rows with the same library_item_ids.
+
+        :param:
+            library_items (iterable): The Book, Album and Movie objects to write; only their catalog data and the date
+            they were last checked out are kept.
+        """
+        rows = [(item._library_item_id, KIND_CODES[type(item)], item._title, item._get_creator(),
+                 item._date_checked_out) for item in library_items]
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        """
+        Closes the connection to the catalog file.
+        """
+        self._connection.close()
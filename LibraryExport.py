@@ -0,0 +1,316 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: Bulk columnar export and import of the items, patrons, loans and holds of a Library.
+import gc
+import json
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, islice
+
+from Library import Library, Patron, HoldQueue, LOCATIONS, LOCATION_CODES
+from LibraryPolicy import LOAN_DAYS, DAILY_FINE, FINE_CAP, GRACE_DAYS, RENEWAL_LIMIT
+from ItemTable import ITEM_KINDS, KIND_CODES, NO_DATE
+
+NO_CAP = -1  # Stored in place of None for a loan with no fine cap
+
+MAGIC = b"LIBCOL01"
+LENGTH = struct.Struct("<Q")  # Length of the header, of a string column's text, or rows in a chunk
+EXPORT_CHUNK_SIZE = 65536  # Rows written together in each column batch
+
+# The columns of each table, as (name, type) pairs. A type is an array typecode, or "str" for a string column.
+TABLES = {
+    "patrons": [("patron_id", "str"), ("name", "str"), ("patron_class", "str"), ("fine_cents", "q"),
+                ("overdue_count", "I")],
+    "items": [("library_item_id", "str"), ("kind", "B"), ("title", "str"), ("creator", "str"), ("location", "B"),
+              ("requested_by", "str"), ("date_checked_out", "q")],
+    "loans": [("patron_id", "str"), ("library_item_id", "str"), ("date_checked_out", "q"), ("due_date", "q"),
+              ("loan_days", "I"), ("daily_fine_cents", "q"), ("fine_cap_cents", "q"), ("grace_days", "I"),
+              ("renewal_limit", "I"), ("renewal_count", "I")],
+    "holds": [("library_item_id", "str"), ("patron_id", "str"), ("priority", "q"), ("sequence", "q")],
+}
+# The names that the codes of the coded columns stand for
+LABELS = {"kind": [kind.__name__ for kind in ITEM_KINDS], "location": list(LOCATIONS)}
+
+
+def _write_column(stream, kind, values):
+    """
+    Writes one column of a batch: a typed array as its raw little-endian bytes, or strings as an array of their
+    lengths followed by their text joined together.
+    """
+    if kind == "str":
+        lengths = array("I", [len(value) for value in values])
+        text = "".join(values).encode()
+        _write_array(stream, lengths)
+        stream.write(LENGTH.pack(len(text)))
+        stream.write(text)
+    else:
+        _write_array(stream, values if isinstance(values, array) else array(kind, values))
+
+
+def _write_array(stream, values):
+    """
+    Writes the raw bytes of a typed array in little-endian order.
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    stream.write(values.tobytes())
+
+
+def _read_column(stream, kind, count):
+    """
+    Reads one column of a batch of the given number of rows.
+
+    :return:
+        array: The values of a typed column
+        OR
+        list: The values of a string column
+    """
+    if kind == "str":
+        lengths = _read_array(stream, "I", count)
+        text = stream.read(LENGTH.unpack(stream.read(LENGTH.size))[0]).decode()
+        ends = list(accumulate(lengths))
+        return [text[start:end] for start, end in zip([0] + ends, ends)]
+    return _read_array(stream, kind, count)
+
+
+def _read_array(stream, kind, count):
+    """
+    Reads a typed array of the given number of values in little-endian order.
+    """
+    values = array(kind)
+    values.frombytes(stream.read(count * values.itemsize))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def write_table(path, table, batches, metadata=None):
+    """
+    Writes a table file: a header describing the columns, then each batch of rows column by column, then an empty
+    batch marking the end.
+
+    :param:
+        path (str): The path of the table file.
+        table (str): The name of the table, one of TABLES.
+        batches (iterable): The batches of rows, each a list of column values in the order of TABLES[table].
+        metadata (dict): Anything else to record in the header.
+    """
+    columns = TABLES[table]
+    header = json.dumps({"table": table, "columns": columns, "labels": LABELS, "metadata": metadata or {}}).encode()
+    with open(path, "wb") as stream:
+        stream.write(MAGIC)
+        stream.write(LENGTH.pack(len(header)))
+        stream.write(header)
+        for batch in batches:
+            stream.write(LENGTH.pack(len(batch[0])))
+            for (_, kind), values in zip(columns, batch):
+                _write_column(stream, kind, values)
+        stream.write(LENGTH.pack(0))
+
+
+def read_table(path):
+    """
+    Opens a table file, reading its header at once and its batches of rows lazily, one at a time.
+
+    :param:
+        path (str): The path of the table file.
+
+    :return:
+        tuple: The header, as a dict with the table name, columns, labels and metadata, and a generator of the batches,
+        each a dict of column values keyed by column name.
+    """
+    stream = open(path, "rb")
+    if stream.read(len(MAGIC)) != MAGIC:
+        stream.close()
+        raise ValueError(f"{path} is not a library table")
+    header = json.loads(stream.read(LENGTH.unpack(stream.read(LENGTH.size))[0]))
+
+    def batches():
+        with stream:
+            while True:
+                count = LENGTH.unpack(stream.read(LENGTH.size))[0]
+                if count == 0:
+                    break
+                yield {name: _read_column(stream, kind, count) for name, kind in header["columns"]}
+
+    return header, batches()
+
+
+def _chunks(rows, chunk_size):
+    """
+    Groups an iterable of objects into lists of at most chunk_size.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _patron_batches(library, chunk_size):
+    """
+    Yields the columns of the patrons of a Library, a batch at a time, with fines as of the current date. The fines are
+    worked out the way get_fine_amount does, without settling them, so the patrons are left as they were.
+    """
+    current_date = library._current_date
+    for patrons in _chunks(library._members.values(), chunk_size):
+        yield [[patron._patron_id for patron in patrons], [patron._name for patron in patrons],
+               [patron._patron_class for patron in patrons],
+               [patron._fine_cents + patron._fine_rate * (current_date - patron._fine_settled_date)
+                for patron in patrons],
+               [patron._overdue_count for patron in patrons]]
+
+
+def _item_batches(library, chunk_size):
+    """
+    Yields the columns of the items of a Library, a batch at a time.
+    """
+    for items in _chunks(library._holdings.values(), chunk_size):
+        yield [[item._library_item_id for item in items], [KIND_CODES[type(item)] for item in items],
+               [item._title for item in items], [item._get_creator() for item in items],
+               [LOCATION_CODES[item._location] for item in items],
+               ["" if item._requested_by is None else item._requested_by._patron_id for item in items],
+               [NO_DATE if item._date_checked_out is None else item._date_checked_out for item in items]]
+
+
+def _loan_batches(library, chunk_size):
+    """
+    Yields the columns of the active loans of a Library, a batch at a time, in the order each patron checked out.
+    """
+    loans = ((patron, item) for patron in library._members.values() for item in patron._checked_out_items)
+    for chunk in _chunks(loans, chunk_size):
+        terms = [item._loan_terms for _, item in chunk]
+        yield [[patron._patron_id for patron, _ in chunk], [item._library_item_id for _, item in chunk],
+               [item._date_checked_out for _, item in chunk], [item._due_date for _, item in chunk],
+               [loan_terms[LOAN_DAYS] for loan_terms in terms], [loan_terms[DAILY_FINE] for loan_terms in terms],
+               [NO_CAP if loan_terms[FINE_CAP] is None else loan_terms[FINE_CAP] for loan_terms in terms],
+               [loan_terms[GRACE_DAYS] for loan_terms in terms], [loan_terms[RENEWAL_LIMIT] for loan_terms in terms],
+               [item._renewal_count for _, item in chunk]]
+
+
+def _hold_batches(library, chunk_size):
+    """
+    Yields the columns of the waiting holds of a Library, a batch at a time.
+    """
+    holds = ((item, key) for item in library._holdings.values() if item._hold_queue is not None
+             for key in item._hold_queue._holds)
+    for chunk in _chunks(holds, chunk_size):
+        yield [[item._library_item_id for item, _ in chunk], [key[2]._patron_id for _, key in chunk],
+               [key[0] for _, key in chunk], [key[1] for _, key in chunk]]
+
+
+def export_library(library, directory, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Exports the patrons, items, active loans and waiting holds of a Library as column batches, one table file each,
+    so analytics can read whole columns at once. Only chunk_size rows are held in memory at a time.
+
+    Items of an attached catalog that have never been looked up, or that an attached cache has evicted, are not
+    exported. The Library must not change while it is exported. The id columns are string columns, so every
+    patron_id and library_item_id must be a str; ids of other types are rejected before anything is written, as they
+    would be imported as strs.
+
+    :param:
+        library (Library): The Library to export.
+        directory (str): The directory to write patrons.col, items.col, loans.col and holds.col into.
+        chunk_size (int): The number of rows in each batch.
+    """
+    for ids, name in ((library._members, "patron_id"), (library._holdings, "library_item_id")):
+        for key in ids:
+            if not isinstance(key, str):
+                raise TypeError(f"only str ids can be exported, not the {name} {key!r}")
+    os.makedirs(directory, exist_ok=True)
+    library.compact()  # Holds of removed patrons are not exported
+    metadata = {"current_date": library._current_date}
+    for table, batches in [("patrons", _patron_batches), ("items", _item_batches), ("loans", _loan_batches),
+                           ("holds", _hold_batches)]:
+        write_table(os.path.join(directory, f"{table}.col"), table, batches(library, chunk_size), metadata)
+
+
+def import_library(directory):
+    """
+    Rebuilds a Library from the table files written by export_library. Each batch is turned into items and patrons
+    directly, without the per-call checks of add_library_item and add_patron.
+
+    :param:
+        directory (str): The directory holding the table files.
+
+    :return:
+        Library: The rebuilt Library.
+    """
+    # None of the new objects can be garbage yet, so the collector would only rescan them over and over as they are
+    # created
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _import_tables(directory)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _import_tables(directory):
+    """
+    Rebuilds a Library from the table files in a directory, for import_library.
+    """
+    library = Library()
+    holdings = library._holdings
+    members = library._members
+
+    header, batches = read_table(os.path.join(directory, "patrons.col"))
+    current_date = library._current_date = header["metadata"]["current_date"]
+    for batch in batches:
+        # The overdue counts and fine rates are worked out again from the loans
+        for patron_id, name, patron_class, fine_cents in zip(batch["patron_id"], batch["name"], batch["patron_class"],
+                                                             batch["fine_cents"]):
+            patron = members[patron_id] = Patron(patron_id, name, patron_class)
+            patron._fine_cents = fine_cents
+            patron._fine_settled_date = current_date
+            patron._library = library
+
+    _, batches = read_table(os.path.join(directory, "items.col"))
+    for batch in batches:
+        for library_item_id, kind, title, creator, location, requested_by, date_checked_out in zip(
+                batch["library_item_id"], batch["kind"], batch["title"], batch["creator"], batch["location"],
+                batch["requested_by"], batch["date_checked_out"]):
+            item = holdings[library_item_id] = ITEM_KINDS[kind](library_item_id, title, creator)
+            item._location = LOCATIONS[location]
+            if requested_by:
+                item._requested_by = members[requested_by]
+            if date_checked_out != NO_DATE:
+                item._date_checked_out = date_checked_out
+
+    _, batches = read_table(os.path.join(directory, "loans.col"))
+    for batch in batches:
+        for patron_id, library_item_id, due_date, renewal_count, *loan_terms in zip(
+                batch["patron_id"], batch["library_item_id"], batch["due_date"], batch["renewal_count"],
+                batch["loan_days"], batch["daily_fine_cents"], batch["fine_cap_cents"], batch["grace_days"],
+                batch["renewal_limit"]):
+            patron = members[patron_id]
+            item = holdings[library_item_id]
+            item._checked_out_by = patron
+            item._renewal_count = renewal_count
+            patron._checked_out_items[item] = None
+            if loan_terms[FINE_CAP] == NO_CAP:
+                loan_terms[FINE_CAP] = None
+            library._restore_loan(item, due_date, tuple(loan_terms))
+
+    _, batches = read_table(os.path.join(directory, "holds.col"))
+    for batch in batches:
+        for library_item_id, patron_id, priority, sequence in zip(
+                batch["library_item_id"], batch["patron_id"], batch["priority"], batch["sequence"]):
+            item = holdings[library_item_id]
+            hold_queue = item._hold_queue
+            if hold_queue is None:
+                hold_queue = item._hold_queue = HoldQueue()
+            key = (priority, sequence, members[patron_id])
+            hold_queue._holds.append(key)
+            hold_queue._hold_keys[key[2]] = key
+            hold_queue._next_sequence = max(hold_queue._next_sequence, 1 - sequence)
+
+    library._rebuild_aggregates()
+    return library
@@ -0,0 +1,590 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: Durable persistence for a Library through a write-ahead journal and periodic snapshots.
+import json
+import os
+import pickle
+import threading
+import time
+
+from Library import (Library, Book, Album, Movie, Patron, HoldQueue, CHECK_OUT_SUCCESSFUL, RETURN_SUCCESSFUL,
+                     REQUEST_SUCCESSFUL, PAYMENT_SUCCESSFUL, HOLD_CANCELLED, HOLD_PROMOTED, RENEWAL_SUCCESSFUL)
+
+# Kinds of LibraryItem a snapshot can hold, keyed by class name
+ITEM_KINDS = {"Book": Book, "Album": Album, "Movie": Movie}
+
+SNAPSHOT_VERSION = 5
+SNAPSHOT_CHUNK_SIZE = 10000  # Rows pickled together in each chunk of a snapshot
+
+
+class Journal:
+    """
+    A Journal object is an append-only log of the state-changing operations of a Library, one JSON record per line.
+
+    Records are buffered and written with a single write and fsync per group, so the cost of syncing is shared by
+    every operation in the group. A group is committed once it holds group_size records, once sync_interval seconds
+    have passed since the last commit, or when commit or close is called. A background thread commits a group that is
+    still pending sync_interval seconds after the last commit, so however idle the Library goes, a record is durable
+    at most about sync_interval seconds after it is appended; a crash can lose only the records of that window.
+
+    Attributes:
+        _file (file): the journal file, opened for appending
+        _pending (list): the encoded records not yet committed
+        _group_size (int): the number of records that triggers a commit
+        _sync_interval (float): the greatest number of seconds a record waits to be committed
+        _last_commit (float): the time of the last commit
+        _condition (threading.Condition): guards the pending records and the file, and wakes the flusher thread
+        _flusher (threading.Thread): the thread committing idle groups, started with the first pending record
+        _closed (bool): whether the journal has been closed
+    """
+
+    def __init__(self, path, group_size=64, sync_interval=0.05):
+        """
+        Opens the journal at the given path for appending.
+
+        :param:
+            path (str): The path of the journal file.
+            group_size (int): The number of records that triggers a commit.
+            sync_interval (float): The greatest number of seconds a record waits to be committed.
+        """
+        self._file = open(path, "ab")
+        self._pending = []
+        self._group_size = group_size
+        self._sync_interval = sync_interval
+        self._last_commit = time.monotonic()
+        self._condition = threading.Condition()
+        self._flusher = None
+        self._closed = False
+
+    def append(self, record):
+        """
+        Appends a record to the journal, committing the pending group if it is full or old enough.
+
+        :param:
+            record (tuple): The operation name followed by its arguments.
+        """
+        line = json.dumps(record, separators=(",", ":"))
+        with self._condition:
+            self._pending.append(line)
+            if len(self._pending) >= self._group_size or time.monotonic() - self._last_commit >= self._sync_interval:
+                self._commit()
+            elif len(self._pending) == 1:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_idle_groups, daemon=True)
+                    self._flusher.start()
+                self._condition.notify()
+
+    def _flush_idle_groups(self):
+        """
+        Commits each group still pending sync_interval seconds after the last commit, until the journal is closed.
+        Runs in the flusher thread.
+        """
+        with self._condition:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                remaining = self._last_commit + self._sync_interval - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                else:
+                    self._commit()
+
+    def commit(self):
+        """
+        Writes every pending record to the journal and syncs it to disk.
+        """
+        with self._condition:
+            self._commit()
+
+    def _commit(self):
+        """
+        Writes every pending record to the journal and syncs it to disk, holding the condition's lock.
+        """
+        if self._pending:
+            self._pending.append("")
+            self._file.write("\n".join(self._pending).encode())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending.clear()
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        """
+        Commits any pending records, stops the flusher thread and closes the journal.
+        """
+        with self._condition:
+            self._commit()
+            self._closed = True
+            self._condition.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._file.close()
+
+
+def read_journal(path):
+    """
+    Reads the complete records of a journal file, stopping at a torn or corrupt record left by a crash.
+
+    :param:
+        path (str): The path of the journal file.
+
+    :return:
+        tuple: The list of records, and the length in bytes of the journal up to the end of the last one.
+    """
+    records = []
+    length = 0
+    if not os.path.exists(path):
+        return records, length
+
+    with open(path, "rb") as journal:
+        for line in journal:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            length += len(line)
+    return records, length
+
+
+def write_snapshot(library, path):
+    """
+    Writes the state of a Library to a snapshot file, as a stream of pickled chunks of flat rows. Items and patrons
+    refer to each other by id, so the size of each chunk stays bounded however large the Library is.
+
+    :param:
+        library (Library): The Library to snapshot.
+        path (str): The path of the snapshot file, which is written in place.
+    """
+    library.compact()  # Holds of removed patrons are not written
+    with open(path, "wb") as snapshot:
+        pickle.dump(("library", SNAPSHOT_VERSION, library._current_date), snapshot, pickle.HIGHEST_PROTOCOL)
+
+        for section, rows in [("patrons", _patron_rows(library)), ("items", _item_rows(library)),
+                              ("loans", _loan_rows(library)), ("holds", _hold_rows(library))]:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == SNAPSHOT_CHUNK_SIZE:
+                    pickle.dump((section, chunk), snapshot, pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump((section, chunk), snapshot, pickle.HIGHEST_PROTOCOL)
+
+        pickle.dump(("end", None), snapshot, pickle.HIGHEST_PROTOCOL)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+
+
+def _patron_rows(library):
+    """
+    Yields a flat row for each patron of a Library.
+    """
+    for patron in library._members.values():
+        yield (patron._patron_id, patron._name, patron._patron_class, patron._fine_cents, patron._fine_settled_date)
+
+
+def _item_rows(library):
+    """
+    Yields a flat row for each item of a Library, referring to patrons by id.
+    """
+    for item in library._holdings.values():
+        checked_out_by = item._checked_out_by
+        requested_by = item._requested_by
+        yield (type(item).__name__, item._library_item_id, item._title, item._get_creator(), item._location,
+               None if checked_out_by is None else checked_out_by._patron_id,
+               None if requested_by is None else requested_by._patron_id,
+               item._date_checked_out, item._due_date, item._loan_terms, item._renewal_count)
+
+
+def _loan_rows(library):
+    """
+    Yields the ids of the checked out items of each patron of a Library that has any, in the order they were checked
+    out.
+    """
+    for patron in library._members.values():
+        if patron._checked_out_items:
+            yield patron._patron_id, [item._library_item_id for item in patron._checked_out_items]
+
+
+def _hold_rows(library):
+    """
+    Yields the waiting holds of each item of a Library that has any, referring to patrons by id.
+    """
+    for item in library._holdings.values():
+        hold_queue = item._hold_queue
+        if hold_queue is not None:
+            yield (item._library_item_id, hold_queue._next_sequence,
+                   [(priority, sequence, patron._patron_id) for priority, sequence, patron in hold_queue._holds])
+
+
+def read_snapshot(library, path):
+    """
+    Restores the state held in a snapshot file into an empty Library.
+
+    :param:
+        library (Library): The empty Library to restore the state into.
+        path (str): The path of the snapshot file.
+    """
+    with open(path, "rb") as snapshot:
+        _, version, current_date = pickle.load(snapshot)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        library._current_date = current_date
+        holdings = library._holdings
+        members = library._members
+
+        while True:
+            section, rows = pickle.load(snapshot)
+            if section == "end":
+                break
+
+            if section == "patrons":
+                for patron_id, name, patron_class, fine_cents, fine_settled_date in rows:
+                    patron = Patron(patron_id, name, patron_class)
+                    library.add_patron(patron)
+                    patron._fine_cents = fine_cents
+                    patron._fine_settled_date = fine_settled_date
+            elif section == "items":
+                for (kind, library_item_id, title, creator, location, checked_out_by, requested_by,
+                     date_checked_out, due_date, loan_terms, renewal_count) in rows:
+                    item = ITEM_KINDS[kind](library_item_id, title, creator)
+                    library.add_library_item(item)
+                    item._location = location
+                    item._checked_out_by = None if checked_out_by is None else members[checked_out_by]
+                    item._requested_by = None if requested_by is None else members[requested_by]
+                    item._date_checked_out = date_checked_out
+                    item._renewal_count = renewal_count
+                    if due_date is not None:
+                        library._restore_loan(item, due_date, loan_terms)
+            elif section == "loans":
+                for patron_id, library_item_ids in rows:
+                    members[patron_id]._checked_out_items = dict.fromkeys(holdings[item_id]
+                                                                          for item_id in library_item_ids)
+            elif section == "holds":
+                for library_item_id, next_sequence, holds in rows:
+                    hold_queue = holdings[library_item_id]._hold_queue = HoldQueue()
+                    hold_queue._next_sequence = next_sequence
+                    for priority, sequence, patron_id in holds:
+                        key = (priority, sequence, members[patron_id])
+                        hold_queue._holds.append(key)
+                        hold_queue._hold_keys[key[2]] = key
+
+        library._rebuild_aggregates()
+
+
+class JournaledLibrary(Library):
+    """
+    A JournaledLibrary object is a Library whose state survives restarts. Every state-changing operation is appended
+    to a Journal, and checkpoint writes a compact snapshot of the whole Library and starts a new, empty journal after
+    it. Opening a JournaledLibrary on an existing directory loads the latest snapshot and replays only the journal
+    written since.
+
+    The directory holds snapshot-<generation>.bin and journal-<generation>.log, where the journal holds the
+    operations applied after the snapshot of the same generation. Generation 0 has no snapshot.
+
+    Attributes:
+        _directory (str): the directory holding the snapshot and journal files
+        _generation (int): the generation of the current snapshot and journal
+        _journal (Journal): the journal of operations since the current snapshot, or None while recovering
+        _group_size (int): the number of records that triggers a journal commit
+        _sync_interval (float): the greatest number of seconds a journal record waits to be committed
+        _snapshot_every (int): the number of journaled operations that triggers a checkpoint, or 0 for never
+        _journaled_count (int): the number of operations journaled since the current snapshot
+    """
+
+    def __init__(self, directory, group_size=64, sync_interval=0.05, snapshot_every=0, loan_policy=None):
+        """
+        Opens the JournaledLibrary stored in the given directory, recovering its state if it exists.
+
+        :param:
+            directory (str): The directory holding the snapshot and journal files, created if needed.
+            group_size (int): The number of records that triggers a journal commit.
+            sync_interval (float): The greatest number of seconds a journal record waits to be committed.
+            snapshot_every (int): The number of journaled operations that triggers a checkpoint, or 0 for never.
+            loan_policy (LoanPolicy): The LoanPolicy the Library was last set to, which the loans in the journal were
+            checked out under; the default policy if not given.
+        """
+        super().__init__()
+        self._directory = directory
+        self._generation = 0
+        self._journal = None
+        self._group_size = group_size
+        self._sync_interval = sync_interval
+        self._snapshot_every = snapshot_every
+        self._journaled_count = 0
+
+        if loan_policy is not None:
+            self.set_loan_policy(loan_policy)
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _path(self, kind, generation):
+        """
+        Gets the path of the snapshot or journal file of a generation.
+        """
+        extension = "bin" if kind == "snapshot" else "log"
+        return os.path.join(self._directory, f"{kind}-{generation}.{extension}")
+
+    def _recover(self):
+        """
+        Loads the latest snapshot, replays the journal written after it, and opens that journal for appending.
+        """
+        generations = [int(name[len("snapshot-"):-len(".bin")]) for name in os.listdir(self._directory)
+                       if name.startswith("snapshot-") and name.endswith(".bin")]
+        if generations:
+            self._generation = max(generations)
+            read_snapshot(self, self._path("snapshot", self._generation))
+
+        journal_path = self._path("journal", self._generation)
+        records, length = read_journal(journal_path)
+        for record in records:
+            self._replay(record)
+        self._journaled_count = len(records)
+
+        # Drop any torn record at the end, so new records are appended after the last complete one
+        if os.path.exists(journal_path) and os.path.getsize(journal_path) != length:
+            os.truncate(journal_path, length)
+        self._journal = Journal(journal_path, self._group_size, self._sync_interval)
+
+    def _replay(self, record):
+        """
+        Applies a journal record to the Library.
+
+        :param:
+            record (list): The operation name followed by its arguments.
+        """
+        operation = record[0]
+        if operation == "advance_date":
+            self.advance_date(record[1])
+        elif operation == "add_library_item":
+            _, kind, library_item_id, title, creator = record
+            self.add_library_item(ITEM_KINDS[kind](library_item_id, title, creator))
+        elif operation == "add_patron":
+            self.add_patron(Patron(*record[1:]))
+        elif operation == "cancel_hold":
+            self.cancel_hold(record[1], record[2])
+        elif operation == "promote_hold":
+            self.promote_hold(record[1], record[2], record[3])
+        elif operation == "remove_library_item":
+            self.remove_library_item(record[1])
+        elif operation == "remove_patron":
+            self.remove_patron(record[1])
+        elif operation == "drop_removed_holds":
+            self._drop_removed_holds(self._holdings[record[1]])
+        elif operation == "amend_fine":
+            self._amend_fine(self._members[record[1]], record[2])
+        else:
+            self.apply_transactions([record])
+
+    def _log(self, record):
+        """
+        Appends a record to the journal, unless the Library is recovering, and checkpoints when one is due.
+
+        :param:
+            record (tuple): The operation name followed by its arguments.
+        """
+        if self._journal is None:
+            return
+
+        self._journal.append(record)
+        self._journaled_count += 1
+        if self._snapshot_every and self._journaled_count >= self._snapshot_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Writes a snapshot of the Library and starts a new, empty journal after it, then removes the files of earlier
+        generations.
+        """
+        self.compact()
+        self._journal.close()
+        generation = self._generation + 1
+        snapshot_path = self._path("snapshot", generation)
+        write_snapshot(self, snapshot_path + ".tmp")
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+        _sync_directory(self._directory)
+
+        self._journal = Journal(self._path("journal", generation), self._group_size, self._sync_interval)
+        self._generation = generation
+        for name in os.listdir(self._directory):
+            kind, _, suffix = name.partition("-")
+            number = suffix.split(".")[0]
+            if kind in ("snapshot", "journal") and number.isdigit() and int(number) < generation:
+                os.remove(os.path.join(self._directory, name))
+        self._journaled_count = 0
+
+    def commit(self):
+        """
+        Makes every operation applied so far durable by committing the pending journal records.
+        """
+        self._journal.commit()
+
+    def close(self):
+        """
+        Commits the pending journal records and closes the journal.
+        """
+        self._journal.close()
+
+    def set_loan_policy(self, policy):
+        """
+        Sets the LoanPolicy of the Library, checkpointing first. The policy is not journaled: the loans checked out
+        under the old one are recovered from the snapshot with their terms, and the JournaledLibrary must be opened
+        with the new one to replay the loans journaled after it.
+        """
+        if self._journal is not None:
+            self.checkpoint()
+        super().set_loan_policy(policy)
+
+    def add_library_item(self, library_item):
+        """
+        Adds a LibraryItem to the Library's holdings and journals it.
+        """
+        result = super().add_library_item(library_item)
+        if result == "item added":
+            self._log(("add_library_item", type(library_item).__name__, library_item.get_library_item_id(),
+                       library_item.get_title(), library_item._get_creator()))
+        return result
+
+    def add_patron(self, patron):
+        """
+        Adds a Patron to the Library's members and journals it.
+        """
+        result = super().add_patron(patron)
+        if result == "patron added":
+            self._log(("add_patron", patron.get_patron_id(), patron.get_patron_name(), patron.get_patron_class()))
+        return result
+
+    def remove_library_item(self, library_item_id):
+        """
+        Removes a LibraryItem from the Library's holdings and journals it.
+        """
+        result = super().remove_library_item(library_item_id)
+        if result == "item removed":
+            self._log(("remove_library_item", library_item_id))
+        return result
+
+    def remove_patron(self, patron_id):
+        """
+        Removes a Patron from the Library's members and journals it.
+        """
+        result = super().remove_patron(patron_id)
+        if result == "patron removed":
+            self._log(("remove_patron", patron_id))
+        return result
+
+    def _drop_removed_holds(self, library_item):
+        """
+        Drops the holds on a LibraryItem of patrons who are no longer members and journals it if any were dropped,
+        since it can run on a lookup that is not journaled itself.
+        """
+        dropped = super()._drop_removed_holds(library_item)
+        if dropped:
+            self._log(("drop_removed_holds", library_item._library_item_id))
+        return dropped
+
+    def advance_date(self, days):
+        """
+        Advances the current date for the library by the given number of days and journals it.
+        """
+        super().advance_date(days)
+        if days > 0:
+            self._log(("advance_date", days))
+
+    def apply_transactions(self, transactions):
+        """
+        Processes a batch of circulation transactions and commits their journal records as one group.
+        """
+        results = super().apply_transactions(transactions)
+        if self._journal is not None:
+            self._journal.commit()
+        return results
+
+    def _check_out(self, patron, library_item):
+        """
+        Checks out a LibraryItem to a Patron and journals it if successful.
+        """
+        result = super()._check_out(patron, library_item)
+        if result == CHECK_OUT_SUCCESSFUL:
+            self._log(("check_out", patron._patron_id, library_item._library_item_id))
+        return result
+
+    def _return(self, library_item):
+        """
+        Returns a LibraryItem to the Library and journals it if successful.
+        """
+        result = super()._return(library_item)
+        if result == RETURN_SUCCESSFUL:
+            self._log(("return", library_item._library_item_id))
+        return result
+
+    def _renew(self, library_item):
+        """
+        Renews the loan of a LibraryItem and journals it if successful.
+        """
+        result = super()._renew(library_item)
+        if result == RENEWAL_SUCCESSFUL:
+            self._log(("renew", library_item._library_item_id))
+        return result
+
+    def _request(self, patron, library_item, priority=0):
+        """
+        Places a hold on a LibraryItem for a Patron and journals it if successful.
+        """
+        result = super()._request(patron, library_item, priority)
+        if result == REQUEST_SUCCESSFUL:
+            self._log(("request", patron._patron_id, library_item._library_item_id, priority))
+        return result
+
+    def _cancel_hold(self, patron, library_item):
+        """
+        Cancels a Patron's hold on a LibraryItem and journals it if successful.
+        """
+        result = super()._cancel_hold(patron, library_item)
+        if result == HOLD_CANCELLED:
+            self._log(("cancel_hold", patron._patron_id, library_item._library_item_id))
+        return result
+
+    def _promote_hold(self, patron, library_item, priority):
+        """
+        Moves a Patron's waiting hold on a LibraryItem to another priority tier and journals it if successful.
+        """
+        result = super()._promote_hold(patron, library_item, priority)
+        if result == HOLD_PROMOTED:
+            self._log(("promote_hold", patron._patron_id, library_item._library_item_id, priority))
+        return result
+
+    def _amend_fine(self, patron, amount):
+        """
+        Amends the fine of a Patron directly and journals it.
+        """
+        super()._amend_fine(patron, amount)
+        self._log(("amend_fine", patron._patron_id, amount))
+
+    def _pay_fine(self, patron, amount):
+        """
+        Reduces a Patron's outstanding fine by the amount paid and journals it.
+        """
+        result = super()._pay_fine(patron, amount)
+        if result == PAYMENT_SUCCESSFUL:
+            self._log(("pay_fine", patron._patron_id, amount))
+        return result
+
+
+def _sync_directory(directory):
+    """
+    Syncs a directory to disk so that files renamed into it survive a crash, where the platform supports it.
+    """
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
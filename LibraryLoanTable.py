@@ -0,0 +1,177 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: An optional NumPy-backed table of the active loans of a Library, for vectorized fine queries.
+from ItemTable import KIND_CODES
+from LibraryPolicy import DAILY_FINE, FINE_CAP, GRACE_DAYS
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only LoanTable needs it
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+NO_CAP = 2 ** 62  # Stored in place of None for a loan with no fine cap
+
+
+class LoanTable:
+    """
+    A LoanTable object holds the active loans of a Library as NumPy arrays, one row per loan, so overdue detection,
+    fines and due dates are worked out for every loan at once rather than item by item. It is a copy of the loans
+    when it was built; build a new one after the Library changes.
+
+    Attributes:
+        _current_date (int): the current date of the Library when the table was built
+        _items (list): the LibraryItem of each loan row
+        _patrons (list): the Patron of each patron index
+        _patron_indexes (ndarray): the patron index of each loan row
+        _kinds (ndarray): the kind code of each loan row, indexing ITEM_KINDS
+        _dates_checked_out (ndarray): the date each loan row was checked out
+        _due_dates (ndarray): the last day each loan row can be kept before it is overdue
+        _daily_fine_cents (ndarray): the daily fine of each loan row, in cents
+        _fine_cap_cents (ndarray): the fine cap of each loan row, in cents, or NO_CAP
+        _grace_days (ndarray): the grace days of each loan row
+        _fine_cents (ndarray): the fine each patron owed on _current_date, in cents, by patron index
+    """
+
+    def __init__(self, library):
+        """
+        Builds a LoanTable from the patrons and active loans of a Library.
+
+        :param:
+            library (Library): The Library whose loans are copied.
+        """
+        if np is None:
+            raise ImportError("LoanTable requires NumPy")
+
+        current_date = library._current_date
+        patrons = list(library._members.values())
+        items = []
+        patron_indexes = []
+        fine_cents = []
+        for patron_index, patron in enumerate(patrons):
+            fine_cents.append(patron._fine_cents + patron._fine_rate * (current_date - patron._fine_settled_date))
+            for item in patron._checked_out_items:
+                items.append(item)
+                patron_indexes.append(patron_index)
+
+        self._current_date = current_date
+        self._items = items
+        self._patrons = patrons
+        self._patron_indexes = np.array(patron_indexes, dtype=np.int64)
+        self._kinds = np.array([KIND_CODES[type(item)] for item in items], dtype=np.uint8)
+        self._dates_checked_out = np.array([item._date_checked_out for item in items], dtype=np.int64)
+        self._due_dates = np.array([item._due_date for item in items], dtype=np.int64)
+        terms = [item._loan_terms for item in items]
+        self._daily_fine_cents = np.array([loan_terms[DAILY_FINE] for loan_terms in terms], dtype=np.int64)
+        self._fine_cap_cents = np.array([NO_CAP if loan_terms[FINE_CAP] is None else loan_terms[FINE_CAP]
+                                         for loan_terms in terms], dtype=np.int64)
+        self._grace_days = np.array([loan_terms[GRACE_DAYS] for loan_terms in terms], dtype=np.int64)
+        self._fine_cents = np.array(fine_cents, dtype=np.int64)
+
+    def __len__(self):
+        """
+        Gets the number of loans in the LoanTable.
+        """
+        return len(self._items)
+
+    def _date(self, date):
+        """
+        Gets the date a query is made for: the given date, or the date the table was built.
+        """
+        if date is None:
+            return self._current_date
+        if date < self._current_date:
+            raise ValueError("a LoanTable cannot be queried for a date before it was built")
+        return date
+
+    def get_overdue_mask(self, date=None):
+        """
+        Gets which loans are overdue on a date.
+
+        :param:
+            date (int): The date, no earlier than when the table was built; that date if not given.
+
+        :return:
+            ndarray: A bool for each loan row, True if the loan is overdue.
+        """
+        return self._due_dates < self._date(date)
+
+    def get_overdue_items(self, date=None):
+        """
+        Gets the items that are overdue on a date, longest overdue first.
+
+        :param:
+            date (int): The date, no earlier than when the table was built; that date if not given.
+
+        :return:
+            list: A (LibraryItem, Patron, days overdue) tuple for each overdue item.
+        """
+        date = self._date(date)
+        rows = np.flatnonzero(self._due_dates < date)
+        days_overdue = date - self._due_dates[rows]
+        overdue = [(self._items[row], self._patrons[patron_index], days)
+                   for row, patron_index, days in zip(rows.tolist(), self._patron_indexes[rows].tolist(),
+                                                      days_overdue.tolist())]
+        overdue.sort(key=lambda entry: (-entry[2], entry[0].get_library_item_id()))
+        return overdue
+
+    def _loan_fine_cents(self, date):
+        """
+        Gets the fine each loan row has added to its patron's by a date: its daily fine for each day from the end of
+        its grace days, up to its fine cap.
+        """
+        days_fined = np.clip(date - self._due_dates - self._grace_days, 0, None)
+        return np.minimum(days_fined * self._daily_fine_cents, self._fine_cap_cents)
+
+    def get_fine_cents(self, date=None):
+        """
+        Gets the fine each patron will owe on a date if nothing but the date changes before then: what they owed when
+        the table was built, plus what each of their loans is fined after that, under the terms of the loan.
+
+        :param:
+            date (int): The date, no earlier than when the table was built; that date if not given.
+
+        :return:
+            ndarray: The fine of each patron in cents, by patron index.
+        """
+        date = self._date(date)
+        # Each loan adds what it is fined by the given date beyond what it was fined by the build date
+        fine_cents = self._fine_cents.copy()
+        np.add.at(fine_cents, self._patron_indexes,
+                  self._loan_fine_cents(date) - self._loan_fine_cents(self._current_date))
+        return fine_cents
+
+    def get_fines(self, date=None):
+        """
+        Gets the fine each patron will owe on a date, as get_fine_amount would report it after advancing the Library
+        to that date.
+
+        :param:
+            date (int): The date, no earlier than when the table was built; that date if not given.
+
+        :return:
+            dict: The fine amount of each patron, keyed by patron_id.
+        """
+        return {patron._patron_id: fine_cents / 100
+                for patron, fine_cents in zip(self._patrons, self.get_fine_cents(date).tolist())}
+
+    def get_items_due_within(self, days, date=None):
+        """
+        Gets the items that fall due within a number of days of a date, soonest first.
+
+        :param:
+            days (int): The number of days after the date to include.
+            date (int): The date, no earlier than when the table was built; that date if not given.
+
+        :return:
+            list: A (LibraryItem, Patron, due date) tuple for each item due on the date or within the days after it.
+        """
+        date = self._date(date)
+        rows = np.flatnonzero((self._due_dates >= date) & (self._due_dates <= date + days))
+        due = [(self._items[row], self._patrons[patron_index], due_date)
+               for row, patron_index, due_date in zip(rows.tolist(), self._patron_indexes[rows].tolist(),
+                                                      self._due_dates[rows].tolist())]
+        due.sort(key=lambda entry: (entry[2], entry[0].get_library_item_id()))
+        return due
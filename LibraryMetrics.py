@@ -0,0 +1,185 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: Opt-in metrics for Library operations: call counts, latency histograms and outcome counts.
+import threading
+import time
+from bisect import bisect_left
+
+from Library import Library, RESULT_MESSAGES
+
+# The public Library methods that are instrumented: every public method of the class, found when this module is
+# imported, so each method added to Library is instrumented without being listed here
+INSTRUMENTED_METHODS = tuple(
+    name for name in dir(Library) if not name.startswith("_") and callable(getattr(Library, name))
+)
+
+# The upper bounds of the latency histogram buckets, in seconds; a last bucket holds everything slower
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1, 1.0)
+
+
+class LibraryMetrics:
+    """
+    A LibraryMetrics object collects how often each Library operation is called, how long the calls take and what
+    each one returned. A Library is only slowed down while it is instrumented; the methods of a Library that is not
+    have no metrics code in them at all.
+
+    Attributes:
+        _counts (dict): the number of calls of each operation
+        _latency_sums (dict): the total seconds taken by the calls of each operation
+        _histograms (dict): the number of calls of each operation in each latency bucket, as a list per operation
+        _outcomes (dict): the number of calls of each operation with each result message, keyed by (operation, result)
+        _lock (threading.Lock): the lock guarding the metrics, so instrumented libraries may be shared by threads
+    """
+
+    def __init__(self):
+        """
+        Initializes empty metrics.
+        """
+        self._counts = {}
+        self._latency_sums = {}
+        self._histograms = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, result=None):
+        """
+        Records a call of an operation.
+
+        :param:
+            operation (str): The name of the operation.
+            seconds (float): The time the call took.
+            result (str): The result message of the call, if it returned one.
+        """
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = [0] * (len(LATENCY_BUCKETS) + 1)
+                self._counts[operation] = 0
+                self._latency_sums[operation] = 0.0
+            histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self._counts[operation] += 1
+            self._latency_sums[operation] += seconds
+            if result is not None:
+                key = (operation, result)
+                self._outcomes[key] = self._outcomes.get(key, 0) + 1
+
+    def record_outcomes(self, operation, results):
+        """
+        Records the result codes of a batch of transactions as outcomes of an operation.
+
+        :param:
+            operation (str): The name of the operation.
+            results (array): The result codes, each indexing RESULT_MESSAGES.
+        """
+        counts = {}
+        for code in results:
+            counts[code] = counts.get(code, 0) + 1
+        with self._lock:
+            for code, count in counts.items():
+                key = (operation, RESULT_MESSAGES[code])
+                self._outcomes[key] = self._outcomes.get(key, 0) + count
+
+    def snapshot(self):
+        """
+        Gets a copy of the metrics.
+
+        :return:
+            dict: For each operation, its call count, total seconds, cumulative count of calls within each latency
+            bucket bound (with "+Inf" last), and count of each result message.
+        """
+        with self._lock:
+            operations = {}
+            for operation, histogram in self._histograms.items():
+                buckets = {}
+                total = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram):
+                    total += count
+                    buckets[bound] = total
+                operations[operation] = {"count": self._counts[operation],
+                                         "seconds": self._latency_sums[operation],
+                                         "buckets": buckets, "outcomes": {}}
+            for (operation, result), count in self._outcomes.items():
+                operations[operation]["outcomes"][result] = count
+        return {"operations": operations}
+
+    def to_prometheus(self):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        :return:
+            str: The metrics, one sample per line.
+        """
+        operations = self.snapshot()["operations"]
+        lines = ["# HELP library_operation_seconds Latency of Library operations.",
+                 "# TYPE library_operation_seconds histogram"]
+        for operation, metrics in sorted(operations.items()):
+            for bound, count in metrics["buckets"].items():
+                lines.append(f'library_operation_seconds_bucket{{operation="{operation}",le="{bound}"}} {count}')
+            lines.append(f'library_operation_seconds_sum{{operation="{operation}"}} {metrics["seconds"]}')
+            lines.append(f'library_operation_seconds_count{{operation="{operation}"}} {metrics["count"]}')
+
+        lines.append("# HELP library_operation_outcomes_total Results of Library operations.")
+        lines.append("# TYPE library_operation_outcomes_total counter")
+        for operation, metrics in sorted(operations.items()):
+            for result, count in sorted(metrics["outcomes"].items()):
+                lines.append(f'library_operation_outcomes_total{{operation="{operation}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _instrumented(metrics, operation, method):
+    """
+    Wraps a bound Library method so each call is recorded in metrics.
+    """
+    clock = time.perf_counter
+    record = metrics.record
+
+    if operation == "apply_transactions":
+        def instrumented(*args, **kwargs):
+            start = clock()
+            results = method(*args, **kwargs)
+            record(operation, clock() - start)
+            metrics.record_outcomes(operation, results)
+            return results
+    else:
+        def instrumented(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            record(operation, clock() - start, result if isinstance(result, str) else None)
+            return result
+
+    instrumented.__wrapped__ = method
+    instrumented.__doc__ = method.__doc__
+    return instrumented
+
+
+def instrument(library, metrics=None):
+    """
+    Starts recording the calls of a Library's public methods, by replacing each one on the Library instance with a
+    wrapper that times it. Calls made by a Library to its own public methods, such as increment_current_date calling
+    advance_date, are recorded too.
+
+    :param:
+        library (Library): The Library to instrument.
+        metrics (LibraryMetrics): The metrics to record into; new metrics if not given.
+
+    :return:
+        LibraryMetrics: The metrics being recorded into.
+    """
+    if metrics is None:
+        metrics = LibraryMetrics()
+    uninstrument(library)
+    for operation in INSTRUMENTED_METHODS:
+        setattr(library, operation, _instrumented(metrics, operation, getattr(library, operation)))
+    return metrics
+
+
+def uninstrument(library):
+    """
+    Stops recording the calls of a Library's public methods, restoring the methods of its class.
+
+    :param:
+        library (Library): The Library to stop instrumenting.
+    """
+    for operation in INSTRUMENTED_METHODS:
+        library.__dict__.pop(operation, None)
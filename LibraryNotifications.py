@@ -0,0 +1,120 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: A queue of due-soon, overdue and hold-ready notifications, fed by the Library as the date advances.
+from collections import deque
+from itertools import islice
+
+# The kinds of notification
+DUE_SOON = "DUE_SOON"
+OVERDUE = "OVERDUE"
+HOLD_READY = "HOLD_READY"
+
+
+class NotificationQueue:
+    """
+    A NotificationQueue object collects the notifications of a Library: loans coming due in a number of days, loans
+    falling overdue, and items put on the hold shelf for a patron. Each notification is a (kind, date, LibraryItem,
+    Patron) tuple.
+
+    The queue does not hold one entry per notification. Advancing the date records the range of dates passed over,
+    and the set of loans the overdue calendar filed under each date that fell overdue; the notifications are only
+    built from them as they are pulled, a batch at a time, so a day on which a million loans fall due never holds a
+    million notifications in memory.
+
+    A notification is checked against the Library when it is pulled, and dropped if it no longer holds: the item was
+    returned, renewed or picked up since. A due-soon notice is also dropped once its loan is overdue, as the overdue
+    notice takes its place, and is only sent for loans checked out before the day of the notice.
+
+    Attributes:
+        _due_soon_days (tuple): the numbers of days before a loan is due that a due-soon notice is sent
+        _pending (deque): the recorded sources of notifications not yet pulled, oldest first
+        _current (generator): the notifications of the source being pulled from, if any
+    """
+
+    def __init__(self, due_soon_days=(3,)):
+        """
+        Initializes an empty NotificationQueue.
+
+        :param:
+            due_soon_days (tuple): The numbers of days before a loan is due to send a due-soon notice.
+        """
+        self._due_soon_days = tuple(sorted(set(due_soon_days)))
+        self._pending = deque()
+        self._current = None
+
+    def _date_advanced(self, start_date, end_date):
+        """
+        Records that the Library advanced from start_date to end_date, so loans coming due soon on the dates passed
+        over are notified.
+        """
+        for days in self._due_soon_days:
+            self._pending.append((DUE_SOON, start_date, end_date, days))
+
+    def _fell_overdue(self, date, loans):
+        """
+        Records the set of loans the overdue calendar filed under a date; those of them due the day before fell
+        overdue on that date. The calendar no longer holds the set, so it will not change.
+        """
+        self._pending.append((OVERDUE, date, loans))
+
+    def _hold_ready(self, library_item, patron, date):
+        """
+        Records that a LibraryItem was put on the hold shelf for a Patron on a date.
+        """
+        self._pending.append((HOLD_READY, date, library_item, patron))
+
+    def _notifications(self, library, source):
+        """
+        Builds the notifications of one recorded source that still hold, in order of date.
+        """
+        kind = source[0]
+        if kind == HOLD_READY:
+            _, date, library_item, patron = source
+            if (library_item._location == "ON_HOLD_SHELF" and library_item._requested_by is patron
+                    and patron._library is library):
+                yield source
+        elif kind == OVERDUE:
+            _, date, loans = source
+            for library_item in loans:
+                patron = library_item._checked_out_by
+                if patron is not None and library_item._due_date == date - 1:
+                    yield OVERDUE, date, library_item, patron
+        else:
+            _, start_date, end_date, days = source
+            calendar = library._overdue_calendar
+            # Loans due on date + days are filed in the overdue calendar under the day after
+            if end_date - start_date <= len(calendar):
+                overdue_dates = range(start_date + days + 2, end_date + days + 2)
+            else:
+                overdue_dates = sorted(date for date in calendar if start_date + days + 1 < date <= end_date + days + 1)
+            for overdue_date in overdue_dates:
+                date = overdue_date - days - 1
+                if date + days < library._current_date:
+                    continue  # Already overdue
+                # The calendar keeps changing, so the loans due on a date are copied before they are notified
+                for library_item in list(calendar.get(overdue_date, ())):
+                    if library_item._due_date == overdue_date - 1 and library_item._date_checked_out < date:
+                        yield DUE_SOON, date, library_item, library_item._checked_out_by
+
+    def pull(self, library, limit):
+        """
+        Removes up to limit notifications from the queue, in the order they were recorded.
+
+        :param:
+            library (Library): The Library the queue is attached to.
+            limit (int): The greatest number of notifications to return.
+
+        :return:
+            list: The (kind, date, LibraryItem, Patron) tuple of each notification.
+        """
+        notifications = []
+        while len(notifications) < limit:
+            if self._current is None:
+                if not self._pending:
+                    break
+                self._current = self._notifications(library, self._pending.popleft())
+            notifications.extend(islice(self._current, limit - len(notifications)))
+            if len(notifications) < limit:
+                self._current = None  # The source is used up
+        return notifications
@@ -0,0 +1,178 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: Loan policies of loan days, fine rates, caps, grace days and renewal limits, compiled into lookup tables.
+
+# The positions of the terms in a loan terms tuple
+LOAN_DAYS = 0
+DAILY_FINE = 1
+FINE_CAP = 2
+GRACE_DAYS = 3
+RENEWAL_LIMIT = 4
+
+DEFAULT_PATRON_CLASS = "standard"
+DEFAULT_RENEWAL_LIMIT = 2
+
+# The terms a rule can set, each with whether it is an amount of dollars, kept in cents
+TERMS = {"loan_days": False, "daily_fine": True, "fine_cap": True, "grace_days": False, "renewal_limit": False}
+TERM_NAMES = tuple(TERMS)
+
+
+def _to_term(name, value):
+    """
+    Checks the value of a term, and converts an amount of dollars to cents.
+
+    :return:
+        int: The value of the term
+        OR
+        None, if the term is a fine_cap of None, for no cap
+    """
+    if name not in TERMS:
+        raise ValueError(f"unknown loan term {name}")
+    if value is None and name == "fine_cap":
+        return None
+    if value is None or value < 0:
+        raise ValueError(f"{name} must be at least zero")
+    return round(value * 100) if TERMS[name] else int(value)
+
+
+def _resolve_terms(defaults, rules, kind, patron_class):
+    """
+    Works out the terms of a loan of a kind of item to a class of patron from the defaults and the rules that apply.
+
+    :return:
+        tuple: The loan days, daily fine in cents, fine cap in cents or None, grace days and renewal limit.
+    """
+    terms = dict(defaults, loan_days=kind.CHECK_OUT_LENGTH)
+    for rule_kind, rule_class, rule_terms in rules:
+        if (rule_kind is None or issubclass(kind, rule_kind)) and rule_class in (None, patron_class):
+            terms.update(rule_terms)
+    return tuple(terms[name] for name in TERM_NAMES)
+
+
+def loan_fine_cents(loan_terms, due_date, date):
+    """
+    Gets the fine a loan has added to its patron's by a date: the daily fine for each day from the end of its grace
+    days, up to its fine cap.
+
+    :param:
+        loan_terms (tuple): The terms of the loan.
+        due_date (int): The last day of the loan before it is overdue.
+        date (int): The date to work the fine out up to.
+
+    :return:
+        int: The fine of the loan in cents.
+    """
+    _, daily_fine_cents, fine_cap_cents, grace_days, _ = loan_terms
+    fine_cents = daily_fine_cents * max(0, date - due_date - grace_days)
+    return fine_cents if fine_cap_cents is None else min(fine_cents, fine_cap_cents)
+
+
+class LoanPolicy:
+    """
+    A LoanPolicy object holds the lending rules of one library branch: how many days each kind of item is lent for,
+    and the daily fine, fine cap, grace days and renewal limit of its loans, for each class of patron. A rule applies
+    to one kind of item, one class of patron, both, or every loan. Where several rules set a term, the most specific
+    one wins, and of rules just as specific, the one set last.
+
+    A Library does not read the rules on each checkout. The policy is compiled into a LoanTermsTable of the terms of
+    every kind and class of patron, and a checkout looks up its terms in that.
+
+    Attributes:
+        _defaults (dict): the terms of a loan no rule sets, keyed by term name, with amounts in cents
+        _rules (list): the (kind, patron_class, terms) of each rule, in the order set, where kind or patron_class is
+        None if the rule applies to every one, and terms is a dict of the terms it sets
+    """
+
+    def __init__(self, daily_fine=0.10, fine_cap=None, grace_days=0, renewal_limit=DEFAULT_RENEWAL_LIMIT):
+        """
+        Initializes a LoanPolicy with no rules, lending each kind of item for its check out length.
+
+        :param:
+            daily_fine (float): The fine for each day a loan is overdue, in dollars.
+            fine_cap (float): The most fine a single loan can add, in dollars, or None for no cap.
+            grace_days (int): The number of days a loan can be overdue before it is fined.
+            renewal_limit (int): The number of times a loan can be renewed.
+        """
+        self._defaults = {name: _to_term(name, value) for name, value in
+                          [("daily_fine", daily_fine), ("fine_cap", fine_cap), ("grace_days", grace_days),
+                           ("renewal_limit", renewal_limit)]}
+        self._rules = []
+
+    def set_rule(self, kind=None, patron_class=None, **terms):
+        """
+        Sets some of the terms of the loans of a kind of item, to a class of patron, or both.
+
+        :param:
+            kind (type): The LibraryItem class the rule applies to, including its subclasses, or None for every kind.
+            patron_class (str): The class of patron the rule applies to, or None for every class.
+            terms: The terms the rule sets, by name: loan_days, daily_fine and fine_cap in dollars, grace_days and
+            renewal_limit. A fine_cap of None means no cap.
+        """
+        terms = {name: _to_term(name, value) for name, value in terms.items()}
+        self._rules.append((kind, patron_class, terms))
+
+    def _ordered_rules(self):
+        """
+        Gets the rules in the order they are applied: least specific first, then in the order set.
+        """
+        return sorted(self._rules, key=lambda rule: (rule[0] is not None) + (rule[1] is not None))
+
+    def get_terms(self, kind, patron_class=DEFAULT_PATRON_CLASS):
+        """
+        Gets the terms of a loan of a kind of item to a class of patron.
+
+        :param:
+            kind (type): The LibraryItem class of the item.
+            patron_class (str): The class of the patron.
+
+        :return:
+            tuple: The loan days, daily fine in cents, fine cap in cents or None, grace days and renewal limit.
+        """
+        return _resolve_terms(self._defaults, self._ordered_rules(), kind, patron_class)
+
+    def compile(self, kinds=()):
+        """
+        Compiles the policy into a LoanTermsTable, working out in advance the terms of each of the kinds for the
+        default class of patron and every class a rule names. Later changes to the policy do not affect the table.
+
+        :param:
+            kinds (iterable): The LibraryItem classes to work out the terms of in advance.
+
+        :return:
+            LoanTermsTable: The terms of each kind and class of patron.
+        """
+        table = LoanTermsTable(dict(self._defaults), self._ordered_rules())
+        patron_classes = {DEFAULT_PATRON_CLASS}
+        patron_classes.update(rule[1] for rule in self._rules if rule[1] is not None)
+        for kind in kinds:
+            for patron_class in patron_classes:
+                table[kind, patron_class] = _resolve_terms(table._defaults, table._rules, kind, patron_class)
+        return table
+
+
+class LoanTermsTable(dict):
+    """
+    A LoanTermsTable object is a compiled LoanPolicy: a dict of the terms of a loan, keyed by (LibraryItem class,
+    patron class), so each checkout finds its terms with a single lookup. The terms of a key that was not worked out in
+    advance are worked out, and kept, the first time it is looked up.
+
+    Attributes:
+        _defaults (dict): the terms of a loan no rule sets, as in the policy when it was compiled
+        _rules (list): the rules of the policy when it was compiled, in the order they are applied
+    """
+
+    def __init__(self, defaults, rules):
+        """
+        Initializes an empty LoanTermsTable for the defaults and rules of a policy.
+        """
+        super().__init__()
+        self._defaults = defaults
+        self._rules = rules
+
+    def __missing__(self, key):
+        """
+        Works out and keeps the terms of a key that is not in the table yet.
+        """
+        terms = self[key] = _resolve_terms(self._defaults, self._rules, *key)
+        return terms
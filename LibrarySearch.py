@@ -0,0 +1,190 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: An in-process inverted index for searching library items by title, author, artist and director.
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Fields of each kind of LibraryItem that are indexed, with the weight a match in each field adds to a score
+FIELD_WEIGHTS = {"title": 2.0, "author": 1.0, "artist": 1.0, "director": 1.0}
+CREATOR_FIELDS = {"Book": "author", "Album": "artist", "Movie": "director"}
+
+
+def tokenize(text):
+    """
+    Splits text into case-folded word tokens.
+
+    :param:
+        text (str): The text to split.
+
+    :return:
+        list: The tokens of the text, in order.
+    """
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class SearchIndex:
+    """
+    A SearchIndex object is an inverted index over the titles and creators of library items. Each token maps to the
+    items it appears in, so a search only touches the items matching its tokens, never the whole catalog. A sorted
+    vocabulary of every token supports prefix searches.
+
+    Attributes:
+        _postings (dict): for each token, the score weight of each item it appears in, keyed by item
+        _field_postings (dict): for each (field, token), the set of items whose field contains the token
+        _vocabulary (list): every token in the index, sorted
+        _item_count (int): the number of items in the index
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty SearchIndex.
+        """
+        self._postings = {}
+        self._field_postings = {}
+        self._vocabulary = []
+        self._item_count = 0
+
+    def __len__(self):
+        """
+        Gets the number of items in the SearchIndex.
+        """
+        return self._item_count
+
+    def __contains__(self, library_item):
+        """
+        Checks whether a LibraryItem is in the index. An item with no words in its title or creator cannot be told
+        apart from one that was never indexed, and is taken as not indexed.
+        """
+        for _, text in self._fields(library_item):
+            tokens = tokenize(text)
+            if tokens:
+                return library_item in self._postings.get(tokens[0], ())
+        return False
+
+    def _fields(self, library_item):
+        """
+        Gets the indexed fields of a LibraryItem as (field, text) pairs.
+        """
+        return [("title", library_item.get_title()),
+                (CREATOR_FIELDS[type(library_item).__name__], library_item._get_creator())]
+
+    def add_library_item(self, library_item):
+        """
+        Adds the title and creator of a LibraryItem to the index.
+
+        :param:
+            library_item (LibraryItem): The Book, Album or Movie to index.
+        """
+        self._item_count += 1
+        for field, text in self._fields(library_item):
+            weight = FIELD_WEIGHTS[field]
+            for token in set(tokenize(text)):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    insort(self._vocabulary, token)
+                postings[library_item] = postings.get(library_item, 0.0) + weight
+
+                field_postings = self._field_postings.get((field, token))
+                if field_postings is None:
+                    field_postings = self._field_postings[field, token] = set()
+                field_postings.add(library_item)
+
+    def remove_library_item(self, library_item):
+        """
+        Removes a LibraryItem from the index.
+
+        :param:
+            library_item (LibraryItem): The Book, Album or Movie to remove; its title and creator must not have changed
+            since it was indexed.
+        """
+        self._item_count -= 1
+        for field, text in self._fields(library_item):
+            for token in set(tokenize(text)):
+                postings = self._postings[token]
+                postings.pop(library_item, None)
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+                field_postings = self._field_postings[field, token]
+                field_postings.discard(library_item)
+                if not field_postings:
+                    del self._field_postings[field, token]
+
+    def _expand(self, token, prefix):
+        """
+        Gets the indexed tokens a query token matches: itself, or every token it is a prefix of.
+        """
+        if not prefix:
+            return [token] if token in self._postings else []
+
+        start = bisect_left(self._vocabulary, token)
+        end = start
+        while end < len(self._vocabulary) and self._vocabulary[end].startswith(token):
+            end += 1
+        return self._vocabulary[start:end]
+
+    def search(self, query, field=None, prefix=False, limit=10):
+        """
+        Searches for the items matching every token of a query, ranked by how strongly they match.
+
+        Each matching token adds its field weight, times how rare the token is across the index, to an item's score.
+
+        :param:
+            query (str): The words to search for.
+            field (str): Only match tokens in this field, "title", "author", "artist" or "director", if given.
+            prefix (bool): Whether the last word of the query matches any token it is a prefix of.
+            limit (int): The greatest number of results to return.
+
+        :return:
+            list: The matching LibraryItems, best match first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Gather, for each query token, the postings of every indexed token it matches and the weight of a match
+        matchers = []
+        for position, token in enumerate(tokens):
+            matcher = []
+            for match in self._expand(token, prefix and position == len(tokens) - 1):
+                postings = self._postings[match]
+                rarity = math.log(1 + self._item_count / len(postings))
+                if field is None:
+                    matcher.append((postings, rarity))
+                elif (field, match) in self._field_postings:
+                    matcher.append((self._field_postings[field, match], FIELD_WEIGHTS[field] * rarity))
+            if not matcher:
+                return []
+            matchers.append(matcher)
+
+        # Only the items matching the rarest query token are candidates; each is scored against every token
+        matchers.sort(key=lambda matcher: sum(len(postings) for postings, _ in matcher))
+        candidates = set()
+        for postings, _ in matchers[0]:
+            candidates.update(postings)
+
+        totals = {}
+        for item in candidates:
+            total = 0.0
+            for matcher in matchers:
+                best = 0.0
+                for postings, weight in matcher:
+                    if item in postings:
+                        score = weight if field is not None else postings[item] * weight
+                        if score > best:
+                            best = score
+                if not best:
+                    break
+                total += best
+            else:
+                totals[item] = total
+
+        best = heapq.nsmallest(limit, totals.items(), key=lambda entry: (-entry[1], entry[0].get_library_item_id()))
+        return [item for item, _ in best]
@@ -0,0 +1,369 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: An asyncio service that serves Library operations over TCP or a Unix socket, and a load generator.
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from Library import Library, Book, Album, Movie, Patron
+
+
+class LibraryService:
+    """
+    A LibraryService object serves a Library to many connections from a single asyncio event loop. Every operation
+    runs on the loop itself, so operations never interleave and the Library needs no locks.
+
+    The protocol is one JSON object per line. A request names an operation and its arguments, and may carry an id
+    that is echoed in its response:
+        {"id": 1, "op": "check_out", "args": ["459786", "B1009653"]}
+        {"id": 1, "result": "check out successful"}
+
+    Each connection may pipeline requests; they are answered in order. Requests are read into a bounded queue, so
+    when a client sends faster than its responses are written, the service stops reading from it.
+
+    Attributes:
+        _library (Library): the Library being served
+        _pipeline_depth (int): the number of requests read ahead of the response being written, per connection
+        _operations (dict): the coroutine of each operation name in the protocol
+    """
+
+    def __init__(self, library, pipeline_depth=128):
+        """
+        Initializes a service for the given Library.
+
+        :param:
+            library (Library): The Library to serve.
+            pipeline_depth (int): The number of requests read ahead of the response being written, per connection.
+        """
+        self._library = library
+        self._pipeline_depth = pipeline_depth
+        self._operations = {
+            "check_out": self.check_out_library_item,
+            "return": self.return_library_item,
+            "request": self.request_library_item,
+            "pay_fine": self.pay_fine,
+            "advance_date": self.advance_date,
+            "increment_current_date": self.increment_current_date,
+        }
+
+    async def check_out_library_item(self, patron_id, library_item_id):
+        """
+        Checks out a LibraryItem to a patron.
+
+        :return:
+            str: The result of the checkout attempt.
+        """
+        return self._library.check_out_library_item(patron_id, library_item_id)
+
+    async def return_library_item(self, library_item_id):
+        """
+        Returns a LibraryItem to the Library.
+
+        :return:
+            str: The result of the return attempt.
+        """
+        return self._library.return_library_item(library_item_id)
+
+    async def request_library_item(self, patron_id, library_item_id):
+        """
+        Requests a LibraryItem to be held for a patron.
+
+        :return:
+            str: The result of the request.
+        """
+        return self._library.request_library_item(patron_id, library_item_id)
+
+    async def pay_fine(self, patron_id, amount):
+        """
+        Processes a fine payment for a Patron.
+
+        :return:
+            str: The result of the fine payment.
+        """
+        return self._library.pay_fine(patron_id, amount)
+
+    async def advance_date(self, days):
+        """
+        Advances the current date for the library by the given number of days.
+
+        :return:
+            int: The new current date.
+        """
+        self._library.advance_date(days)
+        return self._library._current_date
+
+    async def increment_current_date(self):
+        """
+        Advances the current date for the library by one day.
+
+        :return:
+            int: The new current date.
+        """
+        return await self.advance_date(1)
+
+    async def handle_request(self, line):
+        """
+        Decodes a request line, runs its operation and encodes the response line.
+
+        :param:
+            line (bytes): The request, as a line of JSON.
+
+        :return:
+            bytes: The response, as a line of JSON.
+        """
+        response = {}
+        try:
+            request = json.loads(line)
+            if "id" in request:
+                response["id"] = request["id"]
+            operation = self._operations.get(request.get("op"))
+            if operation is None:
+                response["error"] = "unknown operation"
+            else:
+                response["result"] = await operation(*request.get("args", ()))
+        except (ValueError, TypeError, AttributeError) as error:
+            response["error"] = f"bad request: {error}"
+        return (json.dumps(response, separators=(",", ":")) + "\n").encode()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the pipelined requests of one connection until the client closes it.
+
+        :param:
+            reader (asyncio.StreamReader): The stream of request lines.
+            writer (asyncio.StreamWriter): The stream of response lines.
+        """
+        requests = asyncio.Queue(self._pipeline_depth)
+
+        async def read_requests():
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        await requests.put(line)
+            except (ValueError, ConnectionError):
+                # A line longer than the stream limit, or the client went away; either ends the connection
+                pass
+            finally:
+                # Never waits on a full queue, which nothing may ever drain; the loop below also stops once the
+                # reader is done and the queue is empty
+                try:
+                    requests.put_nowait(None)
+                except asyncio.QueueFull:
+                    pass
+
+        reading = asyncio.ensure_future(read_requests())
+        try:
+            while True:
+                if reading.done() and requests.empty():
+                    break
+                line = await requests.get()
+                if line is None:
+                    break
+                writer.write(await self.handle_request(line))
+                if requests.empty():
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # The client went away, or the server is shutting down
+            pass
+        finally:
+            reading.cancel()
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8162, path=None):
+        """
+        Starts listening for connections, on a Unix socket if a path is given, or else over TCP.
+
+        :param:
+            host (str): The host to listen on over TCP.
+            port (int): The port to listen on over TCP.
+            path (str): The path of the Unix socket to listen on, if any.
+
+        :return:
+            asyncio.AbstractServer: The listening server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path=path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+def build_library(item_count, patron_count):
+    """
+    Builds a Library with the given numbers of synthetic items and patrons, for serving and load testing.
+
+    :param:
+        item_count (int): The number of items, cycling through Book, Album and Movie.
+        patron_count (int): The number of patrons.
+
+    :return:
+        Library: The new Library.
+    """
+    library = Library()
+    kinds = (Book, Album, Movie)
+    for number in range(item_count):
+        library.add_library_item(kinds[number % 3](f"I{number}", f"Title {number}", f"Creator {number}"))
+    for number in range(patron_count):
+        library.add_patron(Patron(f"P{number}", f"Patron {number}"))
+    return library
+
+
+async def _run_connection(open_connection, requests, pipeline_depth, latencies):
+    """
+    Sends requests over one connection, keeping up to pipeline_depth of them in flight, and records the latency of
+    each one.
+    """
+    reader, writer = await open_connection()
+    in_flight = asyncio.Semaphore(pipeline_depth)
+    sent_times = []
+    receiving = asyncio.ensure_future(_receive(reader, sent_times, len(requests), latencies, in_flight))
+    try:
+        for request in requests:
+            await in_flight.acquire()
+            if receiving.done():
+                # The service closed the connection, so the rest of the requests would never be answered
+                break
+            sent_times.append(time.perf_counter())
+            writer.write(request)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    await receiving
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        # The service reset the connection; the responses it sent before that are already recorded
+        pass
+
+
+async def _receive(reader, sent_times, count, latencies, in_flight):
+    """
+    Reads the responses of one connection in order, recording the latency of each against its send time. If the
+    service closes the connection first, a permit is released so a sender waiting for one sees that it has closed.
+    """
+    for index in range(count):
+        try:
+            line = await reader.readline()
+        except ConnectionError:
+            line = b""
+        if not line:
+            in_flight.release()
+            break
+        latencies.append(time.perf_counter() - sent_times[index])
+        in_flight.release()
+
+
+def _percentile(ordered, fraction):
+    """
+    Gets a percentile of an ordered list of samples, or 0.0 if there are none.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_load(connections=16, requests_per_connection=2000, pipeline_depth=32, item_count=1000,
+                   patron_count=100, host="127.0.0.1", port=8162, path=None, seed=0):
+    """
+    Generates load against a running LibraryService from many connections, and reports throughput and latency
+    percentiles.
+
+    :param:
+        connections (int): The number of concurrent connections.
+        requests_per_connection (int): The number of requests each connection sends.
+        pipeline_depth (int): The number of requests each connection keeps in flight.
+        item_count (int): The number of synthetic items the service was built with.
+        patron_count (int): The number of synthetic patrons the service was built with.
+        host (str): The host of the service over TCP.
+        port (int): The port of the service over TCP.
+        path (str): The path of the Unix socket of the service, if any.
+        seed (int): The seed of the random requests.
+
+    :return:
+        dict: The number of requests, the seconds taken, the requests per second, and the p50, p95 and p99 latencies
+        in milliseconds, all 0 if the service answered no requests.
+    """
+    generator = random.Random(seed)
+    workloads = []
+    for _ in range(connections):
+        requests = []
+        for number in range(requests_per_connection):
+            patron_id = f"P{generator.randrange(patron_count)}"
+            library_item_id = f"I{generator.randrange(item_count)}"
+            choice = generator.random()
+            if choice < 0.45:
+                request = {"id": number, "op": "check_out", "args": [patron_id, library_item_id]}
+            elif choice < 0.9:
+                request = {"id": number, "op": "return", "args": [library_item_id]}
+            else:
+                request = {"id": number, "op": "request", "args": [patron_id, library_item_id]}
+            requests.append((json.dumps(request) + "\n").encode())
+        workloads.append(requests)
+
+    if path is not None:
+        def open_connection():
+            return asyncio.open_unix_connection(path)
+    else:
+        def open_connection():
+            return asyncio.open_connection(host, port)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[_run_connection(open_connection, requests, pipeline_depth, latencies)
+                           for requests in workloads])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    report = {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if latencies and elapsed > 0 else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+    return report
+
+
+def main():
+    """
+    Main function to run the service, or the load generator against it.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", choices=["serve", "load", "both"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8162)
+    parser.add_argument("--unix", dest="path", default=None, help="path of a Unix socket to use instead of TCP")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--patrons", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per connection")
+    parser.add_argument("--pipeline", type=int, default=32, help="requests in flight per connection")
+    arguments = parser.parse_args()
+
+    async def run():
+        server = None
+        if arguments.mode in ("serve", "both"):
+            service = LibraryService(build_library(arguments.items, arguments.patrons))
+            server = await service.start(arguments.host, arguments.port, arguments.path)
+            if arguments.mode == "serve":
+                await server.serve_forever()
+
+        report = await run_load(arguments.connections, arguments.requests, arguments.pipeline, arguments.items,
+                                arguments.patrons, arguments.host, arguments.port, arguments.path)
+        for name, value in report.items():
+            print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# Author: Ashton Lee
+# Github User: ashton01L
+# Date: 10/16/2024
+# Description: A discrete-event simulator that replays event traces through a Library, for capacity planning.
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from Library import Book, RESULT_MESSAGES
+from LibraryBenchmark import EVENT_MIX, generate_workload, build_workload_library
+from LibraryPolicy import LoanPolicy
+
+SIMULATION_BATCH_SIZE = 4096  # Greatest number of transactions applied together between date advances
+
+
+def generate_events(patron_count=1000, item_count=10000, days=30, events_per_day=1000, seed=162, mix=None):
+    """
+    Generates a reproducible stream of circulation events lazily, one at a time, for the patrons and items of
+    generate_workload with the same counts. Each day has events_per_day transactions followed by ("advance_date", 1).
+
+    Items are drawn with the same skew as generate_workload, and returns mostly name items that are out on loan. Only
+    up to item_count of those are remembered, so memory stays bounded however many events are generated.
+
+    :param:
+        patron_count (int): The number of patrons.
+        item_count (int): The number of items.
+        days (int): The number of days to generate.
+        events_per_day (int): The number of transactions on each day.
+        seed (int): The seed of the events; the same seed always generates the same events.
+        mix (dict): The share of each kind of transaction, keyed by event name; EVENT_MIX if not given. Any share
+        of "advance_date" is ignored, as the days are set by events_per_day.
+
+    :return:
+        generator: The events, each a transaction as taken by Library.apply_transactions, or ("advance_date", 1).
+    """
+    generator = random.Random(seed)
+    mix = EVENT_MIX if mix is None else mix
+    names = [name for name in mix if name != "advance_date"]
+    weights = [mix[name] for name in names]
+
+    def pick_item():
+        return f"I{int(item_count * generator.random() ** 2):09d}"
+
+    on_loan = []
+    for _ in range(days):
+        for name in generator.choices(names, weights, k=events_per_day):
+            patron_id = f"P{generator.randrange(patron_count):07d}"
+            if name == "check_out":
+                library_item_id = pick_item()
+                if len(on_loan) < item_count:
+                    on_loan.append(library_item_id)
+                yield "check_out", patron_id, library_item_id
+            elif name == "return" or name == "renew":
+                if on_loan and generator.random() < 0.9:
+                    index = generator.randrange(len(on_loan))
+                    library_item_id = on_loan[index] if name == "renew" else on_loan.pop(index)
+                else:
+                    library_item_id = pick_item()
+                yield name, library_item_id
+            elif name == "request":
+                yield "request", patron_id, pick_item()
+            else:
+                yield "pay_fine", patron_id, generator.choice((0.5, 1.0, 2.5, 5.0))
+        yield "advance_date", 1
+
+
+def write_trace(path, events):
+    """
+    Writes events to a trace file, one JSON array per line, without holding them all in memory.
+
+    :param:
+        path (str): The path of the trace file.
+        events (iterable): The events to write.
+    """
+    with open(path, "w") as trace:
+        for event in events:
+            trace.write(json.dumps(event, separators=(",", ":")))
+            trace.write("\n")
+
+
+def read_trace(path):
+    """
+    Reads the events of a trace file lazily, one line at a time.
+
+    :param:
+        path (str): The path of the trace file.
+
+    :return:
+        generator: The events, as tuples.
+    """
+    with open(path) as trace:
+        for line in trace:
+            if line.strip():
+                yield tuple(json.loads(line))
+
+
+def _day_row(library, date, events, seconds, count_holds):
+    """
+    Gets the report of one simulated day: its events and timing, and the state of the Library at its end.
+    """
+    totals = library.get_circulation_totals()
+    row = {"date": date, "events": events, "seconds": seconds, "loans": totals["loans"],
+           "overdue_loans": totals["overdue_loans"], "fines": totals["fines"]}
+    if count_holds:
+        # The hold queues are not totalled as they change, so they are counted once a day
+        hold_counts = [library_item.get_hold_count() for library_item in library._holdings.values()
+                       if library_item._requested_by is not None]
+        row["holds"] = sum(hold_counts)
+        row["longest_hold_queue"] = max(hold_counts, default=0)
+    return row
+
+
+def simulate(library, events, batch_size=SIMULATION_BATCH_SIZE, count_holds=True):
+    """
+    Streams events through a Library. The transactions between date advances are applied in batches of at most
+    batch_size, and each ("advance_date", days) event advances the date in one step, so only a batch of events is
+    held in memory at a time, however long the stream.
+
+    Everything reported but the timings depends only on the Library and the events, so the same scenario reports the
+    same results each time it is simulated. The time spent reporting each day is left out of the timings.
+
+    :param:
+        library (Library): The Library to simulate, with its items and patrons added.
+        events (iterable): The events, as generated by generate_events or read by read_trace.
+        batch_size (int): The greatest number of transactions applied together.
+        count_holds (bool): Whether to count the waiting holds at the end of each day, which reads every item.
+
+    :return:
+        dict: The number of events, the seconds taken and events per second, the number of transactions with each
+        result, and a row for each day advanced with its events, seconds, loans, overdue loans, fines and, if
+        counted, holds and longest hold queue.
+    """
+    results = Counter()
+    daily = []
+    batch = []
+    event_count = 0
+    day_events = 0
+    reporting = 0.0  # Seconds spent on the daily rows, which are not counted as simulating
+    start = day_start = time.perf_counter()
+
+    for event in events:
+        event_count += 1
+        if event[0] != "advance_date":
+            batch.append(event)
+            day_events += 1
+            if len(batch) >= batch_size:
+                results.update(library.apply_transactions(batch))
+                batch = []
+            continue
+
+        if batch:
+            results.update(library.apply_transactions(batch))
+            batch = []
+        date = library._current_date
+        library.advance_date(event[1])
+        now = time.perf_counter()
+        daily.append(_day_row(library, date, day_events, now - day_start, count_holds))
+        day_events = 0
+        day_start = time.perf_counter()
+        reporting += day_start - now
+
+    if batch:
+        results.update(library.apply_transactions(batch))
+    seconds = time.perf_counter() - start - reporting
+    return {"events": event_count, "seconds": seconds, "events_per_second": event_count / seconds if seconds else 0.0,
+            "results": {RESULT_MESSAGES[code]: count for code, count in sorted(results.items())}, "daily": daily}
+
+
+def run_scenario(name="baseline", trace=None, patron_count=1000, item_count=10000, days=30, events_per_day=1000,
+                 seed=162, mix=None, loan_policy=None, batch_size=SIMULATION_BATCH_SIZE, count_holds=True):
+    """
+    Simulates one scenario: a Library with the patrons and items of generate_workload, under a loan policy, fed a
+    trace file or generated events.
+
+    :param:
+        name (str): The name of the scenario, to tell its report apart.
+        trace (str): The path of a trace file of events for the patrons and items, if any; events are generated if
+        not given.
+        patron_count (int): The number of patrons.
+        item_count (int): The number of items.
+        days (int): The number of days of events to generate.
+        events_per_day (int): The number of transactions to generate on each day.
+        seed (int): The seed of the patrons, items and generated events.
+        mix (dict): The share of each kind of generated transaction; EVENT_MIX if not given.
+        loan_policy (LoanPolicy): The lending rules of the Library; the default policy if not given.
+        batch_size (int): The greatest number of transactions applied together.
+        count_holds (bool): Whether to count the waiting holds at the end of each day.
+
+    :return:
+        dict: The report of simulate, with the name of the scenario.
+    """
+    patrons, items, _ = generate_workload(patron_count, item_count, 0, seed)
+    library = build_workload_library(patrons, items)
+    del patrons, items
+    if loan_policy is not None:
+        library.set_loan_policy(loan_policy)
+    if trace is None:
+        events = generate_events(patron_count, item_count, days, events_per_day, seed, mix)
+    else:
+        events = read_trace(trace)
+    report = simulate(library, events, batch_size, count_holds)
+    report["name"] = name
+    return report
+
+
+def run_scenarios(scenarios, workers=None):
+    """
+    Simulates several scenarios at the same time, each in a worker process.
+
+    :param:
+        scenarios (list): The keyword arguments of run_scenario for each scenario.
+        workers (int): The greatest number of worker processes; the number of CPUs if not given.
+
+    :return:
+        list: The report of each scenario, in the order given.
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context()) as executor:
+        futures = [executor.submit(run_scenario, **scenario) for scenario in scenarios]
+        return [future.result() for future in futures]
+
+
+def summarize(report):
+    """
+    Gets a one line summary of the report of a scenario.
+    """
+    last_day = report["daily"][-1] if report["daily"] else {"loans": 0, "overdue_loans": 0, "fines": 0}
+    day_seconds = [row["seconds"] for row in report["daily"]] or [0.0]
+    return (f"{report['name']}: {report['events']} events, {report['events_per_second']:.0f} events/s, "
+            f"slowest day {max(day_seconds) * 1000:.1f}ms, {last_day['loans']} loans, "
+            f"{last_day['overdue_loans']} overdue, fines ${last_day['fines']:.2f}")
+
+
+def main():
+    """
+    Main function to compare what-if scenarios: the baseline, twice the traffic, and one-week book loans.
+    """
+    parser = argparse.ArgumentParser(description="Event-replay simulator for the Library.")
+    parser.add_argument("--trace", default=None, help="path of a trace file to replay instead of generated events")
+    parser.add_argument("--patrons", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--events-per-day", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=162)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", dest="output", default=None, help="path to write the reports to as JSON")
+    arguments = parser.parse_args()
+
+    base = {"trace": arguments.trace, "patron_count": arguments.patrons, "item_count": arguments.items,
+            "days": arguments.days, "events_per_day": arguments.events_per_day, "seed": arguments.seed}
+    short_loans = LoanPolicy()
+    short_loans.set_rule(kind=Book, loan_days=7)
+    scenarios = [dict(base, name="baseline"), dict(base, name="one-week book loans", loan_policy=short_loans)]
+    if arguments.trace is None:
+        scenarios.append(dict(base, name="double traffic", events_per_day=2 * arguments.events_per_day))
+
+    reports = run_scenarios(scenarios, arguments.workers)
+    for report in reports:
+        print(summarize(report))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as report_file:
+            json.dump(reports, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
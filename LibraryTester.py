@@ -1,4 +1,29 @@
-from Library import Library, Book, Album, Movie, Patron
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Library import Library, Book, Album, Movie, Patron, RESULT_MESSAGES, COMPACTION_THRESHOLD
+from ItemTable import ItemTable
+from LibraryJournal import JournaledLibrary
+from LibraryCatalog import Catalog, SQLiteCatalog, write_catalog
+from LibraryCache import LibraryCache
+from ConcurrentLibrary import ConcurrentLibrary
+from LibraryService import LibraryService, _run_connection, run_load
+from LibrarySearch import SearchIndex
+from ShardedLibrary import ShardedLibrary, ShardLibrary, SHARD_OPERATIONS, _apply_calls
+from LibraryMetrics import instrument, uninstrument
+from LibraryBenchmark import generate_workload, build_workload_library, replay_events, replay_batches, project_fines
+from LibraryExport import export_library, import_library, read_table
+from LibraryLoanTable import LoanTable, NUMPY_AVAILABLE
+from LibraryNotifications import NotificationQueue
+from LibraryPolicy import LoanPolicy
+from LibrarySimulator import generate_events, write_trace, run_scenario, run_scenarios
 
 class LibraryTester:
     """
@@ -70,7 +95,9 @@ class LibraryTester:
         """
         print("\nTesting Request Library Item:")
         print(self.library.request_library_item("459786", "A888751199729"))  # Should succeed
-        print(self.library.request_library_item("126453", "A888751199729"))  # Should fail (item already on hold)
+        print(self.library.request_library_item("126453", "A888751199729"))  # Should succeed (joins the hold queue)
+        assert self.library.get_hold_position("459786", "A888751199729") == 0, "The first hold should be on the shelf"
+        assert self.library.get_hold_position("126453", "A888751199729") == 1, "The second hold should wait behind it"
         print(self.library.request_library_item("xyz", "A888751199729"))  # Should fail (patron not found)
         print(self.library.request_library_item("459786", "999"))  # Should fail (item not found)
 
@@ -103,7 +130,9 @@ class LibraryTester:
         # Test payment
         print(f"Attempting to pay $5.00 to cover ${round(self.p2.get_fine_amount(), 2):.2f} fine for Patron p2")
         print(self.library.pay_fine("126453", 5))  # Should succeed (patron exists)
-        assert round(self.p2.get_fine_amount(), 2) == round(expected_fine - 5, 2), f"Fine amount should be ${expected_fine - 5:.2f}"
+        # Overpayment clears the fine without a refund, so the fine floors at $0.00 rather than going negative
+        expected_balance = max(0.0, round(expected_fine - 5, 2))
+        assert round(self.p2.get_fine_amount(), 2) == expected_balance, f"Fine amount should be ${expected_balance:.2f}"
         result = self.library.pay_fine("126453", 5)
         print(f"pay_fine result: {result}")
 
@@ -145,6 +174,977 @@ class LibraryTester:
             self.library.increment_current_date()
         print(f"Current date after increment: {self.library._current_date}")
 
+    def test_lookup_index(self):
+        """
+        Test id-indexed lookups and rejection of duplicate ids.
+        """
+        print("\nTesting Lookup Index:")
+        library = Library()
+        book = Book("B1", "Dune", "Frank Herbert")
+        patron = Patron("P1", "Louis Tomlinson")
+        print(library.add_library_item(book))  # Should succeed
+        print(library.add_patron(patron))  # Should succeed
+        print(library.add_library_item(Book("B1", "Emma", "Jane Austen")))  # Should fail (duplicate item id)
+        print(library.add_patron(Patron("P1", "Liam Payne")))  # Should fail (duplicate patron id)
+        assert library.lookup_library_item_from_id("B1") is book, "Lookup should return the first item added"
+        assert library.lookup_patron_from_id("P1") is patron, "Lookup should return the first patron added"
+        assert library.lookup_library_item_from_id("B2") is None, "Unknown item id should return None"
+        assert library.lookup_patron_from_id("P2") is None, "Unknown patron id should return None"
+
+    def test_advance_date(self):
+        """
+        Test that advancing the date in one step accrues the same fines as incrementing it day by day.
+        """
+        print("\nTesting Advance Date:")
+        libraries = [Library(), Library()]
+        for library in libraries:
+            library.add_library_item(Book("B1", "Dune", "Frank Herbert"))
+            library.add_library_item(Movie("M1", "Heat", "Michael Mann"))
+            library.add_patron(Patron("P1", "Louis Tomlinson"))
+            library.check_out_library_item("P1", "B1")
+            library.check_out_library_item("P1", "M1")
+
+        for _ in range(30):  # Book is 9 days overdue, Movie is 23 days overdue
+            libraries[0].increment_current_date()
+        libraries[1].advance_date(30)
+
+        expected_fine = round(0.10 * (9 + 23), 2)
+        fines = [library.lookup_patron_from_id("P1").get_fine_amount() for library in libraries]
+        print(f"Fine after incrementing: ${fines[0]:.2f}, fine after advancing: ${fines[1]:.2f}")
+        assert fines == [expected_fine, expected_fine], f"Both fines should be ${expected_fine:.2f}"
+
+        # Returning an overdue item stops its fine from growing
+        libraries[1].return_library_item("M1")
+        libraries[1].advance_date(5)
+        expected_fine = round(0.10 * (14 + 23), 2)
+        fine = libraries[1].lookup_patron_from_id("P1").get_fine_amount()
+        assert fine == expected_fine, f"Fine should be ${expected_fine:.2f}, but got ${fine:.2f}"
+
+    def test_apply_transactions(self):
+        """
+        Test that a batch of transactions gives the same results as the individual method calls.
+        """
+        print("\nTesting Apply Transactions:")
+        transactions = [
+            ("check_out", "126453", "A888751199729"),
+            ("check_out", "459786", "A888751199729"),  # Should fail (item already checked out)
+            ("request", "459786", "A888751199729"),
+            ("return", "A888751199729"),
+            ("check_out", "126453", "A888751199729"),  # Should fail (item on hold by other patron)
+            ("check_out", "459786", "A888751199729"),
+            ("return", "999"),  # Should fail (item not found)
+            ("pay_fine", "xyz", 5),  # Should fail (patron not found)
+            ("pay_fine", "126453", 5),
+        ]
+        codes = self.library.apply_transactions(transactions)
+        messages = [RESULT_MESSAGES[code] for code in codes]
+        print(messages)
+
+        expected = Library()
+        for item in [Book("B1009653", "", ""), Album("A888751199729", "", ""), Movie("M024543617907", "", "")]:
+            expected.add_library_item(item)
+        expected.add_patron(Patron("459786", "Harry Styles"))
+        expected.add_patron(Patron("126453", "Niall Horan"))
+        methods = {
+            "check_out": expected.check_out_library_item,
+            "return": expected.return_library_item,
+            "request": expected.request_library_item,
+            "pay_fine": expected.pay_fine,
+        }
+        expected_messages = [methods[operation](*arguments) for operation, *arguments in transactions]
+        assert messages == expected_messages, f"Batch results should be {expected_messages}"
+        codes = self.library.apply_transactions([("shelve", "B1009653"), ("return", "B1009653")])
+        assert RESULT_MESSAGES[codes[0]] == "unknown transaction", "An unknown transaction should not end the batch"
+
+    def test_item_table(self):
+        """
+        Test that views of an ItemTable give the same answers as the items they were copied from.
+        """
+        print("\nTesting Item Table:")
+        self.library.check_out_library_item("126453", "B1009653")
+        self.library.request_library_item("459786", "A888751199729")
+        table = ItemTable()
+        for item in self.items:
+            table.add_library_item(item)
+        print(table.add_library_item(self.b1))  # Should fail (duplicate item id)
+
+        for item in self.items:
+            view = table.lookup_library_item_from_id(item.get_library_item_id())
+            for getter in ["get_library_item_id", "get_title", "get_location", "get_checked_out_by",
+                           "get_requested_by", "get_date_checked_out", "get_check_out_length"]:
+                assert getattr(view, getter)() == getattr(item, getter)(), f"{getter} should match the item"
+        assert table.lookup_library_item_from_id("M024543617907").get_director() == "David Fincher"
+        assert table.lookup_library_item_from_id("999") is None, "Unknown item id should return None"
+
+    def test_journaled_library(self):
+        """
+        Test that a JournaledLibrary recovers its state from its snapshot and journal.
+        """
+        print("\nTesting Journaled Library:")
+        with tempfile.TemporaryDirectory() as directory:
+            library = JournaledLibrary(directory)
+            library.add_library_item(Book("B1", "Dune", "Frank Herbert"))
+            library.add_library_item(Album("A1", "Four", "One Direction"))
+            library.add_patron(Patron("P1", "Louis Tomlinson"))
+            library.add_patron(Patron("P2", "Liam Payne"))
+            library.check_out_library_item("P1", "B1")
+            library.advance_date(25)
+            library.checkpoint()
+            library.request_library_item("P2", "B1")
+            library.return_library_item("B1")
+            library.check_out_library_item("P1", "A1")
+            library.lookup_patron_from_id("P2").amend_fine(1.25)
+            library.close()
+
+            recovered = JournaledLibrary(directory)
+            print(recovered.check_out_library_item("P1", "B1"))  # Should fail (item on hold by other patron)
+            assert recovered._current_date == 25, "Current date should be recovered"
+            assert recovered.lookup_patron_from_id("P1").get_fine_amount() == 0.40, "Fine should be recovered"
+            assert recovered.lookup_library_item_from_id("B1").get_location() == "ON_HOLD_SHELF"
+            assert recovered.lookup_library_item_from_id("A1").get_checked_out_by().get_patron_id() == "P1"
+            assert recovered.lookup_patron_from_id("P2").get_fine_amount() == 1.25, "Amended fines should be recovered"
+            recovered.add_patron(Patron("P3", "Zayn Malik"))
+            journal_path = recovered._journal._file.name
+            journal_size = os.path.getsize(journal_path)
+            time.sleep(0.2)  # Well past the sync interval, with no further record to trigger a commit
+            assert os.path.getsize(journal_path) > journal_size, "An idle record should be committed by the flusher"
+            recovered.close()
+
+    def test_catalog(self):
+        """
+        Test that items of an attached catalog are built only when looked up.
+        """
+        print("\nTesting Catalog:")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.bin")
+            write_catalog(path, self.items)
+            catalog = Catalog(path)
+            library = Library()
+            library.attach_catalog(catalog)
+            library.add_patron(Patron("459786", "Harry Styles"))
+            assert len(library._holdings) == 0, "No item should be built before it is looked up"
+
+            print(library.check_out_library_item("459786", "M024543617907"))  # Should succeed
+            print(library.add_library_item(Book("B1009653", "", "")))  # Should fail (duplicate item id)
+            movie = library.lookup_library_item_from_id("M024543617907")
+            assert movie.get_director() == "David Fincher", "Director should be read from the catalog"
+            assert movie.get_location() == "CHECKED_OUT", "Looked up item should keep its state"
+            assert library.lookup_library_item_from_id("999") is None, "Unknown item id should return None"
+            assert len(library._holdings) == 1, "Only the looked up item should be built"
+            catalog.close()
+
+    def test_concurrent_library(self):
+        """
+        Stress test a ConcurrentLibrary from a thread pool, then check that items and patrons agree on every loan.
+        """
+        print("\nTesting Concurrent Library:")
+        library = ConcurrentLibrary(stripes=8)
+        item_ids = [f"B{number}" for number in range(40)]
+        patron_ids = [f"P{number}" for number in range(10)]
+        for item_id in item_ids:
+            library.add_library_item(Book(item_id, "Title", "Author"))
+        for patron_id in patron_ids:
+            library.add_patron(Patron(patron_id, "Name"))
+
+        def hammer(seed):
+            generator = random.Random(seed)
+            for _ in range(2000):
+                choice = generator.random()
+                patron_id = generator.choice(patron_ids)
+                item_id = generator.choice(item_ids)
+                if choice < 0.4:
+                    library.check_out_library_item(patron_id, item_id)
+                elif choice < 0.75:
+                    library.return_library_item(item_id)
+                elif choice < 0.9:
+                    library.request_library_item(patron_id, item_id)
+                elif choice < 0.95:
+                    library.pay_fine(patron_id, 0.05)
+                elif choice < 0.98:
+                    library.lookup_library_item_from_id(item_id)
+                    library.get_estimated_wait(patron_id, item_id)
+                    library.lookup_patron_from_id(patron_id).get_fine_amount()
+                else:
+                    library.increment_current_date()
+
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(hammer, range(16)))
+
+        borrowed = {}
+        for patron_id in patron_ids:
+            patron = library.lookup_patron_from_id(patron_id)
+            for item in patron._checked_out_items:
+                assert item.get_checked_out_by() is patron, "Checked out item should name its patron"
+                assert item.get_library_item_id() not in borrowed, "Item should have only one borrower"
+                borrowed[item.get_library_item_id()] = patron
+        for item_id in item_ids:
+            item = library.lookup_library_item_from_id(item_id)
+            if item.get_checked_out_by() is None:
+                assert item_id not in borrowed, "Item on the shelf should not be checked out by a patron"
+                assert item.get_location() != "CHECKED_OUT", "Item on the shelf should not be CHECKED_OUT"
+            else:
+                assert borrowed.get(item_id) is item.get_checked_out_by(), "Borrower should have the item"
+                assert item.get_location() == "CHECKED_OUT", "Checked out item should be CHECKED_OUT"
+        print(f"{len(borrowed)} items checked out after the stress test")
+
+        # Items are added to and removed from the search index, and patrons removed, on different stripes at once
+        library = ConcurrentLibrary(stripes=8)
+        library.attach_search_index(SearchIndex())
+        for number in range(200):
+            library.add_patron(Patron(f"R{number}", "Name"))
+
+        def churn(seed):
+            for number in range(seed * 100, seed * 100 + 100):
+                library.add_library_item(Book(f"S{number}", f"Dune {number}", "Frank Herbert"))
+                library.search("dune", limit=5)
+                if number % 2:
+                    library.remove_library_item(f"S{number}")
+            for number in range(seed * 25, seed * 25 + 25):
+                library.remove_patron(f"R{number}")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(churn, range(8)))
+        assert len(library.search("herbert", limit=1000)) == 400, "Every item left should be indexed once"
+        assert library._removed_patron_count == 200 % COMPACTION_THRESHOLD, "Every removal should be counted"
+
+    def test_library_service(self):
+        """
+        Test that pipelined requests to a LibraryService are answered in order over TCP.
+        """
+        print("\nTesting Library Service:")
+
+        async def run():
+            server = await LibraryService(self.library).start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            requests = [
+                {"id": 1, "op": "check_out", "args": ["126453", "A888751199729"]},
+                {"id": 2, "op": "check_out", "args": ["459786", "A888751199729"]},
+                {"id": 3, "op": "advance_date", "args": [3]},
+                {"id": 4, "op": "return", "args": ["A888751199729"]},
+                {"id": 5, "op": "renew", "args": []},
+            ]
+            writer.write("".join(json.dumps(request) + "\n" for request in requests).encode())
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            await writer.wait_closed()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+        responses = asyncio.run(run())
+        print(responses)
+        assert [response["id"] for response in responses] == [1, 2, 3, 4, 5], "Responses should be in order"
+        assert [response.get("result") for response in responses] == [
+            "check out successful", "item already checked out", 3, "return successful", None]
+        assert responses[4]["error"] == "unknown operation", "Unknown operation should be reported"
+
+        async def run_dropped():
+            # Clients that hang up with a full pipeline, or send an oversize line, should not leave tasks behind
+            server = await LibraryService(Library(), pipeline_depth=2).start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            for payload in [b'{"op": "increment_current_date"}\n' * 50, b"x" * 100000 + b"\n"]:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(payload)
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            for _ in range(100):
+                if len(asyncio.all_tasks()) == 1:
+                    break
+                await asyncio.sleep(0.01)
+            leaked = len(asyncio.all_tasks()) - 1
+
+            # A load generator whose service hangs up early should finish with the responses it got
+            async def answer_one(reader, writer):
+                await reader.readline()
+                writer.write(b'{"result":"return successful"}\n')
+                writer.close()
+
+            server2 = await asyncio.start_server(answer_one, "127.0.0.1", 0)
+            port2 = server2.sockets[0].getsockname()[1]
+            latencies = []
+            requests = [b'{"op": "return", "args": ["I1"]}\n'] * 20
+            await asyncio.wait_for(_run_connection(lambda: asyncio.open_connection("127.0.0.1", port2), requests, 2,
+                                                   latencies), 5)
+
+            # A load generator that gets no responses at all should report zeros
+            async def answer_none(reader, writer):
+                writer.close()
+
+            server3 = await asyncio.start_server(answer_none, "127.0.0.1", 0)
+            report = await asyncio.wait_for(run_load(connections=2, requests_per_connection=5,
+                                                     port=server3.sockets[0].getsockname()[1]), 5)
+            for listening in (server, server2, server3):
+                listening.close()
+                await listening.wait_closed()
+            return leaked, len(latencies), report
+
+        leaked, answered, report = asyncio.run(run_dropped())
+        assert leaked == 0, f"Dropped connections should not leak tasks, but {leaked} are left"
+        assert answered == 1, "The load generator should stop at the early hang-up"
+        assert report["requests"] == 0 and report["requests_per_second"] == 0 and report["p99_ms"] == 0, \
+            "A load with no responses should report zeros"
+
+    def test_hold_queue(self):
+        """
+        Test that holds queue up by priority tier and then in order, and that a returned item goes to the next patron.
+        """
+        print("\nTesting Hold Queue:")
+        library = Library()
+        library.add_library_item(Album("A1", "Four", "One Direction"))
+        for number in range(5):
+            library.add_patron(Patron(f"P{number}", f"Patron {number}"))
+
+        print(library.check_out_library_item("P0", "A1"))  # Should succeed
+        print(library.request_library_item("P1", "A1"))  # Should succeed
+        print(library.request_library_item("P2", "A1"))  # Should succeed, behind P1
+        print(library.request_library_item("P3", "A1", priority=1))  # Should succeed, ahead of P1 and P2
+        print(library.request_library_item("P4", "A1"))  # Should succeed, behind P2
+        print(library.request_library_item("P2", "A1"))  # Should fail (item already on hold)
+        positions = [library.get_hold_position(f"P{number}", "A1") for number in range(1, 5)]
+        assert positions == [1, 2, 0, 3], f"Positions should be [1, 2, 0, 3], but got {positions}"
+        assert library.get_estimated_wait("P2", "A1") == 14 + 2 * 14, "P2 should wait out the loan and two more"
+        assert library.get_hold_position("P0", "A1") is None, "Patron without a hold should have no position"
+
+        print(library.promote_hold("P4", "A1", 1))  # Should succeed, behind P3
+        print(library.cancel_hold("P1", "A1"))  # Should succeed
+        print(library.cancel_hold("P1", "A1"))  # Should fail (no hold by patron)
+        print(library.return_library_item("A1"))  # Should succeed, held for P3
+        album = library.lookup_library_item_from_id("A1")
+        assert album.get_location() == "ON_HOLD_SHELF", "Returned item should be on the hold shelf"
+        assert album.get_requested_by().get_patron_id() == "P3", "Returned item should be held for P3"
+        assert album.get_hold_count() == 3, "P3, P4 and P2 should hold the item"
+        print(library.check_out_library_item("P4", "A1"))  # Should fail (item on hold by other patron)
+        print(library.check_out_library_item("P3", "A1"))  # Should succeed
+        assert album.get_requested_by().get_patron_id() == "P4", "P4 should be next in line"
+
+        print(library.return_library_item("A1"))  # Should succeed, held for P4
+        print(library.cancel_hold("P4", "A1"))  # Should succeed, held for P2
+        assert album.get_requested_by().get_patron_id() == "P2", "Cancelled hold should pass the item on to P2"
+        print(library.cancel_hold("P2", "A1"))  # Should succeed, back on the shelf
+        assert album.get_location() == "ON_SHELF" and album.get_requested_by() is None, "Item should be on the shelf"
+
+    def test_search(self):
+        """
+        Test searching the holdings by title and creator, by field and by prefix.
+        """
+        print("\nTesting Search:")
+        self.library.attach_search_index(SearchIndex())
+        self.library.add_library_item(Movie("M1", "The Great Escape", "John Sturges"))
+        self.library.add_library_item(Book("B1", "Great Expectations", "Charles Dickens"))
+
+        def ids(items):
+            return [item.get_library_item_id() for item in items]
+
+        print(ids(self.library.search("great")))
+        assert set(ids(self.library.search("GREAT"))) == {"B4275142", "M1", "B1"}, "Search should ignore case"
+        assert ids(self.library.search("great gatsby")) == ["B4275142"], "Every word should match"
+        assert ids(self.library.search("fincher", field="director")) == ["M024543617907"], "Director should match"
+        assert ids(self.library.search("fincher", field="title")) == [], "Title should not match a director"
+        assert ids(self.library.search("great exp", prefix=True)) == ["B1"], "Last word should match as a prefix"
+        assert ids(self.library.search("one direction up")) == ["A888751199729"], "Artist and title should match"
+        assert self.library.search("missing") == [], "Unknown words should match nothing"
+
+    def test_delinquency_reports(self):
+        """
+        Test the loan and fine totals and the delinquency reports against a scan of every patron.
+        """
+        print("\nTesting Delinquency Reports:")
+        generator = random.Random(11)
+        library = Library()
+        kinds = (Book, Album, Movie)
+        for number in range(60):
+            library.add_library_item(kinds[number % 3](f"I{number}", f"Title {number}", f"Creator {number}"))
+        for number in range(15):
+            library.add_patron(Patron(f"P{number}", f"Patron {number}"))
+
+        for _ in range(40):
+            for _ in range(10):
+                patron_id = f"P{generator.randrange(15)}"
+                library_item_id = f"I{generator.randrange(60)}"
+                choice = generator.random()
+                if choice < 0.5:
+                    library.check_out_library_item(patron_id, library_item_id)
+                elif choice < 0.9:
+                    library.return_library_item(library_item_id)
+                else:
+                    library.pay_fine(patron_id, generator.choice([0.25, 1.0, 5.0]))
+            library.advance_date(generator.randrange(1, 5))
+
+        members = list(library._members.values())
+        overdue = {patron: sum(1 for item in patron._checked_out_items if item.get_due_date() < library._current_date)
+                   for patron in members}
+        totals = library.get_circulation_totals()
+        print(totals)
+        assert totals["loans"] == sum(len(patron._checked_out_items) for patron in members), "Loans should match"
+        assert totals["overdue_loans"] == sum(overdue.values()), "Overdue loans should match a scan"
+        assert round(totals["fines"] * 100) == sum(round(patron.get_fine_amount() * 100) for patron in members), \
+            "Fines should match"
+
+        for amount in [0, 0.5, 2.0, 10.0]:
+            expected = {patron for patron in members if patron.get_fine_amount() > amount}
+            found = library.get_patrons_owing_more_than(amount)
+            assert expected == set(found), f"Exactly the patrons owing more than ${amount} should be found"
+            fines = [patron.get_fine_amount() for patron in found]
+            assert fines == sorted(fines, reverse=True), "Largest fines should come first"
+
+        most = library.get_most_overdue_patrons(5)
+        counts = [overdue[patron] for patron in most]
+        assert counts == sorted(overdue.values(), reverse=True)[:len(counts)], "Most overdue patrons should come first"
+        assert all(counts), "Only patrons with overdue items should be reported"
+
+    def test_workload_generator(self):
+        """
+        Test that workloads are reproducible, and that replaying one call at a time or in batches ends the same way.
+        """
+        print("\nTesting Workload Generator:")
+        first = generate_workload(20, 100, 2000, seed=7)
+        second = generate_workload(20, 100, 2000, seed=7)
+        assert first[2] == second[2], "The same seed should generate the same events"
+        assert generate_workload(20, 100, 2000, seed=8)[2] != first[2], "Another seed should generate other events"
+
+        libraries = []
+        for (patrons, items, events), replay in [(first, replay_events), (second, replay_batches)]:
+            library = build_workload_library(patrons, items)
+            replay(library, events)
+            libraries.append(library)
+        print(libraries[0].get_circulation_totals())
+        assert libraries[0].get_circulation_totals() == libraries[1].get_circulation_totals(), "Totals should match"
+        for library_item_id, item in libraries[0]._holdings.items():
+            other = libraries[1].lookup_library_item_from_id(library_item_id)
+            assert item.get_location() == other.get_location(), f"{library_item_id} should be in the same place"
+
+    def test_metrics(self):
+        """
+        Test that an instrumented Library records counts, latencies and outcomes, and that uninstrumenting it removes
+        every wrapper.
+        """
+        print("\nTesting Metrics:")
+        metrics = instrument(self.library)
+        public = [name for name in dir(Library) if not name.startswith("_") and callable(getattr(Library, name))]
+        missing = [name for name in public if name not in vars(self.library)]
+        assert not missing, f"Every public method should be instrumented, but {missing} are not"
+        self.library.check_out_library_item("126453", "B1009653")  # Should succeed
+        self.library.check_out_library_item("459786", "B1009653")  # Should fail (item already checked out)
+        self.library.increment_current_date()
+        self.library.apply_transactions([("return", "B1009653"), ("return", "999")])
+
+        operations = metrics.snapshot()["operations"]
+        check_outs = operations["check_out_library_item"]
+        assert check_outs["count"] == 2, "Both checkouts should be counted"
+        assert check_outs["buckets"]["+Inf"] == 2, "Every checkout should fall in a latency bucket"
+        assert check_outs["outcomes"] == {"check out successful": 1, "item already checked out": 1}, "Outcomes differ"
+        assert operations["increment_current_date"]["count"] == 1, "Date increments should be timed"
+        assert operations["apply_transactions"]["outcomes"] == {"return successful": 1, "item not found": 1}
+
+        text = metrics.to_prometheus()
+        print(text.splitlines()[2])
+        assert 'library_operation_seconds_count{operation="check_out_library_item"} 2' in text, "Count not exported"
+        assert ('library_operation_outcomes_total{operation="check_out_library_item",result="check out successful"} 1'
+                in text), "Outcome not exported"
+
+        uninstrument(self.library)
+        assert "check_out_library_item" not in vars(self.library), "Uninstrumenting should remove the wrappers"
+        self.library.return_library_item("A888751199729")
+        assert "return_library_item" not in metrics.snapshot()["operations"], "Uninstrumented calls should not count"
+
+    def test_sharded_library(self):
+        """
+        Test that a ShardedLibrary gives the same results, fines and locations as a single Library, including for
+        patrons and items on different shards.
+        """
+        print("\nTesting Sharded Library:")
+        sharded = ShardedLibrary(3)
+        library = Library()
+        kinds = (Book, Album, Movie)
+        for number in range(30):
+            for target in (sharded, library):
+                target.add_library_item(kinds[number % 3](f"I{number}", f"Title {number}", f"Creator {number}"))
+        for number in range(8):
+            for target in (sharded, library):
+                target.add_patron(Patron(f"P{number}", f"Patron {number}"))
+
+        generator = random.Random(15)
+        try:
+            for _ in range(30):
+                batch = []
+                for _ in range(20):
+                    patron_id = f"P{generator.randrange(9)}"
+                    library_item_id = f"I{generator.randrange(31)}"
+                    choice = generator.random()
+                    if choice < 0.4:
+                        batch.append(("check_out", patron_id, library_item_id))
+                    elif choice < 0.75:
+                        batch.append(("return", library_item_id))
+                    elif choice < 0.9:
+                        batch.append(("request", patron_id, library_item_id))
+                    else:
+                        batch.append(("pay_fine", patron_id, 1.0))
+                assert sharded.apply_transactions(batch) == library.apply_transactions(batch), "Results should match"
+                days = generator.randrange(6)
+                sharded.advance_date(days)
+                library.advance_date(days)
+
+            print(sharded.check_out_library_item("P1", "I1"), sharded.get_circulation_totals())
+            library.check_out_library_item("P1", "I1")
+            for number in range(8):
+                fine = library.lookup_patron_from_id(f"P{number}").get_fine_amount()
+                assert sharded.get_fine_amount(f"P{number}") == fine, f"Fine of P{number} should match"
+                for item_number in range(30):
+                    assert (sharded.get_hold_position(f"P{number}", f"I{item_number}") ==
+                            library.get_hold_position(f"P{number}", f"I{item_number}")), "Hold positions should match"
+            for number in range(30):
+                location = library.lookup_library_item_from_id(f"I{number}").get_location()
+                assert sharded.get_location(f"I{number}") == location, f"Location of I{number} should match"
+            assert sharded.get_circulation_totals() == library.get_circulation_totals(), "Totals should match"
+
+            sharded.add_library_item(Book(1009653, "Brave New World", "Aldous Huxley"))
+            assert sharded.get_location(1009653) == "ON_SHELF", "Ids that are not strings should be routed too"
+
+            # A call that raises on one shard should not leave the other shards' replies to be misread later
+            try:
+                sharded._broadcast("add_library_item", None)
+                assert False, "A call that raises on a shard should raise to the caller"
+            except AttributeError:
+                pass
+            location = library.lookup_library_item_from_id("I1").get_location()
+            assert sharded.get_location("I1") == location, "Replies after an error should match their calls"
+        finally:
+            sharded.close()
+
+        class LocalConnection:
+            """
+            Serves a ShardLibrary in this process, so a shard can be made to fail.
+            """
+            def __init__(self, shard):
+                self._operations = {name: getattr(shard, name) for name in SHARD_OPERATIONS}
+                self._results = None
+
+            def send(self, calls):
+                self._results = _apply_calls(self._operations, calls)
+
+            def recv(self):
+                return self._results
+
+        def local_router(shards):
+            router = ShardedLibrary.__new__(ShardedLibrary)
+            router._connections = [LocalConnection(shard) for shard in shards]
+            router.add_patron(Patron("P0", "Harry Styles"))
+            router.add_patron(Patron("P1", "Niall Horan"))
+            library_item_id = next(f"I{number}" for number in range(100)
+                                   if router._shard_of(f"I{number}") != router._shard_of("P0"))
+            router.add_library_item(Book(library_item_id, "Dune", "Frank Herbert"))
+            return router, library_item_id
+
+        # Ghosts of patrons and items of other shards should only last as long as their loans and holds
+        shards = [ShardLibrary(), ShardLibrary()]
+        router, library_item_id = local_router(shards)
+        for patron_id in ("P0", "P1"):
+            router.request_library_item(patron_id, library_item_id)
+        router.get_estimated_wait("P0", library_item_id)
+        router.check_out_library_item("P0", library_item_id)
+        router.return_library_item(library_item_id)
+        router.cancel_hold("P1", library_item_id)
+        for shard in shards:
+            assert not shard._ghost_patrons and not shard._ghost_items, "Ghosts should be dropped with their holds"
+
+        class FailingShard(ShardLibrary):
+            failing = False
+
+            def update_loans(self, loans):
+                if self.failing:
+                    raise RuntimeError("update failed")
+                return super().update_loans(loans)
+
+        # A loan the patron's shard cannot take should be undone on the item's shard too, before the error is raised
+        shards = [FailingShard(), FailingShard()]
+        router, library_item_id = local_router(shards)
+        router.request_library_item("P0", library_item_id)
+        for shard in shards:
+            shard.failing = True
+        for transactions in ([("check_out", "P0", library_item_id)],
+                             [("check_out", "P0", library_item_id), ("return", library_item_id)]):
+            try:
+                router.apply_transactions(transactions)
+                assert False, "A failed update should raise to the caller"
+            except RuntimeError:
+                pass
+            assert router.get_location(library_item_id) == "ON_HOLD_SHELF", "The item's side should be rolled back"
+            assert router.get_hold_position("P0", library_item_id) == 0, "The patron's hold should be kept"
+            assert router.get_circulation_totals()["loans"] == 0, "Neither side of the loan should be left"
+
+        for shard in shards:
+            shard.failing = False
+        router.check_out_library_item("P0", library_item_id)
+        for shard in shards:
+            shard.failing = True
+        try:
+            router.return_library_item(library_item_id)
+            assert False, "A failed update should raise to the caller"
+        except RuntimeError:
+            pass
+        assert router.get_location(library_item_id) == "CHECKED_OUT", "The return should be rolled back"
+        assert router.get_circulation_totals()["loans"] == 1, "The patron's side of the loan should be kept"
+        for shard in shards:
+            shard.failing = False
+        assert router.return_library_item(library_item_id) == "return successful", "Both sides should still agree"
+        for shard in shards:
+            assert not shard._ghost_patrons and not shard._ghost_items, "No ghosts should be left behind"
+
+    def test_snapshot(self):
+        """
+        Test that a snapshot keeps reporting the Library as it was while circulation goes on.
+        """
+        print("\nTesting Snapshot:")
+        self.library.check_out_library_item("126453", "B1009653")
+        self.library.advance_date(25)  # Four days overdue
+        with self.library.snapshot() as snapshot:
+            self.library.return_library_item("B1009653")
+            self.library.check_out_library_item("459786", "M024543617907")
+            self.library.pay_fine("126453", 0.25)
+            self.library.advance_date(10)
+            self.library.add_library_item(Book("B1", "Emma", "Jane Austen"))
+
+            inventory = snapshot.get_inventory_by_location()
+            print({location: len(items) for location, items in inventory.items()})
+            assert inventory["CHECKED_OUT"] == [self.b1], "Only B1009653 should have been checked out"
+            assert len(inventory["ON_SHELF"]) == 3, "Items added later should not be in the snapshot"
+            assert snapshot.get_overdue_items() == [(self.b1, self.p2, 4)], "B1009653 should be four days overdue"
+            assert snapshot.get_fine_amount(self.p2) == 0.40, "Fine should be as of the snapshot"
+            assert snapshot.get_checked_out_items(self.p1) == (), "Later checkouts should not be in the snapshot"
+            assert self.p2.get_fine_amount() == 0.15, "The Library should have kept serving"
+        assert self.library._snapshots == (), "Closed snapshots should no longer be saved into"
+
+    def test_export(self):
+        """
+        Test that a Library exported in column batches is imported with the same circulation state.
+        """
+        print("\nTesting Export:")
+        library = Library()
+        library.add_library_item(Book("B1", "Dune", "Frank Herbert"))
+        library.add_library_item(Album("A1", "Four", "One Direction"))
+        library.add_library_item(Movie("M1", "Amélie", "Jean-Pierre Jeunet"))
+        library.add_patron(Patron("P1", "Louis Tomlinson"))
+        library.add_patron(Patron("P2", "Liam Payne"))
+        library.add_patron(Patron("P3", "Zayn Malik"))
+        library.check_out_library_item("P1", "B1")
+        library.check_out_library_item("P1", "A1")
+        library.request_library_item("P2", "B1")
+        library.request_library_item("P3", "B1", 1)
+        library.advance_date(25)
+        def fine_states():
+            return [(patron._fine_cents, patron._fine_settled_date) for patron in library._members.values()]
+
+        settled = fine_states()
+        with tempfile.TemporaryDirectory() as directory:
+            export_library(library, directory, chunk_size=2)
+            assert fine_states() == settled, "Exporting should not settle fines"
+            header, batches = read_table(os.path.join(directory, "loans.col"))
+            assert [len(batch["patron_id"]) for batch in batches] == [2], "Both loans should be in one batch"
+            assert header["metadata"]["current_date"] == 25, "The current date should be recorded"
+            imported = import_library(directory)
+
+        print(imported.get_circulation_totals())
+        assert imported.get_circulation_totals() == library.get_circulation_totals(), "Totals should be the same"
+        assert imported.lookup_patron_from_id("P1").get_fine_amount() == 1.50, "Fine should be imported"
+        assert imported.lookup_library_item_from_id("M1").get_title() == "Amélie", "Titles should be imported"
+        assert imported.get_hold_position("P2", "B1") == 1, "The higher priority hold should be first"
+        imported.advance_date(1)
+        assert imported.lookup_patron_from_id("P1").get_fine_amount() == 1.70, "Imported loans should keep accruing"
+        imported.return_library_item("B1")
+        assert imported.lookup_library_item_from_id("B1").get_requested_by().get_patron_id() == "P3"
+
+        library.add_patron(Patron(4, "Harry Styles"))
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                export_library(library, directory)
+                assert False, "Ids that are not strs should be rejected"
+            except TypeError:
+                pass
+            assert os.listdir(directory) == [], "Nothing should be written"
+
+    def test_loan_table(self):
+        """
+        Test that a LoanTable reports the same overdue items, fines and due dates as the Library, and that projecting
+        fines from the loans, as a LoanTable does, matches get_fine_amount even without NumPy.
+        """
+        print("\nTesting Loan Table:")
+        policy = LoanPolicy(grace_days=1)
+        policy.set_rule(kind=Movie, fine_cap=0.50)
+        self.library.set_loan_policy(policy)
+        self.library.check_out_library_item("459786", "B4275142")  # Due on day 21
+        self.library.check_out_library_item("459786", "M024543617907")  # Due on day 7
+        self.library.advance_date(10)
+        self.library.pay_fine("459786", 0.10)
+        self.library.check_out_library_item("126453", "A888751199729")  # Due on day 24
+        projected = project_fines(self.library, 30)
+        print(projected)
+        if NUMPY_AVAILABLE:
+            table = LoanTable(self.library)
+            assert len(table) == 3, "Every active loan should be in the table"
+            assert table.get_overdue_items() == [(self.m1, self.p1, 3)], "Only the movie should be overdue"
+            assert table.get_items_due_within(14) == [(self.b2, self.p1, 21), (self.a1, self.p2, 24)]
+            assert table.get_fines(30) == projected, "The table should project the same fines loan by loan"
+        else:
+            print("NumPy is not installed; LoanTable skipped")
+        self.library.advance_date(20)
+        assert projected == {"459786": self.p1.get_fine_amount(), "126453": self.p2.get_fine_amount()}
+        assert projected["459786"] == 1.20, "The movie should be fined up to its cap, and the book 0.80, less 0.10 paid"
+
+    def test_notifications(self):
+        """
+        Test that notices of loans coming due, loans falling overdue and holds ready for pickup are pulled in batches.
+        """
+        print("\nTesting Notifications:")
+        self.library.attach_notifications(NotificationQueue(due_soon_days=(2,)))
+        self.library.check_out_library_item("459786", "M024543617907")  # Due on day 7
+        self.library.check_out_library_item("126453", "A888751199729")  # Due on day 14
+        self.library.request_library_item("126453", "B1009653")
+        self.library.advance_date(5)
+        self.library.request_library_item("459786", "B4275142")
+
+        batches = list(self.library.iter_notifications(batch_size=2))
+        print(batches)
+        assert [len(batch) for batch in batches] == [2, 1], "Notifications should come in batches of at most two"
+        assert batches[0] == [("HOLD_READY", 0, self.b1, self.p2), ("DUE_SOON", 5, self.m1, self.p1)]
+        assert batches[1] == [("HOLD_READY", 5, self.b2, self.p1)], "B4275142 should be ready for pickup on day 5"
+
+        self.library.advance_date(10)
+        self.library.return_library_item("A888751199729")  # Its due-soon notice of day 12 no longer holds
+        assert self.library.pull_notifications() == [("OVERDUE", 8, self.m1, self.p1)], "Only the movie should be due"
+        assert self.library.pull_notifications() == [], "Pulled notifications should be gone"
+
+    def test_remove(self):
+        """
+        Test removing items and patrons, and that the holds of removed patrons are dropped.
+        """
+        print("\nTesting Remove:")
+        self.library.attach_search_index(SearchIndex())
+        self.library.check_out_library_item("459786", "B1009653")
+        self.library.request_library_item("126453", "B1009653")
+        self.library.request_library_item("459786", "A888751199729")
+        print(self.library.remove_library_item("B1009653"))  # Should fail (item checked out)
+        assert self.library.remove_library_item("B1009653") == "item checked out", "A loan should block removal"
+        assert self.library.remove_patron("459786") == "patron has items checked out", "A loan should block removal"
+        assert self.library.remove_library_item("A888751199729") == "item removed", "Holds should not block removal"
+        assert self.library.lookup_library_item_from_id("A888751199729") is None, "The item should be gone"
+        assert self.library.search("night") == [], "The item should be gone from the search index"
+        assert self.a1.get_requested_by() is None, "The removed item should let go of its patron"
+
+        self.library.return_library_item("B1009653")  # Now on the hold shelf for 126453
+        self.library.request_library_item("459786", "B1009653")
+        assert self.library.remove_patron("126453") == "patron removed", "A patron owing nothing can be removed"
+        assert self.library.lookup_patron_from_id("126453") is None, "The patron should be gone"
+        assert self.library.get_hold_shelf_pull_list() == [], "The removed patron's item should not be pulled"
+        assert self.b1.get_hold_count() == 1, "Only the hold of 459786 should be counted"
+        library_item = self.library.lookup_library_item_from_id("B1009653")
+        assert library_item.get_requested_by() is self.p1, "The hold should pass to the next patron"
+        assert self.library.remove_patron("126453") == "patron not found", "The patron is already gone"
+
+        self.library.check_out_library_item("459786", "B1009653")
+        self.library.advance_date(30)
+        self.library.return_library_item("B1009653")
+        assert self.library.remove_patron("459786") == "patron owes a fine", "A fine should block removal"
+        self.library.pay_fine("459786", 0.90)
+        assert self.library.remove_patron("459786") == "patron removed", "A paid up patron can be removed"
+        assert self.library.get_circulation_totals() == {"loans": 0, "overdue_loans": 0, "fines": 0.0}
+
+    def test_loan_policy(self):
+        """
+        Test that loans get their loan days, fine rate, fine cap and grace days from the LoanPolicy of the Library.
+        """
+        print("\nTesting Loan Policy:")
+        policy = LoanPolicy(grace_days=1)
+        policy.set_rule(patron_class="student", grace_days=2)
+        policy.set_rule(kind=Book, patron_class="student", loan_days=7, daily_fine=0.25, fine_cap=1.00)
+        assert policy.get_terms(Book, "student") == (7, 25, 100, 2, 2), "The most specific rules should win"
+        assert policy.get_terms(Album, "student") == (14, 10, None, 2, 2), "Only the student rule should apply"
+
+        class ReferenceBook(Book):
+            """
+            A Book lent for fewer days, whose loan length is read off the instance.
+            """
+            __slots__ = ()
+            CHECK_OUT_LENGTH = 3
+
+            def get_check_out_length(self):
+                return self.CHECK_OUT_LENGTH
+
+        assert policy.get_terms(ReferenceBook)[0] == 3, "The loan length should be read off the kind"
+
+        library = Library()
+        library.set_loan_policy(policy)
+        student = Patron("P1", "Louis Tomlinson", "student")
+        library.add_patron(student)
+        library.add_patron(Patron("P2", "Liam Payne"))
+        library.add_library_item(Book("B1", "Dune", "Frank Herbert"))
+        library.add_library_item(Book("B2", "Emma", "Jane Austen"))
+        library.check_out_library_item("P1", "B1")
+        library.check_out_library_item("P2", "B2")
+        assert library.lookup_library_item_from_id("B1").get_due_date() == 7, "Students get books for 7 days"
+        assert library.lookup_library_item_from_id("B2").get_due_date() == 21, "Others get books for 21 days"
+
+        library.advance_date(9)
+        assert student.get_fine_amount() == 0, "The loan should still be in its grace days"
+        library.increment_current_date()
+        assert student.get_fine_amount() == 0.25, "The loan should be fined from the end of its grace days"
+        library.advance_date(10)
+        assert student.get_fine_amount() == 1.00, "The fine of the loan should stop at its cap"
+
+        library.set_loan_policy(LoanPolicy(daily_fine=1.00))  # Loans already checked out keep their terms
+        library.advance_date(4)
+        print(library.lookup_patron_from_id("P2").get_fine_amount())  # Should print 0.2
+        assert library.get_circulation_totals() == {"loans": 2, "overdue_loans": 2, "fines": 1.2}
+        assert library.get_most_overdue_patrons() == [student, library.lookup_patron_from_id("P2")]
+
+    def test_renew(self):
+        """
+        Test that loans can be renewed up to their renewal limit, and not while another patron is waiting for them.
+        """
+        print("\nTesting Renew:")
+        library = Library()
+        library.add_patron(Patron("P1", "Zayn Malik"))
+        library.add_patron(Patron("P2", "Niall Horan"))
+        library.add_library_item(Book("B1", "Dune", "Frank Herbert"))
+        library.add_library_item(Album("A1", "Midnights", "Taylor Swift"))
+        library.add_library_item(Movie("M1", "Up", "Pete Docter"))
+        assert library.renew_library_item("B1") == "item not checked out"
+        for library_item_id in ["B1", "A1", "M1"]:
+            library.check_out_library_item("P1", library_item_id)
+
+        library.advance_date(5)
+        assert library.renew_library_item("B1") == "renewal successful"
+        book = library.lookup_library_item_from_id("B1")
+        assert book.get_due_date() == 26 and book.get_renewal_count() == 1, "The book should be due 21 days from now"
+        library.advance_date(20)
+        patron = library.lookup_patron_from_id("P1")
+        assert patron.get_fine_amount() == 2.9, "Only the album and movie should be overdue"
+
+        library.request_library_item("P2", "A1")
+        assert library.renew_library_items("P1") == {
+            "B1": "renewal successful", "A1": "item on hold by other patron", "M1": "renewal successful"}
+        assert library.renew_library_item("B1") == "renewal limit reached", "Loans can be renewed twice by default"
+
+        # The fine the movie ran up while overdue stays, but no more is added once it is renewed
+        library.advance_date(6)
+        print(patron.get_fine_amount())  # Should print 3.5
+        assert patron.get_fine_amount() == 3.5, "Only the album should still be fined"
+        assert library.renew_library_items("P3") == "patron not found"
+
+        # A loan renewed while overdue keeps what it has used of its grace days and fine cap
+        library = Library()
+        library.set_loan_policy(LoanPolicy(daily_fine=0.25, fine_cap=1.00, grace_days=2))
+        patron = Patron("P1", "Harry Styles")
+        library.add_patron(patron)
+        library.add_library_item(Movie("M1", "Up", "Pete Docter"))
+        library.check_out_library_item("P1", "M1")
+        library.advance_date(10)
+        assert library.renew_library_item("M1") == "renewal successful"
+        assert patron.get_fine_amount() == 0.25, "The movie should be fined for the day after its grace days"
+        library.advance_date(8)
+        assert patron.get_fine_amount() == 0.5, "The renewed loan should have no grace days left"
+        library.advance_date(12)
+        assert patron.get_fine_amount() == 1.00, "The renewed loan should stop at what is left of its fine cap"
+        assert library.renew_library_item("M1") == "renewal successful"
+        library.advance_date(20)
+        assert patron.get_fine_amount() == 1.00, "The loan should not be fined past its cap"
+
+    def test_cache(self):
+        """
+        Test that a LibraryCache keeps the most recently looked up items in memory, and writes back those it evicts.
+        """
+        print("\nTesting Cache:")
+        with tempfile.TemporaryDirectory() as directory:
+            catalog = SQLiteCatalog(os.path.join(directory, "catalog.db"))
+            catalog.store_library_items([Book("B1", "Dune", "Frank Herbert"), Album("A1", "Midnights", "Taylor Swift"),
+                                         Movie("M1", "Up", "Pete Docter")])
+            library = Library()
+            library.attach_catalog(catalog)
+            cache = LibraryCache(2)
+            library.attach_cache(cache)
+            library.add_patron(Patron("P1", "Louis Tomlinson"))
+
+            print(library.check_out_library_item("P1", "B1"))  # Should succeed
+            library.lookup_library_item_from_id("A1")
+            library.lookup_library_item_from_id("M1")
+            assert len(library._holdings) == 3, "The checked out book should be pinned, not evicted"
+            print(library.return_library_item("B1"))  # Should succeed
+            assert sorted(library._holdings) == ["B1", "M1"], "The least recently used item should be evicted"
+
+            library.lookup_library_item_from_id("A1")
+            library.lookup_library_item_from_id("M1")
+            book = library.lookup_library_item_from_id("B1")
+            assert book.get_date_checked_out() == 0, "The evicted book should be built with its written back state"
+            print(cache.get_stats())  # Should print 1 hit, 6 misses and 4 evictions
+            assert (cache.get_stats()["hits"], cache.get_stats()["misses"], cache.get_stats()["evictions"]) == (1, 6, 4)
+            catalog.close()
+
+            # A read-only catalog could not take back items that have changed, so it cannot bound them
+            write_catalog(os.path.join(directory, "catalog.bin"), [Book("B1", "Dune", "Frank Herbert")])
+            read_only = Catalog(os.path.join(directory, "catalog.bin"))
+            library = Library()
+            library.attach_catalog(read_only)
+            try:
+                library.attach_cache(LibraryCache(2))
+                assert False, "A cache should need a catalog that can store items"
+            except ValueError:
+                pass
+            read_only.close()
+
+    def test_simulator(self):
+        """
+        Test that simulated scenarios are reproducible, replay the same from a trace file, and run in worker processes.
+        """
+        print("\nTesting Simulator:")
+        scenario = {"patron_count": 50, "item_count": 200, "days": 20, "events_per_day": 100, "seed": 7}
+        report = run_scenario(**scenario)
+        assert report["events"] == 20 * 101, "Each day should have its transactions and a date advance"
+        assert [row["date"] for row in report["daily"]] == list(range(20)), "There should be a row for each day"
+
+        def outcome(result):
+            return result["results"], [dict(row, seconds=None) for row in result["daily"]]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.jsonl")
+            write_trace(path, generate_events(50, 200, 20, 100, 7))
+            assert outcome(run_scenario(trace=path, **scenario)) == outcome(report), "A trace should replay the same"
+
+        reports = run_scenarios([scenario, dict(scenario, name="double traffic", events_per_day=200)], workers=2)
+        print([(result["name"], result["results"]["check out successful"]) for result in reports])
+        assert outcome(reports[0]) == outcome(report), "A scenario should report the same results in a worker process"
+        assert reports[1]["events"] == 20 * 201
+
+    def test_inventory(self):
+        """
+        Test that the inventory counts and lists follow items as they are checked out, held and returned.
+        """
+        print("\nTesting Inventory:")
+        library = Library()
+        library.add_patron(Patron("P1", "Harry Styles"))
+        library.add_patron(Patron("P2", "Niall Horan"))
+        for number in range(3):
+            library.add_library_item(Book(f"B{number}", "Dune", "Frank Herbert"))
+            library.add_library_item(Movie(f"M{number}", "Up", "Pete Docter"))
+        library.check_out_library_item("P1", "M0")
+        library.check_out_library_item("P1", "M1")
+        library.request_library_item("P2", "M1")
+        library.request_library_item("P2", "B2")
+
+        assert library.count_items("ON_SHELF") == 3 and library.count_items(kind=Movie) == 3
+        assert sorted(item.get_library_item_id() for item in library.get_items("CHECKED_OUT", Movie)) == ["M0", "M1"]
+        library.return_library_item("M1")
+        pull_list = library.get_hold_shelf_pull_list()
+        assert [(item.get_library_item_id(), patron.get_patron_id()) for item, patron in pull_list] == [
+            ("B2", "P2"), ("M1", "P2")], "Both held items should be on the pull list"
+
+        report = library.get_utilization_report()
+        print(report["Movie"])  # Should print 1 on the shelf, 1 on the hold shelf, 1 checked out
+        assert report["Movie"]["utilization"] == 1 / 3 and report["Book"]["CHECKED_OUT"] == 0
+        library.remove_library_item("B0")
+        assert library.count_items("ON_SHELF", Book) == 1, "A removed item should not be counted"
+
     def run_tests(self):
         """
         Run each of the tests above.
@@ -156,6 +1156,36 @@ class LibraryTester:
         self.test_overpayment()
         self.test_increment_current_date()
 
+        # The tests above build on each other; each of the tests below starts from a freshly set up library
+        for test in (
+            self.test_lookup_index,
+            self.test_advance_date,
+            self.test_apply_transactions,
+            self.test_item_table,
+            self.test_journaled_library,
+            self.test_catalog,
+            self.test_concurrent_library,
+            self.test_library_service,
+            self.test_hold_queue,
+            self.test_search,
+            self.test_delinquency_reports,
+            self.test_workload_generator,
+            self.test_metrics,
+            self.test_sharded_library,
+            self.test_snapshot,
+            self.test_export,
+            self.test_loan_table,
+            self.test_notifications,
+            self.test_remove,
+            self.test_loan_policy,
+            self.test_renew,
+            self.test_cache,
+            self.test_simulator,
+            self.test_inventory,
+        ):
+            self.setup()
+            test()
+
 
 def main():
     """